@@ -0,0 +1,138 @@
+import logging
+import time
+from datetime import datetime
+from http import HTTPStatus
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from exceptions import (BadAPIHttpResponseCode,
+                        APIRequestProcessingError,
+                        APIError,
+                        BadAPIResponseFormat)
+from circuit_breaker import CircuitBreaker
+from loggers import LogSampler, Summary, get_logger
+from metrics import REGISTRY
+from singleflight import SingleFlight
+
+logger: logging.Logger = get_logger(__name__)
+
+API_REQUEST_SECONDS = REGISTRY.histogram(
+    'homework_bot_api_request_seconds',
+    'Practicum API request duration')
+API_RESPONSES = REGISTRY.counter(
+    'homework_bot_api_responses_total',
+    'Practicum API responses by HTTP status code',
+    ('code',))
+API_ERRORS = REGISTRY.counter(
+    'homework_bot_api_errors_total',
+    'Practicum API request failures by error',
+    ('error',))
+
+
+def retry_after(value: str = None) -> float:
+    """Seconds of a Retry-After header, None for HTTP dates or garbage."""
+    try:
+        return max(0.0, float(value)) if value else None
+    except ValueError:
+        return None
+
+
+class PracticumAPIClient:
+    """Keep-alive client for the Practicum homework statuses API.
+
+    All requests share one pooled requests.Session, so connections
+    to the API host are reused between polls instead of paying a new
+    TCP+TLS handshake every time. An optional circuit breaker shared by
+    all tenants stops requests while the API is down.
+
+    Concurrent polls with the same token and from_date share one
+    request, and its parsed answer is reused for cache_ttl seconds.
+    Only one of payload_log_every answers is logged, as a size capped
+    summary.
+    """
+
+    def __init__(self,
+                 endpoint: str,
+                 connect_timeout: float = 3.05,
+                 read_timeout: float = 10,
+                 pool_connections: int = 1,
+                 pool_maxsize: int = 10,
+                 breaker: CircuitBreaker = None,
+                 cache_ttl: float = 0,
+                 payload_log_every: int = 1) -> None:
+        self.endpoint = endpoint
+        self.sample_payload = LogSampler(payload_log_every)
+        self.breaker = breaker
+        self.flights = SingleFlight(cache_ttl)
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_connections,
+                              pool_maxsize=pool_maxsize)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def get_homework_statuses(self, from_date: int, headers: dict) -> dict:
+        """Request homework statuses changed since from_date."""
+        key = (headers.get('Authorization'), from_date)
+        return self.flights.do(key, self._guarded_request, from_date, headers)
+
+    def _guarded_request(self, from_date: int, headers: dict) -> dict:
+        if self.breaker is None:
+            return self._request(from_date, headers)
+        self.breaker.before_call()
+        try:
+            result = self._request(from_date, headers)
+        except APIRequestProcessingError:
+            self.breaker.record_failure()
+            raise
+        except BadAPIHttpResponseCode as error:
+            if (error.status_code or 0) >= HTTPStatus.INTERNAL_SERVER_ERROR:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            raise
+        except Exception:
+            self.breaker.record_success()
+            raise
+        self.breaker.record_success()
+        return result
+
+    def _request(self, from_date: int, headers: dict) -> dict:
+        params = {'from_date': from_date}
+        try:
+            if logger.isEnabledFor(logging.INFO):
+                logger.info('Sending request to yandex API. timestamp=%s(%s)',
+                            from_date, datetime.fromtimestamp(from_date))
+            started = time.perf_counter()
+            response = self.session.get(self.endpoint,
+                                        headers=headers,
+                                        params=params,
+                                        timeout=self.timeout)
+            API_REQUEST_SECONDS.observe(time.perf_counter() - started)
+            API_RESPONSES.labels(response.status_code).inc()
+            if response.status_code != HTTPStatus.OK:
+                API_ERRORS.labels('http_status').inc()
+                raise BadAPIHttpResponseCode(
+                    ("Bad response code from "
+                     f"yandex API recieved:{response.status_code}"),
+                    response.status_code,
+                    retry_after(response.headers.get('Retry-After')))
+            result = response.json()
+        except ValueError as error:
+            API_ERRORS.labels('format').inc()
+            raise BadAPIResponseFormat(f'API response format error:{error}')
+        except requests.exceptions.RequestException as error:
+            API_ERRORS.labels('request').inc()
+            raise APIRequestProcessingError(f"Process request error:{error}")
+
+        if logger.isEnabledFor(logging.INFO) and self.sample_payload():
+            logger.info('Data received:%s', Summary(result))
+        if isinstance(result, dict) and 'error' in result:
+            API_ERRORS.labels('api').inc()
+            raise APIError(f"Error at API response: {result.get('error')}")
+        return result
+
+    def close(self) -> None:
+        """Release pooled connections."""
+        self.session.close()
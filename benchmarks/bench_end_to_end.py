@@ -0,0 +1,163 @@
+"""End-to-end benchmark against local Practicum and Telegram stand-ins.
+
+Drives get_api_answer, check_homeworks with send_message and the
+multi-tenant PollingEngine, reports polls/s, notification latency
+percentiles and memory. Run before deploying to catch regressions:
+
+    python benchmarks/bench_end_to_end.py --tenants 500 --api-latency 0.02
+"""
+import argparse
+import os
+import resource
+import sys
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telegram import Bot  # noqa: E402
+from telegram.utils.request import Request  # noqa: E402
+
+import homework_bot  # noqa: E402
+from api_client import PracticumAPIClient  # noqa: E402
+from message_queue import OutgoingMessageQueue  # noqa: E402
+from polling_engine import PollingEngine, Tenant  # noqa: E402
+from stand_ins import PracticumStandIn, TelegramStandIn  # noqa: E402
+
+BOT_TOKEN = '1234:stand-in'
+SENDER_WORKERS = 8
+
+
+def percentiles(values: list) -> str:
+    if not values:
+        return 'n/a'
+    values = sorted(values)
+
+    def pick(share):
+        return values[min(len(values) - 1, int(len(values) * share))] * 1000
+
+    return (f'p50={pick(0.5):.1f}ms p95={pick(0.95):.1f}ms '
+            f'p99={pick(0.99):.1f}ms')
+
+
+def make_queue(bot: Bot) -> OutgoingMessageQueue:
+    messages = OutgoingMessageQueue(workers=SENDER_WORKERS,
+                                    global_rate=1e6,
+                                    chat_rate=1e6,
+                                    chat_burst=1e6,
+                                    maxsize=1 << 20)
+    messages.start(bot)
+    return messages
+
+
+def bench_get_api_answer(polls: int) -> None:
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(polls):
+        poll_started = time.perf_counter()
+        try:
+            homework_bot.get_api_answer(int(time.time()))
+        except Exception:
+            pass
+        latencies.append(time.perf_counter() - poll_started)
+    elapsed = time.perf_counter() - started
+    print(f'get_api_answer     {polls / elapsed:9.1f} polls/s  '
+          f'{percentiles(latencies)}')
+
+
+def bench_check_homeworks(polls: int, bot: Bot) -> None:
+    homework_bot.message_queue = make_queue(bot)
+    job = SimpleNamespace(context=homework_bot.TELEGRAM_CHAT_ID,
+                          schedule_removal=lambda: None)
+    context = SimpleNamespace(
+        bot=bot,
+        job=job,
+        job_queue=SimpleNamespace(run_once=lambda *args, **kwargs: job))
+    homework_bot.polling_jobs.add(job.context, job)
+    started = time.perf_counter()
+    for _ in range(polls):
+        homework_bot.check_homeworks(context)
+    polling = time.perf_counter() - started
+    homework_bot.message_queue.stop()
+    delivered = time.perf_counter() - started
+    latencies = list(homework_bot.message_queue.latencies)
+    print(f'check_homeworks    {polls / polling:9.1f} polls/s  '
+          f'{len(latencies)} notifications delivered in {delivered:.2f}s, '
+          f'enqueue->sent {percentiles(latencies)}')
+
+
+def bench_engine(tenants_count: int, max_in_flight: int, bot: Bot,
+                 telegram: TelegramStandIn, endpoint: str) -> None:
+    client = PracticumAPIClient(endpoint, pool_maxsize=max_in_flight)
+    messages = make_queue(bot)
+    engine = PollingEngine(client,
+                           homework_bot.check_response,
+                           homework_bot.parse_status,
+                           messages.put,
+                           max_in_flight=max_in_flight)
+    tenants = [Tenant(f'token-{number}', number)
+               for number in range(tenants_count)]
+    received_before = len(telegram.received)
+    started_monotonic = time.monotonic()
+    started = time.perf_counter()
+    engine.run_once(tenants)
+    polling = time.perf_counter() - started
+    messages.stop()
+    engine.close()
+    client.close()
+    latencies = [received_at - started_monotonic
+                 for received_at, _, _ in telegram.received[received_before:]]
+    print(f'PollingEngine      {tenants_count / polling:9.1f} polls/s  '
+          f'{len(latencies)} notifications, '
+          f'cycle start->delivered {percentiles(latencies)}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--polls', type=int, default=200)
+    parser.add_argument('--tenants', type=int, default=500)
+    parser.add_argument('--max-in-flight', type=int, default=50)
+    parser.add_argument('--homeworks', type=int, default=1,
+                        help='homeworks in every API response')
+    parser.add_argument('--comment-size', type=int, default=0,
+                        help='reviewer_comment length, grows payload')
+    parser.add_argument('--api-latency', type=float, default=0.0)
+    parser.add_argument('--api-error-rate', type=float, default=0.0)
+    parser.add_argument('--telegram-latency', type=float, default=0.0)
+    parser.add_argument('--telegram-error-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    homework_bot.logger.setLevel('CRITICAL')
+    tracemalloc.start()
+    practicum = PracticumStandIn(latency=args.api_latency,
+                                 homeworks_per_response=args.homeworks,
+                                 error_rate=args.api_error_rate,
+                                 comment_size=args.comment_size)
+    telegram = TelegramStandIn(latency=args.telegram_latency,
+                               error_rate=args.telegram_error_rate)
+    with practicum, telegram:
+        homework_bot.api_client = PracticumAPIClient(
+            practicum.endpoint, pool_maxsize=args.max_in_flight)
+        homework_bot.TELEGRAM_CHAT_ID = 1
+        bot = Bot(BOT_TOKEN,
+                  base_url=telegram.api_url,
+                  request=Request(con_pool_size=SENDER_WORKERS))
+
+        bench_get_api_answer(args.polls)
+        bench_check_homeworks(args.polls, bot)
+        bench_engine(args.tenants, args.max_in_flight, bot, telegram,
+                     practicum.endpoint)
+
+        print(f'API requests {practicum.requests_count} '
+              f'({practicum.errors_count} failed), '
+              f'Telegram requests {telegram.requests_count} '
+              f'({telegram.errors_count} failed)')
+    current, peak = tracemalloc.get_traced_memory()
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f'memory: traced peak {peak / 2 ** 20:.1f} MiB, '
+          f'max RSS {max_rss / 1024:.1f} MiB')
+
+
+if __name__ == '__main__':
+    main()
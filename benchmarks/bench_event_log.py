@@ -0,0 +1,89 @@
+"""Lookup latency of /status and /history over a large event log.
+
+Writes events of many chats in arrival order, so the events of one
+chat are spread over many blocks, then times status() and history()
+for random chats: cold right after open() and warm once the block
+cache holds what the lookups need.
+
+Usage: python benchmarks/bench_event_log.py [events] [events per chat]
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from event_log import EventLog  # noqa: E402
+
+STATUSES = ('reviewing', 'rejected', 'approved')
+
+
+def percentiles(samples: list) -> str:
+    samples = sorted(samples)
+    return ' '.join(f'p{q}={samples[int(len(samples) * q / 100)] * 1e6:.0f}us'
+                    for q in (50, 99))
+
+
+def write(directory: str, events: int, chats: int) -> float:
+    log = EventLog(directory, flush_interval=3600).open()
+    rng = random.Random(0)
+    started = time.perf_counter()
+    for number in range(events):
+        chat = rng.randrange(chats)
+        homework = rng.randrange(5)
+        log.append(chat, {'id': chat * 10 + homework,
+                          'homework_name': f'student{chat}__hw{homework}.zip',
+                          'status': STATUSES[number % 3],
+                          'date_updated': f'2022-11-{number % 28 + 1:02d}'
+                                          f'T10:00:00Z'})
+    elapsed = time.perf_counter() - started
+    log.close()
+    return elapsed
+
+
+def lookups(log: EventLog, chats: int, function, count: int = 2000) -> list:
+    rng = random.Random(1)
+    samples = []
+    for _ in range(count):
+        chat = rng.randrange(chats)
+        started = time.perf_counter()
+        function(log, chat)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def main():
+    events = int(sys.argv[1]) if len(sys.argv) > 1 else 2000000
+    per_chat = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    chats = max(1, events // per_chat)
+    directory = tempfile.mkdtemp()
+    try:
+        elapsed = write(directory, events, chats)
+        size = sum(os.path.getsize(os.path.join(directory, name))
+                   for name in os.listdir(directory))
+        print(f'{events} events of {chats} chats: appended at '
+              f'{events / elapsed:.0f} events/s, '
+              f'{size / events:.1f} bytes/event on disk')
+        started = time.perf_counter()
+        log = EventLog(directory).open()
+        print(f'open (index rebuild) {time.perf_counter() - started:.1f}s')
+        cases = (('/status', lambda log, chat: log.status(chat)),
+                 ('/history', lambda log, chat: log.history(chat)),
+                 ('/history hw', lambda log, chat: log.history(
+                     chat, str(chat * 10))))
+        for name, function in cases:
+            log.cache.clear()
+            cold = lookups(log, chats, function)
+            warm = lookups(log, chats, function)
+            print(f'{name:<12} cold {percentiles(cold)}  '
+                  f'warm {percentiles(warm)}')
+        log.close()
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
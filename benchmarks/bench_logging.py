@@ -0,0 +1,87 @@
+"""CPU and allocation cost of payload logging per poll.
+
+Compares the f-string logging the bot used to do (whole payload and
+every homework rendered on every poll) with lazy %-style arguments,
+a sampled Summary of the payload and per homework records at DEBUG,
+with INFO enabled and disabled.
+
+Usage: python benchmarks/bench_logging.py [homeworks] [polls]
+"""
+import logging
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loggers import LogSampler, Summary  # noqa: E402
+from validators import validate_homework  # noqa: E402
+
+logger = logging.getLogger('bench_logging')
+logger.propagate = False
+
+
+class FormattingHandler(logging.Handler):
+    """Formats records like a file handler would, without the I/O."""
+
+    def emit(self, record):
+        self.format(record)
+
+
+def make_payload(count: int) -> dict:
+    return {'homeworks': [{'id': number,
+                           'status': 'approved',
+                           'homework_name': f'student__hw{number}.zip',
+                           'reviewer_comment': 'Комментарий ' * 40,
+                           'date_updated': '2022-11-17T10:00:00Z',
+                           'lesson_name': 'Итоговый проект'}
+                          for number in range(count)],
+            'current_date': 1668679200}
+
+
+def eager(payload: dict, records: list) -> None:
+    logger.info(f'Data received:{payload}')
+    for record in records:
+        logger.info(f'Parse homework status for {record}')
+
+
+def lazy(payload: dict, records: list, sample=LogSampler(10)) -> None:
+    if logger.isEnabledFor(logging.INFO) and sample():
+        logger.info('Data received:%s', Summary(payload))
+    for record in records:
+        logger.debug('Parse homework status for %s', Summary(record))
+
+
+def measure(function, payload: dict, records: list, polls: int) -> tuple:
+    started = time.process_time()
+    for _ in range(polls):
+        function(payload, records)
+    cpu = (time.process_time() - started) / polls
+    tracemalloc.start()
+    for _ in range(min(polls, 20)):
+        function(payload, records)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return cpu, peak
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    polls = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    payload = make_payload(count)
+    records = [validate_homework(homework)
+               for homework in payload['homeworks']]
+    logger.addHandler(FormattingHandler())
+    print(f'{count} homeworks per poll, {len(str(payload))} chars payload')
+    for level in (logging.INFO, logging.WARNING):
+        logger.setLevel(level)
+        for name, function in (('f-string', eager), ('lazy', lazy)):
+            cpu, peak = measure(function, payload, records, polls)
+            print(f'{logging.getLevelName(level):<8}{name:<9}'
+                  f'{cpu * 1e6:10.1f} us/poll  '
+                  f'peak {peak / 1024:8.1f} KiB')
+
+
+if __name__ == '__main__':
+    main()
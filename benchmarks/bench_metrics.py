@@ -0,0 +1,64 @@
+"""Overhead of the metrics instrumentation on the polling hot path.
+
+Usage: python benchmarks/bench_metrics.py [polls]
+"""
+import os
+import sys
+import time
+import timeit
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api_client import PracticumAPIClient  # noqa: E402
+from metrics import Registry  # noqa: E402
+from stand_ins import PracticumStandIn  # noqa: E402
+
+# Metric operations done by one check_homeworks run with one notification:
+# request histogram, response and notification counters, poll and job lag
+# histograms, send latency histogram and sent counter.
+OPS_PER_POLL = 7
+
+
+def measure_ops(number: int = 200000) -> dict:
+    registry = Registry()
+    counter = registry.counter('bench_total', 'bench')
+    labelled = registry.counter('bench_labelled_total', 'bench', ('code',))
+    histogram = registry.histogram('bench_seconds', 'bench')
+    results = {
+        'counter.inc': timeit.timeit(counter.inc, number=number),
+        'counter.labels().inc': timeit.timeit(
+            lambda: labelled.labels(200).inc(), number=number),
+        'histogram.observe': timeit.timeit(
+            lambda: histogram.observe(0.042), number=number),
+    }
+    return {name: seconds / number for name, seconds in results.items()}
+
+
+def measure_poll(polls: int) -> float:
+    with PracticumStandIn(homeworks_per_response=1) as stand_in:
+        client = PracticumAPIClient(stand_in.endpoint)
+        headers = {'Authorization': 'OAuth token'}
+        client.get_homework_statuses(1, headers)
+        started = time.perf_counter()
+        for _ in range(polls):
+            client.get_homework_statuses(1, headers)
+        elapsed = time.perf_counter() - started
+        client.close()
+    return elapsed / polls
+
+
+def main():
+    polls = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    ops = measure_ops()
+    for name, seconds in ops.items():
+        print(f'{name:<22} {seconds * 1e9:8.0f} ns')
+    overhead = max(ops.values()) * OPS_PER_POLL
+    poll = measure_poll(polls)
+    print(f'instrumentation per poll <= {overhead * 1e6:.2f} us')
+    print(f'local poll round trip       {poll * 1e6:.0f} us')
+    print(f'overhead                    {overhead / poll:.3%} of a poll '
+          'against a local server')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""Throughput of PollingEngine against a local stand-in API.
+
+Usage: python benchmarks/bench_polling_engine.py [tenants] [latency]
+"""
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api_client import PracticumAPIClient  # noqa: E402
+from polling_engine import PollingEngine, Tenant  # noqa: E402
+from stand_ins import PracticumStandIn  # noqa: E402
+
+import homework_bot  # noqa: E402
+
+
+def run(tenants_count: int, latency: float, max_in_flight: int):
+    with PracticumStandIn(latency=latency,
+                          homeworks_per_response=1) as stand_in:
+        client = PracticumAPIClient(stand_in.endpoint,
+                                    pool_maxsize=max_in_flight)
+        notifications = []
+        engine = PollingEngine(client,
+                               homework_bot.check_response,
+                               homework_bot.parse_status,
+                               lambda chat_id, text, key:
+                               notifications.append(chat_id),
+                               max_in_flight=max_in_flight)
+        tenants = [Tenant(f'token-{number}', number, from_date=1)
+                   for number in range(tenants_count)]
+        started = time.perf_counter()
+        engine.run_once(tenants)
+        elapsed = time.perf_counter() - started
+        engine.close()
+        client.close()
+    assert len(notifications) == tenants_count
+    return elapsed
+
+
+def main():
+    tenants_count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+    homework_bot.logger.disabled = True
+    print(f'{tenants_count} tenants, API latency {latency * 1000:.0f} ms')
+    for max_in_flight in (1, 10, 50, 100):
+        elapsed = run(tenants_count, latency, max_in_flight)
+        print(f'max_in_flight={max_in_flight:<4} '
+              f'{elapsed:7.2f}s  {tenants_count / elapsed:8.1f} polls/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Polling throughput of sharded worker processes.
+
+Splits tenants between 1, 2, 4, ... processes by the same hash ring
+the Supervisor uses; every process polls its share with its own
+PollingEngine against one local stand-in API, like a shard worker.
+Reports polls/s of all shards and the ring balance, so the per shard
+scaling can be checked on the deployment machine:
+
+    python benchmarks/bench_sharding.py [tenants] [latency] [homeworks]
+
+Large responses make the polls CPU bound (validation and parsing),
+which is where processes beat threads of one interpreter.
+"""
+import multiprocessing
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sharding import HashRing  # noqa: E402
+from stand_ins import PracticumStandIn  # noqa: E402
+
+MAX_IN_FLIGHT = 20
+ROUNDS = 3
+
+
+def poll_shard(endpoint: str, chat_ids: list, start, results) -> None:
+    import homework_bot
+    from api_client import PracticumAPIClient
+    from polling_engine import PollingEngine, Tenant
+
+    homework_bot.logger.disabled = True
+    client = PracticumAPIClient(endpoint, pool_maxsize=MAX_IN_FLIGHT)
+    notifications = []
+    engine = PollingEngine(client,
+                           homework_bot.check_response,
+                           homework_bot.parse_status,
+                           lambda chat_id, text, key:
+                           notifications.append(chat_id),
+                           max_in_flight=MAX_IN_FLIGHT)
+    tenants = [Tenant(f'token-{chat_id}', chat_id, from_date=1)
+               for chat_id in chat_ids]
+    start.wait()
+    started = time.perf_counter()
+    for _ in range(ROUNDS):
+        engine.run_once(tenants)
+    results.put((len(chat_ids) * ROUNDS, time.perf_counter() - started))
+    engine.close()
+    client.close()
+
+
+def run(endpoint: str, tenants_count: int, workers: int) -> tuple:
+    ring = HashRing(range(workers))
+    shards = {shard: [] for shard in range(workers)}
+    for chat_id in range(tenants_count):
+        shards[ring.node_for(chat_id)].append(chat_id)
+    context = multiprocessing.get_context('spawn')
+    start = context.Event()
+    results = context.Queue()
+    processes = [context.Process(target=poll_shard,
+                                 args=(endpoint, chat_ids, start, results))
+                 for chat_ids in shards.values()]
+    for process in processes:
+        process.start()
+    # Let every process import the bot before the clock starts.
+    time.sleep(2)
+    started = time.perf_counter()
+    start.set()
+    polls = sum(results.get()[0] for _ in processes)
+    elapsed = time.perf_counter() - started
+    for process in processes:
+        process.join()
+    sizes = [len(chat_ids) for chat_ids in shards.values()]
+    return polls / elapsed, min(sizes), max(sizes)
+
+
+def main():
+    tenants_count = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.02
+    homeworks = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+    print(f'{tenants_count} tenants, API latency {latency * 1000:.0f} ms, '
+          f'{homeworks} homeworks per response, {os.cpu_count()} CPUs')
+    with PracticumStandIn(latency=latency,
+                          homeworks_per_response=homeworks) as stand_in:
+        single = None
+        for workers in (1, 2, 4, 8):
+            rate, smallest, largest = run(stand_in.endpoint, tenants_count,
+                                          workers)
+            single = single or rate
+            print(f'workers={workers:<2} {rate:8.1f} polls/s  '
+                  f'x{rate / single:4.2f}  shard size {smallest}-{largest}')
+
+
+if __name__ == '__main__':
+    main()
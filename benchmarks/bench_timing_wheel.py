@@ -0,0 +1,150 @@
+"""Memory and scheduling overhead of TimingWheel against JobQueue.
+
+Jobs are spread over one hour, as poll jobs of many tenants are. For
+both schedulers the benchmark measures scheduling every job, cancelling
+a tenth of them and the memory held by the pending jobs. The wheel is
+then drained tick by tick on a simulated clock, JobQueue fires a batch
+of jobs due at once on its real clock. Timings are taken with
+tracemalloc running, which slows both schedulers alike.
+
+JobQueue inserts every job into a sorted list, so scheduling gets
+slower with the number of jobs: a million takes tens of minutes and is skipped
+unless --job-queue-max allows it.
+
+Usage: python benchmarks/bench_timing_wheel.py [--sizes 10000 100000 1000000]
+"""
+import argparse
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telegram import Bot  # noqa: E402
+from telegram.ext import Dispatcher, JobQueue  # noqa: E402
+
+from timing_wheel import TimingWheel  # noqa: E402
+
+HOUR = 3600
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def report(name: str, size: int, scheduled: float, cancelled: float,
+           memory: int, dispatched: str) -> None:
+    print(f'{name:<11}{size:>9}  schedule {scheduled / size * 1e6:7.2f} us/job'
+          f'  cancel {cancelled / (size // 10) * 1e6:7.2f} us/job'
+          f'  memory {memory / size:6.0f} B/job  {dispatched}')
+
+
+def bench_wheel(size: int, delays: list, cancelled: list) -> None:
+    clock = FakeClock()
+    tracemalloc.start()
+    wheel = TimingWheel(1, clock=clock)
+    started = time.perf_counter()
+    for key, delay in enumerate(delays):
+        wheel.schedule(key, delay)
+    scheduled = time.perf_counter() - started
+    memory = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    for key in cancelled:
+        wheel.cancel(key)
+    cancelled_time = time.perf_counter() - started
+    tracemalloc.stop()
+    batches = fired = 0
+    started = time.perf_counter()
+    for second in range(1, HOUR + 1):
+        clock.now = second
+        due = wheel.advance()
+        if due:
+            batches += 1
+            fired += len(due)
+    drained = time.perf_counter() - started
+    report('TimingWheel', size, scheduled, cancelled_time, memory,
+           f'{fired} jobs in {batches} batches, '
+           f'{drained / fired * 1e6:.2f} us/job')
+
+
+def make_job_queue() -> JobQueue:
+    job_queue = JobQueue()
+    dispatcher = Dispatcher(Bot('1234:benchmark'), queue.Queue(),
+                            job_queue=job_queue, workers=1)
+    job_queue.set_dispatcher(dispatcher)
+    job_queue.start()
+    return job_queue
+
+
+def bench_job_queue(size: int, delays: list, cancelled: list,
+                    batch: int) -> None:
+    job_queue = make_job_queue()
+    tracemalloc.start()
+    started = time.perf_counter()
+    jobs = [job_queue.run_once(lambda context: None, HOUR + delay,
+                               context=key)
+            for key, delay in enumerate(delays)]
+    scheduled = time.perf_counter() - started
+    memory = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    for key in cancelled:
+        jobs[key].schedule_removal()
+    cancelled_time = time.perf_counter() - started
+    tracemalloc.stop()
+    job_queue.stop()
+    report('JobQueue', size, scheduled, cancelled_time, memory,
+           dispatch_job_queue(batch))
+
+
+def dispatch_job_queue(batch: int) -> str:
+    job_queue = make_job_queue()
+    done = threading.Event()
+    fired = []
+
+    def callback(context):
+        fired.append(context.job.context)
+        if len(fired) == batch:
+            done.set()
+
+    when = time.time() + 1
+    for key in range(batch):
+        job_queue.run_once(callback, when - time.time(), context=key)
+    started = time.perf_counter()
+    done.wait(600)
+    drained = time.perf_counter() - started
+    job_queue.stop()
+    return (f'{len(fired)} jobs due at once fired in '
+            f'{drained:.2f}s, {drained / batch * 1e6:.2f} us/job')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[10000, 100000, 1000000])
+    parser.add_argument('--batch', type=int, default=2000,
+                        help='JobQueue jobs fired at once')
+    parser.add_argument('--job-queue-max', type=int, default=100000,
+                        help='largest size to run JobQueue with, 0 to skip')
+    args = parser.parse_args()
+    rng = random.Random(0)
+    for size in args.sizes:
+        delays = [rng.uniform(0, HOUR) for _ in range(size)]
+        cancelled = rng.sample(range(size), size // 10)
+        bench_wheel(size, delays, cancelled)
+        if size <= args.job_queue_max:
+            bench_job_queue(size, delays, cancelled,
+                            min(args.batch, size))
+        else:
+            print(f'JobQueue   {size:>9}  skipped, see --job-queue-max')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""Per record cost of the compiled validator against schema.Schema.
+
+Usage: python benchmarks/bench_validator.py [records]
+"""
+import os
+import sys
+import timeit
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from schema import Schema  # noqa: E402
+
+from validators import validate_homework  # noqa: E402
+
+HOMEWORK_INFO_SCHEMA = Schema({'date_updated': str,
+                               'homework_name': str,
+                               'id': int,
+                               'lesson_name': str,
+                               'reviewer_comment': str,
+                               'status': str})
+
+
+def make_homeworks(count: int) -> list:
+    return [{'id': number,
+             'status': 'approved',
+             'homework_name': f'student__hw{number}.zip',
+             'reviewer_comment': 'Всё нравится',
+             'date_updated': '2022-11-17T10:00:00Z',
+             'lesson_name': 'Итоговый проект'}
+            for number in range(count)]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    homeworks = make_homeworks(count)
+
+    def schema_path():
+        return [homework for homework in homeworks
+                if HOMEWORK_INFO_SCHEMA.is_valid(homework)]
+
+    def compiled_path():
+        return [validate_homework(homework) for homework in homeworks]
+
+    print(f'{count} records')
+    results = {}
+    for name, func in (('schema.Schema.is_valid', schema_path),
+                       ('compiled validator', compiled_path)):
+        seconds = min(timeit.repeat(func, number=1, repeat=3))
+        results[name] = seconds
+        print(f'{name:<24} {seconds * 1e9 / count:10.0f} ns/record')
+    print(f'speedup x{results["schema.Schema.is_valid"] / seconds:.1f}')
+
+
+if __name__ == '__main__':
+    main()
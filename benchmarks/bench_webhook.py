@@ -0,0 +1,110 @@
+"""Command handling latency: webhook mode against long polling.
+
+Posts synthetic /ping updates to the bot webhook, or queues them in the
+Telegram stand-in for getUpdates, and measures the time until the
+command handler runs.
+
+Usage: python benchmarks/bench_webhook.py [updates]
+"""
+import os
+import socket
+import sys
+import threading
+import time
+
+import requests
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telegram import Bot  # noqa: E402
+from telegram.ext import CommandHandler, Updater  # noqa: E402
+from telegram.utils.request import Request  # noqa: E402
+
+from bench_end_to_end import BOT_TOKEN, percentiles  # noqa: E402
+from stand_ins import TelegramStandIn  # noqa: E402
+
+WEBHOOK_PATH = 'telegram'
+
+
+def make_update(number: int) -> dict:
+    return {'update_id': number,
+            'message': {'message_id': number,
+                        'date': int(time.time()),
+                        'chat': {'id': 1, 'type': 'private'},
+                        'from': {'id': 1, 'is_bot': False,
+                                 'first_name': 'bench'},
+                        'text': '/ping',
+                        'entities': [{'type': 'bot_command',
+                                      'offset': 0,
+                                      'length': 5}]}}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class PingRecorder:
+    def __init__(self) -> None:
+        self.handled = threading.Event()
+
+    def ping(self, update, context):
+        self.handled.set()
+
+
+def run(mode: str, updates: int, telegram: TelegramStandIn) -> None:
+    recorder = PingRecorder()
+    bot = Bot(BOT_TOKEN,
+              base_url=telegram.api_url,
+              request=Request(con_pool_size=8))
+    updater = Updater(bot=bot, use_context=True)
+    updater.dispatcher.add_handler(CommandHandler('ping', recorder.ping))
+    threads_before = threading.active_count()
+    if mode == 'webhook':
+        port = free_port()
+        updater.start_webhook(listen='127.0.0.1',
+                              port=port,
+                              url_path=WEBHOOK_PATH,
+                              webhook_url=f'http://127.0.0.1:{port}/'
+                                          f'{WEBHOOK_PATH}')
+        session = requests.Session()
+        url = f'http://127.0.0.1:{port}/{WEBHOOK_PATH}'
+
+        def deliver(update):
+            session.post(url, json=update, timeout=5)
+    else:
+        updater.start_polling(poll_interval=0, timeout=10)
+
+        def deliver(update):
+            telegram.push_update(update)
+
+    time.sleep(0.5)
+    idle_requests = telegram.requests_count
+    time.sleep(2)
+    idle_requests = telegram.requests_count - idle_requests
+    latencies = []
+    for number in range(1, updates + 1):
+        recorder.handled.clear()
+        started = time.perf_counter()
+        deliver(make_update(number))
+        if not recorder.handled.wait(5):
+            print(f'{mode}: update {number} was not handled')
+            continue
+        latencies.append(time.perf_counter() - started)
+    threads = threading.active_count() - threads_before
+    updater.stop()
+    print(f'{mode:<8} {percentiles(latencies)}  '
+          f'extra threads {threads}, '
+          f'Bot API requests while idle for 2s: {idle_requests}')
+
+
+def main():
+    updates = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    with TelegramStandIn() as telegram:
+        for mode in ('polling', 'webhook'):
+            run(mode, updates, telegram)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+"""Local stand-in servers used by the benchmarks."""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+HOMEWORK_STATUSES = ('reviewing', 'rejected', 'approved')
+
+
+class _StandIn:
+    """Threaded HTTP server with configurable latency and error rate."""
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0,
+                 seed: int = 0) -> None:
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.requests_count = 0
+        self.errors_count = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0),
+                                          self._make_handler())
+        self.server.daemon_threads = True
+        self.server.request_queue_size = 1024
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address
+        return f'http://{host}:{port}'
+
+    def should_fail(self) -> bool:
+        with self._lock:
+            self.requests_count += 1
+            failed = self.random.random() < self.error_rate
+            if failed:
+                self.errors_count += 1
+        return failed
+
+    def handle(self, handler: BaseHTTPRequestHandler, body: bytes):
+        """Return (status, payload) for the request."""
+        raise NotImplementedError
+
+    def _make_handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Buffer headers and body into one segment, otherwise delayed
+            # ACK adds ~40 ms to every keep-alive response.
+            wbufsize = 1 << 16
+
+            def respond(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                if stand_in.latency:
+                    time.sleep(stand_in.latency)
+                status, payload = stand_in.handle(self, body)
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = respond
+            do_POST = respond
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class PracticumStandIn(_StandIn):
+    """Answers like the homework statuses API.
+
+    Every response carries homeworks_per_response records, their status
+    moves on with each request of the same token, so every poll yields
+    status transitions. comment_size pads reviewer_comment to grow the
+    payload.
+    """
+
+    def __init__(self, latency: float = 0.0, homeworks_per_response: int = 0,
+                 error_rate: float = 0.0, comment_size: int = 0,
+                 seed: int = 0) -> None:
+        super().__init__(latency, error_rate, seed)
+        self.homeworks_per_response = homeworks_per_response
+        self.comment = 'x' * comment_size
+        self.polls_by_token = {}
+
+    @property
+    def endpoint(self) -> str:
+        return f'{self.base_url}/api/user_api/homework_statuses/'
+
+    def build_payload(self, from_date: int, poll_number: int = 0) -> dict:
+        status = HOMEWORK_STATUSES[poll_number % len(HOMEWORK_STATUSES)]
+        date_updated = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        homeworks = [{'id': number,
+                      'status': status,
+                      'homework_name': f'hw_{number}.zip',
+                      'reviewer_comment': self.comment,
+                      'date_updated': date_updated,
+                      'lesson_name': 'Итоговый проект'}
+                     for number in range(self.homeworks_per_response)]
+        return {'homeworks': homeworks,
+                'current_date': max(from_date + 1, int(time.time()))}
+
+    def handle(self, handler, body):
+        if self.should_fail():
+            return 500, {'error': 'stand-in failure'}
+        token = handler.headers.get('Authorization', '')
+        with self._lock:
+            poll_number = self.polls_by_token.get(token, 0)
+            self.polls_by_token[token] = poll_number + 1
+        query = parse_qs(urlparse(handler.path).query)
+        from_date = int(query.get('from_date', ['0'])[0])
+        return 200, self.build_payload(from_date, poll_number)
+
+
+class TelegramStandIn(_StandIn):
+    """Minimal Bot API: getMe, sendMessage and long polling getUpdates.
+
+    Other methods (setWebhook, deleteWebhook, ...) return True.
+    Delivered messages are kept in received as (monotonic time, chat_id,
+    text). Failed sends answer 429 with retry_after, like flood control
+    does. push_update() queues an update for getUpdates.
+    """
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0,
+                 retry_after: int = 1, seed: int = 0) -> None:
+        super().__init__(latency, error_rate, seed)
+        self.retry_after = retry_after
+        self.received = []
+        self.message_id = 0
+        self.updates = []
+        self.update_id = 0
+        self._updates_ready = threading.Condition(self._lock)
+
+    @property
+    def api_url(self) -> str:
+        """Value for telegram.Bot(base_url=...)."""
+        return f'{self.base_url}/bot'
+
+    def push_update(self, update: dict) -> dict:
+        with self._updates_ready:
+            self.update_id += 1
+            update = dict(update, update_id=self.update_id)
+            self.updates.append(update)
+            self._updates_ready.notify_all()
+        return update
+
+    def get_updates(self, data: dict) -> list:
+        offset = int(data.get('offset') or 0)
+        timeout = float(data.get('timeout') or 0)
+        with self._updates_ready:
+            self.updates = [update for update in self.updates
+                            if update['update_id'] >= offset]
+            self._updates_ready.wait_for(lambda: self.updates, timeout)
+            return list(self.updates)
+
+    def handle(self, handler, body):
+        method = handler.path.rsplit('/', 1)[-1]
+        try:
+            data = json.loads(body) if body else {}
+        except ValueError:
+            data = {key: values[0]
+                    for key, values in parse_qs(body.decode()).items()}
+        if method == 'getMe':
+            return 200, {'ok': True,
+                         'result': {'id': 1, 'is_bot': True,
+                                    'first_name': 'stand-in',
+                                    'username': 'stand_in_bot'}}
+        if method == 'getUpdates':
+            return 200, {'ok': True, 'result': self.get_updates(data)}
+        if method != 'sendMessage':
+            return 200, {'ok': True, 'result': True}
+        if self.should_fail():
+            return 429, {'ok': False, 'error_code': 429,
+                         'description': 'Too Many Requests',
+                         'parameters': {'retry_after': self.retry_after}}
+        with self._lock:
+            self.message_id += 1
+            message_id = self.message_id
+            self.received.append((time.monotonic(),
+                                  data.get('chat_id'),
+                                  data.get('text')))
+        return 200, {'ok': True,
+                     'result': {'message_id': message_id,
+                                'date': int(time.time()),
+                                'chat': {'id': int(data.get('chat_id', 0)),
+                                         'type': 'private'},
+                                'text': data.get('text')}}
@@ -0,0 +1,80 @@
+import random
+import threading
+import time
+from typing import Callable
+
+from exceptions import CircuitOpenError
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """Stops calling a failing service and probes it for recovery.
+
+    After failure_threshold consecutive failures the circuit opens and
+    calls fail fast with CircuitOpenError. When the backoff expires one
+    probe call is let through (half-open): success closes the circuit,
+    failure opens it again with a doubled, jittered backoff.
+    """
+
+    def __init__(self,
+                 failure_threshold: int = 5,
+                 base_backoff: float = 30,
+                 max_backoff: float = 1800,
+                 jitter: float = 0.2,
+                 clock: Callable[[], float] = time.monotonic,
+                 rng: Callable[[], float] = random.random) -> None:
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.clock = clock
+        self.rng = rng
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_times = 0
+        self.retry_at = 0.0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def _open(self) -> None:
+        self.opened_times += 1
+        backoff = min(self.max_backoff,
+                      self.base_backoff * 2 ** (self.opened_times - 1))
+        backoff *= 1 + self.jitter * (2 * self.rng() - 1)
+        self.state = OPEN
+        self.retry_at = self.clock() + backoff
+
+    def before_call(self) -> None:
+        """Raise CircuitOpenError unless the call may go through."""
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            if self.state == OPEN and self.clock() >= self.retry_at:
+                self.state = HALF_OPEN
+                return
+            self.rejected += 1
+            raise CircuitOpenError(
+                f'Circuit is {self.state}, next probe in '
+                f'{max(0.0, self.retry_at - self.clock()):.0f}s')
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self.opened_times = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if (self.state == HALF_OPEN
+                    or self.failures >= self.failure_threshold):
+                self._open()
+
+    def remaining(self) -> float:
+        """Seconds until the next probe is allowed."""
+        if self.state == CLOSED:
+            return 0.0
+        return max(0.0, self.retry_at - self.clock())
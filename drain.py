@@ -0,0 +1,49 @@
+import threading
+from functools import wraps
+from typing import Callable
+
+
+class Drain:
+    """Tracks running jobs so shutdown can wait for them.
+
+    Functions decorated with job() run while the drain is open and are
+    skipped once close() was called; close() waits until the running
+    ones return.
+    """
+
+    def __init__(self) -> None:
+        self.active = 0
+        self.closed = False
+        self._changed = threading.Condition()
+
+    def enter(self) -> bool:
+        """Count a job in, False once the drain is closed."""
+        with self._changed:
+            if self.closed:
+                return False
+            self.active += 1
+            return True
+
+    def exit(self) -> None:
+        with self._changed:
+            self.active -= 1
+            self._changed.notify_all()
+
+    def job(self, function: Callable) -> Callable:
+        """Decorator running function only while the drain is open."""
+        @wraps(function)
+        def tracked(*args, **kwargs):
+            if not self.enter():
+                return None
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.exit()
+
+        return tracked
+
+    def close(self, timeout: float = None) -> bool:
+        """Refuse new jobs, False if running ones outlast timeout."""
+        with self._changed:
+            self.closed = True
+            return self._changed.wait_for(lambda: not self.active, timeout)
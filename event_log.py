@@ -0,0 +1,287 @@
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from loggers import get_logger
+
+logger: logging.Logger = get_logger(__name__)
+
+BLOCK_HEADER = struct.Struct('>II')
+SEGMENT_NAME = 'events-{:06d}.log'
+
+# (id, homework_name, status, date_updated, recorded_at)
+Event = Tuple[str, str, str, str, float]
+FIELD_SEPARATORS = str.maketrans('\t\n', '  ')
+
+
+def _encode(event: list) -> bytes:
+    return '\t'.join(event).encode()
+
+
+def _parse(line: bytes) -> Event:
+    _, homework_id, name, status, date_updated, recorded_at = (
+        line.decode().split('\t'))
+    return homework_id, name, status, date_updated, float(recorded_at)
+
+
+class EventLog:
+    """Append-only log of homework status events.
+
+    Events are tab separated lines collected into blocks of
+    block_events, every block is zlib compressed and appended to the
+    current segment file with its length and crc32; segments are
+    rotated at segment_bytes. The block
+    numbers holding events of every homework and of every owner are
+    indexed in memory, and the latest event of every homework is
+    cached, so status() is a dict lookup and history() decompresses
+    only the blocks it needs and parses only the owner's lines of them.
+
+    The index is rebuilt by scanning the segments on open(), a torn
+    block at the end of the last segment is cut off. Events of the
+    unwritten block live in memory and are written by flush(), every
+    flush_interval seconds and on close().
+    """
+
+    def __init__(self,
+                 directory: str,
+                 block_events: int = 32,
+                 segment_bytes: int = 16 * 1024 * 1024,
+                 cache_blocks: int = 1024,
+                 flush_interval: float = 5.0) -> None:
+        self.directory = directory
+        self.block_events = block_events
+        self.segment_bytes = segment_bytes
+        self.cache_blocks = cache_blocks
+        self.flush_interval = flush_interval
+        self.blocks: List[Tuple[int, int, int]] = []
+        self.homework_blocks: Dict[Tuple[str, str], List[int]] = {}
+        self.owner_blocks: Dict[str, List[int]] = {}
+        self.latest: Dict[str, Dict[str, Event]] = {}
+        self.active: List[bytes] = []
+        self.cache: OrderedDict = OrderedDict()
+        self.events = 0
+        self.segment = 0
+        self.stream = None
+        self.readers: Dict[int, object] = {}
+        self._lock = threading.RLock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self.stream is not None
+
+    def _path(self, segment: int) -> str:
+        return os.path.join(self.directory, SEGMENT_NAME.format(segment))
+
+    def open(self) -> 'EventLog':
+        """Rebuild the index from the segments and start the writer."""
+        os.makedirs(self.directory, exist_ok=True)
+        segments = sorted(int(name[7:13]) for name in os.listdir(
+            self.directory) if name.startswith('events-'))
+        with self._lock:
+            for segment in segments:
+                self._scan(segment)
+            self.segment = segments[-1] if segments else 1
+            self.stream = open(self._path(self.segment), 'ab')
+        logger.info('Event log loaded %d events from %d segments',
+                    self.events, len(segments))
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run,
+                                        name='event-log',
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def _scan(self, segment: int) -> None:
+        path = self._path(segment)
+        offset = 0
+        with open(path, 'rb') as stream:
+            while True:
+                header = stream.read(BLOCK_HEADER.size)
+                if len(header) < BLOCK_HEADER.size:
+                    break
+                length, checksum = BLOCK_HEADER.unpack(header)
+                payload = stream.read(length)
+                if len(payload) < length or zlib.crc32(payload) != checksum:
+                    break
+                self._index_block((segment, offset, length),
+                                  self._decode(payload))
+                offset += BLOCK_HEADER.size + length
+        if offset < os.path.getsize(path):
+            logger.warning('Event log segment %s is torn at %d, cut off',
+                           path, offset)
+            with open(path, 'r+b') as stream:
+                stream.truncate(offset)
+
+    @staticmethod
+    def _decode(payload: bytes) -> List[bytes]:
+        return zlib.decompress(payload).split(b'\n')
+
+    def _index_event(self, block: int, owner: str, event: Event) -> None:
+        key = event[0] or event[1]
+        locations = self.homework_blocks.setdefault((owner, key), [])
+        if not locations or locations[-1] != block:
+            locations.append(block)
+        locations = self.owner_blocks.setdefault(owner, [])
+        if not locations or locations[-1] != block:
+            locations.append(block)
+        self.latest.setdefault(owner, {})[key] = event
+        self.events += 1
+
+    def _index_block(self, location: Tuple[int, int, int],
+                     lines: List[bytes]) -> None:
+        """Index a block read from disk, inlined for fast open()."""
+        block = len(self.blocks)
+        self.blocks.append(location)
+        homework_blocks = self.homework_blocks
+        owner_blocks = self.owner_blocks
+        latest = self.latest
+        for line in lines:
+            owner, homework_id, name, status, date_updated, recorded_at = (
+                line.decode().split('\t'))
+            key = homework_id or name
+            locations = homework_blocks.get((owner, key))
+            if locations is None:
+                homework_blocks[(owner, key)] = [block]
+            elif locations[-1] != block:
+                locations.append(block)
+            locations = owner_blocks.get(owner)
+            if locations is None:
+                owner_blocks[owner] = [block]
+            elif locations[-1] != block:
+                locations.append(block)
+            owner_latest = latest.get(owner)
+            if owner_latest is None:
+                owner_latest = latest[owner] = {}
+            owner_latest[key] = (homework_id, name, status, date_updated,
+                                 float(recorded_at))
+        self.events += len(lines)
+
+    def append(self, owner, record, recorded_at: float = None) -> None:
+        """Record a status event of the homework record."""
+        if not self.is_open:
+            return
+        owner = str(owner)
+        event = tuple(str(value or '').translate(FIELD_SEPARATORS)
+                      for value in (record['id'], record['homework_name'],
+                                    record['status'],
+                                    record['date_updated']))
+        event += (time.time() if recorded_at is None else recorded_at,)
+        line = _encode([owner, *event[:4], repr(event[4])])
+        with self._lock:
+            self.active.append(line)
+            self._index_event(len(self.blocks), owner, event)
+            if len(self.active) >= self.block_events:
+                self._write_block()
+
+    def _write_block(self) -> None:
+        if not self.active:
+            return
+        payload = zlib.compress(b'\n'.join(self.active))
+        if self.stream.tell() >= self.segment_bytes:
+            self.stream.close()
+            self.segment += 1
+            self.stream = open(self._path(self.segment), 'ab')
+        offset = self.stream.tell()
+        self.stream.write(BLOCK_HEADER.pack(len(payload),
+                                            zlib.crc32(payload)))
+        self.stream.write(payload)
+        self.stream.flush()
+        block = len(self.blocks)
+        self.blocks.append((self.segment, offset, len(payload)))
+        self._cache(block, self.active)
+        self.active = []
+
+    def _cache(self, block: int, events: List[bytes]) -> None:
+        self.cache[block] = events
+        if len(self.cache) > self.cache_blocks:
+            self.cache.popitem(last=False)
+
+    def _read_block(self, block: int) -> List[bytes]:
+        if block == len(self.blocks):
+            return self.active
+        events = self.cache.get(block)
+        if events is not None:
+            self.cache.move_to_end(block)
+            return events
+        segment, offset, length = self.blocks[block]
+        reader = self.readers.get(segment)
+        if reader is None:
+            reader = self.readers[segment] = open(self._path(segment), 'rb',
+                                                  buffering=0)
+        start = offset + BLOCK_HEADER.size
+        events = self._decode(os.pread(reader.fileno(), length, start))
+        self._cache(block, events)
+        return events
+
+    def status(self, owner) -> List[Event]:
+        """Latest event of every homework of the owner."""
+        with self._lock:
+            events = list(self.latest.get(str(owner), {}).values())
+        return sorted(events, key=lambda event: event[3] or '')
+
+    def history(self, owner, homework: str = None,
+                limit: int = 20) -> List[Event]:
+        """Newest first events of the owner, or of one of its homeworks.
+
+        homework is matched against the homework id and name.
+        """
+        owner = str(owner)
+        with self._lock:
+            if homework is None:
+                blocks = self.owner_blocks.get(owner, [])
+            else:
+                blocks = self.homework_blocks.get((owner, homework))
+                if blocks is None:
+                    homework = self._find_homework(owner, homework)
+                    blocks = self.homework_blocks.get((owner, homework), [])
+            prefix = f'{owner}\t'.encode()
+            events = []
+            for block in reversed(blocks):
+                for line in reversed(self._read_block(block)):
+                    if not line.startswith(prefix):
+                        continue
+                    event = _parse(line)
+                    if homework is not None and homework != (event[0]
+                                                             or event[1]):
+                        continue
+                    events.append(event)
+                    if len(events) >= limit:
+                        return events
+            return events
+
+    def _find_homework(self, owner: str, name: str) -> Optional[str]:
+        for key, event in self.latest.get(owner, {}).items():
+            if event[1] == name:
+                return key
+        return None
+
+    def flush(self) -> None:
+        """Write the unfinished block."""
+        with self._lock:
+            if self.is_open:
+                self._write_block()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.flush_interval):
+            self.flush()
+
+    def close(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._lock:
+            if self.is_open:
+                self._write_block()
+                self.stream.close()
+                self.stream = None
+            for reader in self.readers.values():
+                reader.close()
+            self.readers = {}
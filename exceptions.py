@@ -1,5 +1,9 @@
 class BadAPIHttpResponseCode(Exception):
-    pass
+    def __init__(self, message: str, status_code: int = None,
+                 retry_after: float = None) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
 
 
 class APIRequestProcessingError(Exception):
@@ -20,3 +24,11 @@ class UncknownError(Exception):
 
 class HomeworkNotFounr(Exception):
     pass
+
+
+class BadHomeworkRecord(Exception):
+    pass
+
+
+class CircuitOpenError(Exception):
+    pass
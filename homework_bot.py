@@ -1,20 +1,40 @@
-from datetime import datetime
 from dotenv import load_dotenv
 import os
 from telegram import Bot, TelegramError
 from telegram.update import Update
 from telegram.ext.callbackcontext import CallbackContext
 import time
-import requests
+import json
 import logging
-from exceptions import (BadAPIHttpResponseCode,
-                        APIRequestProcessingError,
-                        APIError,
-                        BadAPIResponseFormat)
-from loggers import TelegramBotLogger
-from http import HTTPStatus
-from json import JSONDecodeError
-from schema import Schema, SchemaError
+import signal
+import sys
+import threading
+from exceptions import (BadAPIResponseFormat,
+                        BadHomeworkRecord,
+                        CircuitOpenError)
+from loggers import (TelegramBotLogger,
+                     BOT_LOGGER_NAME,
+                     MAX_MESSAGE_LENGTH,
+                     Summary)
+from log_sink import AsyncRotatingFileHandler
+from api_client import PracticumAPIClient
+from circuit_breaker import CircuitBreaker, OPEN
+from drain import Drain
+from job_registry import JobRegistry
+from leader import LeaderLease
+from polling_engine import PollingEngine, Tenant
+from scheduler import AdaptivePollScheduler
+from storage import CursorStore, HomeworkStateIndex, SubscriptionStore
+from message_queue import OutgoingMessageQueue
+from outbox import Outbox, notification_key
+from profiler import Profiler
+from retry_policy import (AUTH, DEFAULT_RULES, PERMANENT, TRANSIENT,
+                          RetryPolicy, RetryRule)
+from event_log import EventLog
+from metrics import REGISTRY, MetricsServer
+from sharding import Supervisor
+from timing_wheel import TimingWheel
+from validators import validate_homework
 from telegram.ext import Updater, CommandHandler
 
 load_dotenv()
@@ -24,19 +44,74 @@ TELEGRAM_TOKEN = os.getenv('TELEGRAM_TOKEN')
 TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
 
 LOG_LEVEL = os.getenv('LOG_LEVEL') or logging.INFO
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES') or 10 * 1024 * 1024)
+LOG_ROTATE_INTERVAL = float(os.getenv('LOG_ROTATE_INTERVAL') or 24 * 3600)
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT') or 7)
+LOG_COMPRESS = os.getenv('LOG_COMPRESS', '').lower() in ('1', 'true', 'yes')
+LOG_FLUSH_INTERVAL = float(os.getenv('LOG_FLUSH_INTERVAL') or 1)
 TELEGRAM_LOG_LEVEL = os.getenv('TELEGRAM_LOG_LEVEL') or logging.ERROR
-HOMEWORK_INFO_SCHEMA: Schema = Schema({'date_updated': str,
-                                       'homework_name': str,
-                                       'id': int,
-                                       'lesson_name': int,
-                                       'reviewer_comment': str,
-                                       'status': str
-                                       })
+TELEGRAM_LOG_DIGEST_WINDOW = float(
+    os.getenv('TELEGRAM_LOG_DIGEST_WINDOW') or 5)
+TELEGRAM_LOG_BUFFER_SIZE = int(os.getenv('TELEGRAM_LOG_BUFFER_SIZE') or 100)
+TELEGRAM_LOG_DEDUP_TTL = float(os.getenv('TELEGRAM_LOG_DEDUP_TTL') or 600)
+TELEGRAM_LOG_ERRORS_FILE = (os.getenv('TELEGRAM_LOG_ERRORS_FILE')
+                            or 'logs/logger.log')
 
 RETRY_TIME = 600
+POLL_MIN_INTERVAL = int(os.getenv('POLL_MIN_INTERVAL') or 120)
+POLL_MAX_INTERVAL = int(os.getenv('POLL_MAX_INTERVAL') or 3600)
+POLL_JITTER = float(os.getenv('POLL_JITTER') or 0.1)
+POLL_TICK = float(os.getenv('POLL_TICK') or 1)
+LOG_PAYLOAD_EVERY = int(os.getenv('LOG_PAYLOAD_EVERY') or 10)
 ENDPOINT = 'https://practicum.yandex.ru/api/user_api/homework_statuses/'
 HEADERS = {'Authorization': f'OAuth {PRACTICUM_TOKEN}'}
 
+API_CONNECT_TIMEOUT = float(os.getenv('API_CONNECT_TIMEOUT') or 3.05)
+API_READ_TIMEOUT = float(os.getenv('API_READ_TIMEOUT') or 10)
+API_POOL_CONNECTIONS = int(os.getenv('API_POOL_CONNECTIONS') or 1)
+API_POOL_MAXSIZE = int(os.getenv('API_POOL_MAXSIZE') or 10)
+API_CACHE_TTL = float(os.getenv('API_CACHE_TTL') or 5)
+API_FAILURE_THRESHOLD = int(os.getenv('API_FAILURE_THRESHOLD') or 5)
+API_OUTAGE_BACKOFF = float(os.getenv('API_OUTAGE_BACKOFF') or 60)
+API_OUTAGE_MAX_BACKOFF = float(os.getenv('API_OUTAGE_MAX_BACKOFF') or 1800)
+API_RETRY_DELAY = float(os.getenv('API_RETRY_DELAY') or 5)
+API_AUTH_BACKOFF = float(os.getenv('API_AUTH_BACKOFF') or 3600)
+
+STATE_DB_PATH = os.getenv('STATE_DB_PATH') or 'data/state.sqlite3'
+CURSOR_FLUSH_INTERVAL = float(os.getenv('CURSOR_FLUSH_INTERVAL') or 5)
+OUTBOX_DB_PATH = os.getenv('OUTBOX_DB_PATH') or 'data/outbox.sqlite3'
+OUTBOX_RETRY_BACKOFF = float(os.getenv('OUTBOX_RETRY_BACKOFF') or 30)
+OUTBOX_PUT_TIMEOUT = float(os.getenv('OUTBOX_PUT_TIMEOUT') or 5)
+EVENT_LOG_DIR = os.getenv('EVENT_LOG_DIR') or 'data/events'
+HISTORY_LIMIT = int(os.getenv('HISTORY_LIMIT') or 20)
+PROFILE_DIR = os.getenv('PROFILE_DIR') or 'logs/profiles'
+PROFILE_TOP = int(os.getenv('PROFILE_TOP') or 30)
+ADMIN_CHAT_IDS = {chat_id.strip() for chat_id in (
+    os.getenv('ADMIN_CHAT_IDS') or TELEGRAM_CHAT_ID or '').split(',')
+    if chat_id.strip()}
+DEFAULT_TENANT = 'default'
+FROM_DATE_OVERLAP = int(os.getenv('FROM_DATE_OVERLAP') or 3600)
+
+SENDER_WORKERS = int(os.getenv('SENDER_WORKERS') or 4)
+TELEGRAM_GLOBAL_RATE = float(os.getenv('TELEGRAM_GLOBAL_RATE') or 25)
+TELEGRAM_CHAT_RATE = float(os.getenv('TELEGRAM_CHAT_RATE') or 1)
+
+METRICS_PORT = int(os.getenv('METRICS_PORT') or 0)
+
+TENANTS_FILE = os.getenv('TENANTS_FILE')
+MAX_IN_FLIGHT = int(os.getenv('MAX_IN_FLIGHT') or API_POOL_MAXSIZE)
+WORKER_PROCESSES = int(os.getenv('WORKER_PROCESSES') or 0)
+WORKERS_CHECK_INTERVAL = 10
+SHUTDOWN_TIMEOUT = float(os.getenv('SHUTDOWN_TIMEOUT') or 30)
+LEADER_LEASE_SECONDS = float(os.getenv('LEADER_LEASE_SECONDS') or 0)
+
+BOT_MODE = os.getenv('BOT_MODE') or 'polling'
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN') or '0.0.0.0'
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT') or 8443)
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH')
+WEBHOOK_PATH_MIN_LENGTH = 32
+
 
 HOMEWORK_STATUSES = {
     'approved': 'Работа проверена: ревьюеру всё понравилось. Ура!',
@@ -45,19 +120,109 @@ HOMEWORK_STATUSES = {
 }
 
 
-logger: logging.Logger = logging.getLogger(__name__)
+logger: logging.Logger = logging.getLogger(BOT_LOGGER_NAME)
+
+api_breaker = CircuitBreaker(failure_threshold=API_FAILURE_THRESHOLD,
+                             base_backoff=API_OUTAGE_BACKOFF,
+                             max_backoff=API_OUTAGE_MAX_BACKOFF)
+api_client = PracticumAPIClient(ENDPOINT,
+                                connect_timeout=API_CONNECT_TIMEOUT,
+                                read_timeout=API_READ_TIMEOUT,
+                                pool_connections=API_POOL_CONNECTIONS,
+                                pool_maxsize=API_POOL_MAXSIZE,
+                                breaker=api_breaker,
+                                cache_ttl=API_CACHE_TTL,
+                                payload_log_every=LOG_PAYLOAD_EVERY)
+
+retry_policy = RetryPolicy({
+    TRANSIENT: RetryRule(API_RETRY_DELAY, POLL_MIN_INTERVAL,
+                         budget=DEFAULT_RULES[TRANSIENT].budget, park=None),
+    AUTH: RetryRule(API_AUTH_BACKOFF, 4 * API_AUTH_BACKOFF,
+                    budget=DEFAULT_RULES[AUTH].budget,
+                    park=24 * API_AUTH_BACKOFF),
+})
+
+poll_scheduler = AdaptivePollScheduler(RETRY_TIME,
+                                       POLL_MIN_INTERVAL,
+                                       POLL_MAX_INTERVAL,
+                                       jitter=POLL_JITTER)
+
+polling_jobs = JobRegistry()
+running_polls = Drain()
+shutdown_requested = threading.Event()
+cursor_store = CursorStore(STATE_DB_PATH,
+                           flush_interval=CURSOR_FLUSH_INTERVAL)
+state_index = HomeworkStateIndex(STATE_DB_PATH,
+                                 flush_interval=CURSOR_FLUSH_INTERVAL)
+outbox = Outbox(OUTBOX_DB_PATH, retry_backoff=OUTBOX_RETRY_BACKOFF)
+subscription_store = SubscriptionStore(STATE_DB_PATH,
+                                       flush_interval=CURSOR_FLUSH_INTERVAL)
+started_chats = SubscriptionStore(STATE_DB_PATH,
+                                  flush_interval=CURSOR_FLUSH_INTERVAL,
+                                  table='started_chats')
+leader = LeaderLease(STATE_DB_PATH, ttl=LEADER_LEASE_SECONDS)
+event_log = EventLog(EVENT_LOG_DIR, flush_interval=CURSOR_FLUSH_INTERVAL)
+
+profiler = Profiler([(sys.modules[__name__], 'check_homeworks'),
+                     (sys.modules[__name__], 'get_api_answer'),
+                     (TelegramBotLogger, 'emit')],
+                    directory=PROFILE_DIR,
+                    top=PROFILE_TOP)
+
+message_queue = OutgoingMessageQueue(workers=SENDER_WORKERS,
+                                     global_rate=TELEGRAM_GLOBAL_RATE,
+                                     chat_rate=TELEGRAM_CHAT_RATE)
+
+VALIDATION_FAILURES = REGISTRY.counter(
+    'homework_bot_validation_failures_total',
+    'Homework records rejected by check_response')
+NOTIFICATIONS = REGISTRY.counter(
+    'homework_bot_notifications_total',
+    'Status change notifications passed to the sender')
+POLL_SECONDS = REGISTRY.histogram(
+    'homework_bot_poll_seconds',
+    'Duration of a poll: request, validation, parsing and enqueueing',
+    ('mode',))
+JOB_LAG_SECONDS = REGISTRY.histogram(
+    'homework_bot_job_lag_seconds',
+    'Delay of a poll job start after its scheduled time',
+    buckets=(0.01, 0.1, 0.5, 1, 5, 10, 30, 60, 300, RETRY_TIME))
+REGISTRY.gauge('homework_bot_api_circuit_open',
+               'Whether the Practicum API circuit breaker rejects calls',
+               lambda: int(api_breaker.state == OPEN))
+REGISTRY.gauge('homework_bot_api_circuit_rejected',
+               'Calls rejected by the open circuit breaker',
+               lambda: api_breaker.rejected)
+REGISTRY.gauge('homework_bot_leader',
+               'Whether this replica holds the poller lease',
+               lambda: int(leader.is_leader))
+REGISTRY.gauge('homework_bot_polling_chats',
+               'Chats with a scheduled homework check',
+               polling_jobs.__len__)
+REGISTRY.gauge('homework_bot_send_queue_depth',
+               'Notifications waiting in the outgoing queue',
+               message_queue.depth)
 
 
 last_update_timestamp = int(time.time())
 
 
-def init_logger(logging_level: int) -> logging.Logger:
+def init_logger(logging_level: int,
+                log_file: str = 'logs/main.log') -> logging.Logger:
     """Logging initialization."""
-    os.makedirs('logs', exist_ok=True)
-    logger = logging.getLogger(__name__)
+    directory = os.path.dirname(log_file)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    logger = logging.getLogger(BOT_LOGGER_NAME)
     logger.setLevel(logging_level)
     formatter = logging.Formatter('%(asctime)s, %(levelname)s, %(message)s')
-    file_handler = logging.FileHandler(filename='logs/main.log', mode='w')
+    file_handler = AsyncRotatingFileHandler(
+        log_file,
+        max_bytes=LOG_MAX_BYTES,
+        rotate_interval=LOG_ROTATE_INTERVAL,
+        backup_count=LOG_BACKUP_COUNT,
+        compress=LOG_COMPRESS,
+        flush_interval=LOG_FLUSH_INTERVAL)
     file_handler.setFormatter(formatter)
     file_handler.setLevel(logging_level)
 
@@ -72,11 +237,17 @@ def init_logger(logging_level: int) -> logging.Logger:
 
 def init_telegram_logger(logging_level):
     """Initializing the logger, which sends error messages to the user."""
-    logger = logging.getLogger(__name__)
+    logger = logging.getLogger(BOT_LOGGER_NAME)
     formatter = logging.Formatter('%(asctime)s, %(levelname)s, %(message)s')
-    telegram_logger = TelegramBotLogger(logging_level,
-                                        Bot(token=TELEGRAM_TOKEN),
-                                        TELEGRAM_CHAT_ID)
+    telegram_logger = TelegramBotLogger(
+        logging_level,
+        Bot(token=TELEGRAM_TOKEN),
+        TELEGRAM_CHAT_ID,
+        digest_window=TELEGRAM_LOG_DIGEST_WINDOW,
+        buffer_size=TELEGRAM_LOG_BUFFER_SIZE,
+        dedup_ttl=TELEGRAM_LOG_DEDUP_TTL,
+        repeats_flush_interval=TELEGRAM_LOG_DEDUP_TTL,
+        log_file=TELEGRAM_LOG_ERRORS_FILE)
     telegram_logger.setFormatter(formatter)
     logger.addHandler(telegram_logger)
     logger.info(f"Telegram Log inited. Logging level={logging_level}")
@@ -84,38 +255,53 @@ def init_telegram_logger(logging_level):
 
 def send_message(bot: Bot, message: str):
     """Send message to the end user."""
+    notify(bot, TELEGRAM_CHAT_ID, message)
+
+
+def notify(bot: Bot, chat_id, message: str, key: str = None):
+    """Queue message to the chat, send it directly if queue is unavailable.
+
+    Messages with an idempotency key go through the outbox when it runs
+    and commits them within OUTBOX_PUT_TIMEOUT seconds.
+    """
+    if key is not None and outbox.put(chat_id, message, key,
+                                      timeout=OUTBOX_PUT_TIMEOUT):
+        return
+    if not message_queue.put(chat_id, message):
+        send_chat_message(bot, chat_id, message)
+
+
+def notify_many(bot: Bot, messages: list):
+    """Persist (chat_id, text, key) messages in one outbox commit.
+
+    Sends them without the outbox when it does not commit them within
+    OUTBOX_PUT_TIMEOUT seconds.
+    """
+    if outbox.put_many(messages, timeout=OUTBOX_PUT_TIMEOUT):
+        return
+    for chat_id, message, _ in messages:
+        notify(bot, chat_id, message)
+
+
+def relay_message(chat_id, message: str, key: str) -> bool:
+    """Hand outbox message to the sender queue."""
+    return message_queue.put(chat_id, message, key)
+
+
+def send_chat_message(bot: Bot, chat_id, message: str):
+    """Send message to the given chat."""
     try:
-        logger.info(f"Send message to {TELEGRAM_CHAT_ID}:{message}")
-        bot.send_message(text=message, chat_id=TELEGRAM_CHAT_ID)
+        logger.info('Send message to %s:%s', chat_id, message)
+        bot.send_message(text=message, chat_id=chat_id)
         logger.info("Message sent")
     except TelegramError as error:
-        logger.error(f'Sending message error:{error}')
+        logger.error('Sending message error:%s', error)
 
 
 def get_api_answer(current_timestamp: int = None) -> dict:
     """Get homework status info."""
     timestamp = current_timestamp or int(time.time())
-    params = {'from_date': timestamp}
-    timestamp_str = datetime.fromtimestamp(timestamp)
-    try:
-        logger.info(
-            ("Sending request to yandex API. "
-             f"timestamp={timestamp}({timestamp_str})"))
-        response = requests.get(ENDPOINT, headers=HEADERS, params=params)
-        logger.info(f'Data received:{response.json()}')
-        if response.status_code == HTTPStatus.OK:
-            result = response.json()
-            if 'error' in result:
-                raise APIError(f"Error at API response: {result.get('error')}")
-        else:
-            raise BadAPIHttpResponseCode(
-                ("Bad response code from"
-                 f"yandex API recieved:{response.status_code}"))
-    except requests.exceptions.RequestException as error:
-        raise APIRequestProcessingError(f"Process request error:{error}")
-    except JSONDecodeError or ValueError as error:
-        raise BadAPIResponseFormat(f'API response format error:{error}')
-    return result
+    return api_client.get_homework_statuses(timestamp, HEADERS)
 
 
 def check_response(response: dict) -> list:
@@ -135,16 +321,19 @@ def check_response(response: dict) -> list:
     raw_homeworks = response['homeworks']
     homeworks = []
     if raw_homeworks:
-        logger.info(f'Recieved data contain {len(raw_homeworks)} records.')
+        logger.info('Recieved data contain %d records.', len(raw_homeworks))
 
         for homework in raw_homeworks:
             try:
-                HOMEWORK_INFO_SCHEMA.is_valid(homework)
-                homeworks.append(homework)
-            except SchemaError as error:
-                logger.error(
-                    f'Wrong homework data format:{error} at {homework}')
-        logger.info(f'The resulting list contains {len(homeworks)} items')
+                record = validate_homework(homework)
+                if record.status not in HOMEWORK_STATUSES:
+                    raise BadHomeworkRecord(
+                        f'unknown status {record.status!r} in {homework}')
+                homeworks.append(record)
+            except BadHomeworkRecord as error:
+                VALIDATION_FAILURES.inc()
+                logger.error('Wrong homework data format:%s', error)
+        logger.info('The resulting list contains %d items', len(homeworks))
         return homeworks
     else:
         logger.info('Response homworks list is empty')
@@ -152,61 +341,463 @@ def check_response(response: dict) -> list:
 
 def parse_status(homework: str) -> str:
     """Pasrse API repsponse and return given homework status."""
-    logger.info(f"Parse homework status for {homework}")
+    logger.debug('Parse homework status for %s', Summary(homework))
     homework_name = homework['homework_name']
     homework_status = homework['status']
     verdict = HOMEWORK_STATUSES[homework_status]
 
-    logger.info((f"{homework_name} status is changed! "
-                f"New status is '{homework['status']}',"
-                 f" updated at {homework['date_updated']})"))
+    logger.info("%s status is changed! New status is '%s', updated at %s)",
+                homework_name, homework_status, homework['date_updated'])
     return f'Изменился статус проверки работы "{homework_name}". {verdict}'
 
 
 def check_tokens() -> bool:
-    """Check required env params."""
+    """Check required env params.
+
+    PRACTICUM_TOKEN is not required in sharded mode, where every
+    subscriber brings its own token.
+    """
     logger.info("Tokens checking")
     result = True
     tokens = {
-        'PRACTICUM_TOKEN': PRACTICUM_TOKEN,
         'TELEGRAM_TOKEN': TELEGRAM_TOKEN,
         'TELEGRAM_CHAT_ID': TELEGRAM_CHAT_ID
     }
+    if not WORKER_PROCESSES:
+        tokens['PRACTICUM_TOKEN'] = PRACTICUM_TOKEN
     for name, value in tokens.items():
         if not value:
             logger.critical(f'Token {name} is not set')
             result = False
+    if BOT_MODE == 'webhook' and not WEBHOOK_URL:
+        logger.critical('WEBHOOK_URL is required when BOT_MODE=webhook')
+        result = False
+    if BOT_MODE == 'webhook' and not is_secret_path(WEBHOOK_PATH):
+        logger.critical(f'WEBHOOK_PATH must be a random secret of at least '
+                        f'{WEBHOOK_PATH_MIN_LENGTH} characters when '
+                        f'BOT_MODE=webhook, anyone knowing it can post '
+                        f'updates to the bot')
+        result = False
     return result
 
 
+def is_secret_path(path: str) -> bool:
+    """Check webhook path is long enough not to be guessed."""
+    return bool(path) and len(path.strip('/')) >= WEBHOOK_PATH_MIN_LENGTH
+
+
 def start(update: Update, context: CallbackContext):
     """Starting command callback."""
+    chat_id = update.message.chat_id
+    if chat_id in polling_jobs:
+        logger.info(f'Chat {chat_id} is already checking homework')
+        send_chat_message(context.bot, chat_id,
+                          'Already checking the status of homework')
+        return
+    if not start_checks(context.job_queue, chat_id):
+        return
+    started_chats.set(chat_id, DEFAULT_TENANT)
+    started_chats.flush()
     logger.info('Starting to check the status of homework')
     send_message(context.bot, "Starting to check the status of homework")
-    context.job_queue.run_repeating(check_homeworks,
-                                    RETRY_TIME,
-                                    context=update.message.chat_id)
 
 
+def start_checks(job_queue, chat_id) -> bool:
+    """Register the first check job of the chat, False if it has one."""
+    job = job_queue.run_once(check_homeworks, 0, context=chat_id)
+    if not polling_jobs.add(chat_id, job):
+        job.schedule_removal()
+        return False
+    return True
+
+
+def resume_checks(job_queue) -> int:
+    """Start checks of the chats started before a restart or failover."""
+    started_chats.open()
+    resumed = sum(start_checks(job_queue, chat_id)
+                  for chat_id, _ in started_chats.items())
+    logger.info(f'Resumed homework checks of {resumed} chats')
+    return resumed
+
+
+def log_poll_failure(retry, error: Exception):
+    """Log failed poll by its error class.
+
+    Unexpected errors keep their traceback, auth failures reach the
+    Telegram error log, retried network errors are warnings.
+    """
+    if retry.kind == PERMANENT:
+        logger.exception('Failed to retrieve homework status data '
+                         '(attempt %d): %s', retry.attempt, error)
+    elif retry.kind == AUTH:
+        logger.error('Practicum API rejected the token, attempt %d, '
+                     'next try in %.0fs: %s', retry.attempt, retry.delay,
+                     error)
+    else:
+        logger.warning('Failed to retrieve homework status data (%s, '
+                       'attempt %d): %s', retry.kind, retry.attempt, error)
+
+
+def schedule_next_check(context: CallbackContext, chat_id,
+                        interval: float) -> bool:
+    """Replace the running check job, False if the chat was stopped."""
+    job = context.job_queue.run_once(check_homeworks,
+                                     interval,
+                                     context=chat_id)
+    if not polling_jobs.replace(chat_id, context.job, job):
+        job.schedule_removal()
+        return False
+    return True
+
+
+@running_polls.job
 def check_homeworks(context: CallbackContext):
     """Main check homeworks status function."""
     global last_update_timestamp
+    statuses = None
+    retry = None
+    chat_id = context.job.context
+    if not polling_jobs.is_current(chat_id, context.job):
+        return
+    if not leader.is_leader:
+        logger.warning('Poller lease is held by another replica, '
+                       'check skipped')
+        schedule_next_check(context, chat_id, RETRY_TIME)
+        return
+    JOB_LAG_SECONDS.observe(poll_scheduler.lag(chat_id))
+    started = time.perf_counter()
     try:
-        response = get_api_answer(last_update_timestamp)
+        response = get_api_answer(last_update_timestamp - FROM_DATE_OVERLAP)
         homeworks = check_response(response)
-        if homeworks:
-            for homework in homeworks:
-                send_message(context.bot, parse_status(homework))
+        changed = [homework for homework in homeworks or ()
+                   if state_index.is_changed(DEFAULT_TENANT, homework)]
+        messages = [(TELEGRAM_CHAT_ID,
+                     parse_status(homework),
+                     notification_key(TELEGRAM_CHAT_ID, homework))
+                    for homework in changed]
+        notify_many(context.bot, messages)
+        NOTIFICATIONS.inc(len(messages))
+        statuses = []
+        for homework in changed:
+            if state_index.is_transition(DEFAULT_TENANT, homework):
+                event_log.append(DEFAULT_TENANT, homework)
+                statuses.append(homework['status'])
 
         last_update_timestamp = response.get('current_date',
                                              last_update_timestamp)
+        cursor_store.set(DEFAULT_TENANT, last_update_timestamp)
+    except CircuitOpenError as error:
+        logger.warning('Practicum API is unavailable: %s', error)
     except Exception as error:
-        logger.exception(f'Failed to retrieve homework status data: {error}')
+        retry = retry_policy.on_failure(chat_id, error)
+        log_poll_failure(retry, error)
+    else:
+        retry_policy.on_success(chat_id)
+    finally:
+        POLL_SECONDS.labels('single').observe(time.perf_counter() - started)
+        interval = poll_scheduler.schedule(
+            chat_id, statuses,
+            override=retry.delay if retry is not None else None,
+            at_least=api_breaker.remaining())
+        if (schedule_next_check(context, chat_id, interval)
+                and logger.isEnabledFor(logging.INFO)):
+            logger.info('Next check in %.0fs, scheduler stats: %s, '
+                        'sender stats: %s', interval,
+                        poll_scheduler.stats(), message_queue.stats())
+
+
+def load_tenants(path: str) -> list:
+    """Load tenants list from json file [{"token": .., "chat_id": ..}]."""
+    with open(path, encoding='utf-8') as tenants_file:
+        return [Tenant(item['token'],
+                       item['chat_id'],
+                       cursor_store.get(tenant_cursor_key(item['chat_id'])))
+                for item in json.load(tenants_file)]
+
+
+def tenant_cursor_key(chat_id) -> str:
+    """Cursor store key of the tenant from_date."""
+    return f'chat:{chat_id}'
+
+
+def make_engine(bot: Bot) -> PollingEngine:
+    """Polling engine notifying through the bot and keeping bot state."""
+    return PollingEngine(
+        api_client,
+        check_response,
+        parse_status,
+        lambda chat_id, text, key: notify(bot, chat_id, text, key),
+        max_in_flight=MAX_IN_FLIGHT,
+        scheduler=poll_scheduler,
+        on_cursor=lambda tenant: cursor_store.set(
+            tenant_cursor_key(tenant.chat_id), tenant.from_date),
+        state_index=state_index,
+        event_log=event_log,
+        from_date_overlap=FROM_DATE_OVERLAP,
+        wheel=TimingWheel(POLL_TICK),
+        retry_policy=retry_policy)
+
+
+@running_polls.job
+def check_tenants(context: CallbackContext):
+    """Poll homework statuses for tenants due in this tick."""
+    if not leader.is_leader:
+        return
+    engine = context.job.context
+    started = time.monotonic()
+    with POLL_SECONDS.labels('tenants').time():
+        sent = engine.run_due()
+    if not sent:
+        return
+    NOTIFICATIONS.inc(sum(sent))
+    if logger.isEnabledFor(logging.INFO):
+        logger.info('Polled %d of %d tenants in %.2fs, %d notifications sent, '
+                    'scheduler stats: %s, sender stats: %s',
+                    len(sent), len(engine.wheel), time.monotonic() - started,
+                    sum(sent), poll_scheduler.stats(), message_queue.stats())
 
 
 def stop(update: Update, context: CallbackContext):
     """Stoping command callback."""
-    context.job_queue.stop()
+    chat_id = update.message.chat_id
+    started_chats.remove(chat_id)
+    started_chats.flush()
+    if polling_jobs.remove(chat_id) is not None:
+        poll_scheduler.forget(chat_id)
+        retry_policy.forget(chat_id)
+        logger.info(f'Chat {chat_id} stopped checking homework')
+
+
+def event_owner(chat_id) -> str:
+    """Event log owner of the chat.
+
+    Tenant chats own their events, TELEGRAM_CHAT_ID sees the statuses
+    polled with PRACTICUM_TOKEN.
+    """
+    if str(chat_id) == str(TELEGRAM_CHAT_ID):
+        return DEFAULT_TENANT
+    return str(chat_id)
+
+
+def format_event(event) -> str:
+    """One line of /status and /history answers."""
+    _, homework_name, status, date_updated, _ = event
+    verdict = HOMEWORK_STATUSES.get(status, status)
+    return f'{date_updated or "-"} {homework_name}: {verdict}'
+
+
+def reply_lines(bot: Bot, chat_id, lines: list, empty: str):
+    """Send lines as one message cut to the Telegram length limit."""
+    text = '\n'.join(lines) or empty
+    send_chat_message(bot, chat_id, text[:MAX_MESSAGE_LENGTH])
+
+
+def status(update: Update, context: CallbackContext):
+    """Latest status of every homework, from the event log."""
+    chat_id = update.message.chat_id
+    events = event_log.status(event_owner(chat_id))
+    reply_lines(context.bot, chat_id, [format_event(event)
+                                       for event in events],
+                'No homework statuses yet')
+
+
+def history(update: Update, context: CallbackContext):
+    """Status changes, newest first: /history [homework id or name]."""
+    chat_id = update.message.chat_id
+    homework = ' '.join(context.args) if context.args else None
+    events = event_log.history(event_owner(chat_id), homework,
+                               limit=HISTORY_LIMIT)
+    reply_lines(context.bot, chat_id, [format_event(event)
+                                       for event in events],
+                'No status changes recorded')
+
+
+def profile(update: Update, context: CallbackContext):
+    """Admin command: /profile [start|stop|status], toggles without args."""
+    chat_id = update.message.chat_id
+    if str(chat_id) not in ADMIN_CHAT_IDS:
+        logger.warning(f'Chat {chat_id} is not allowed to profile')
+        return
+    action = context.args[0] if context.args else (
+        'stop' if profiler.running else 'start')
+    if action == 'start':
+        started = profiler.start()
+        text = 'Profiling started' if started else 'Profiling is running'
+    elif action == 'stop':
+        lines = profiler.stage_report()
+        path = profiler.stop()
+        text = '\n'.join([f'Profile saved to {path}', *lines] if path
+                         else ['Profiling is not running'])
+    else:
+        text = '\n'.join(['Profiling is ' + (
+            'running' if profiler.running else 'off'),
+            *profiler.stage_report()])
+    send_chat_message(context.bot, chat_id, text[:MAX_MESSAGE_LENGTH])
+
+
+def toggle_profiling(signum=None, frame=None):
+    """SIGUSR1 handler: start or stop profiling off the signal handler."""
+    action = profiler.stop if profiler.running else profiler.start
+    threading.Thread(target=action, name='profiler', daemon=True).start()
+
+
+def sharded_start(update: Update, context: CallbackContext):
+    """Starting command callback in sharded mode: /start <practicum token>."""
+    supervisor = context.bot_data['supervisor']
+    tokens = context.bot_data['tokens']
+    chat_id = update.message.chat_id
+    token = context.args[0] if context.args else tokens.get(chat_id)
+    if not token:
+        send_chat_message(context.bot, chat_id,
+                          'Send /start <Practicum OAuth token>')
+        return
+    tokens[chat_id] = token
+    shard = supervisor.subscribe(chat_id, token)
+    logger.info(f'Chat {chat_id} subscribed on shard {shard}')
+    send_chat_message(context.bot, chat_id,
+                      "Starting to check the status of homework")
+
+
+def sharded_stop(update: Update, context: CallbackContext):
+    """Stoping command callback in sharded mode."""
+    context.bot_data['supervisor'].unsubscribe(update.message.chat_id)
+
+
+def restore_state():
+    """Resume polling from the last stored current_date."""
+    global last_update_timestamp
+    cursor_store.open()
+    state_index.open()
+    outbox.open()
+    last_update_timestamp = cursor_store.get(DEFAULT_TENANT,
+                                             last_update_timestamp)
+    logger.info(f'Polling resumes from {last_update_timestamp}')
+
+
+def start_outbox():
+    """Relay outbox messages through the sender queue."""
+    message_queue.on_delivered = outbox.delivered
+    message_queue.on_failed = outbox.failed
+    message_queue.on_released = outbox.released
+    outbox.start(relay_message)
+
+
+def start_supervisor(updater: Updater) -> Supervisor:
+    """Start shard workers, route /start and /stop to them."""
+    subscription_store.open()
+    supervisor = Supervisor(WORKER_PROCESSES, tick=POLL_TICK,
+                            store=subscription_store)
+    supervisor.start()
+    tokens = dict(supervisor.subscribers)
+    if TENANTS_FILE:
+        for tenant in load_tenants(TENANTS_FILE):
+            tokens[tenant.chat_id] = tenant.token
+            supervisor.subscribe(tenant.chat_id, tenant.token)
+    updater.dispatcher.bot_data.update(supervisor=supervisor, tokens=tokens)
+    updater.dispatcher.add_handler(CommandHandler('start', sharded_start))
+    updater.dispatcher.add_handler(CommandHandler('stop', sharded_stop))
+    updater.job_queue.run_repeating(supervisor.check_workers,
+                                    WORKERS_CHECK_INTERVAL)
+    logger.info(f'Sharded mode: {WORKER_PROCESSES} workers, '
+                f'{len(tokens)} subscribers')
+    return supervisor
+
+
+def start_receiving(updater: Updater):
+    """Receive updates by webhook or by long polling, see BOT_MODE."""
+    if BOT_MODE == 'webhook':
+        if not is_secret_path(WEBHOOK_PATH):
+            raise ValueError('WEBHOOK_PATH is not a secret path')
+        url_path = WEBHOOK_PATH.strip('/')
+        updater.start_webhook(listen=WEBHOOK_LISTEN,
+                              port=WEBHOOK_PORT,
+                              url_path=url_path,
+                              webhook_url=f"{WEBHOOK_URL.rstrip('/')}/"
+                                          f"{url_path}")
+        logger.info(f'Receiving updates by webhook at '
+                    f'{WEBHOOK_LISTEN}:{WEBHOOK_PORT}')
+    else:
+        updater.start_polling()
+        logger.info('Receiving updates by long polling')
+
+
+def request_shutdown(signum, frame):
+    """Stop signal handler, a second signal exits at once."""
+    if shutdown_requested.is_set():
+        os._exit(1)
+    logger.info(f'Received signal {signum}, shutting down')
+    shutdown_requested.set()
+
+
+def handle_stop_signals():
+    """Turn SIGINT, SIGTERM and SIGABRT into a shutdown request."""
+    for signum in (signal.SIGINT, signal.SIGTERM, signal.SIGABRT):
+        signal.signal(signum, request_shutdown)
+
+
+def wait_for_shutdown():
+    """Block until a shutdown is requested, replaces updater.idle()."""
+    while not shutdown_requested.wait(1):
+        pass
+
+
+def shutdown(updater: Updater = None,
+             supervisor: Supervisor = None,
+             engine: PollingEngine = None):
+    """Stop within SHUTDOWN_TIMEOUT seconds without losing notifications.
+
+    Poll jobs stop being started and the running ones are awaited
+    before updates, the job queue and the polling engine stop, so their
+    statuses and cursors are saved. Queued messages are sent while time
+    is left, the undelivered notifications stay in the outbox for the
+    next start. State stores and the Telegram error logger are flushed
+    last, then the poller lease is released for a standby replica.
+    """
+    deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+
+    def remaining() -> float:
+        return max(0.0, deadline - time.monotonic())
+
+    scheduler = updater.job_queue.scheduler if updater is not None else None
+    if scheduler is not None and scheduler.running:
+        scheduler.pause()
+    polls_stopped = running_polls.close(remaining())
+    if not polls_stopped:
+        logger.warning(f'{running_polls.active} polls still running '
+                       f'after {SHUTDOWN_TIMEOUT}s')
+    if scheduler is not None and scheduler.running:
+        scheduler.shutdown(wait=False)
+    if updater is not None:
+        updater.stop()
+    if engine is not None:
+        engine.close(wait=polls_stopped)
+    profiler.stop()
+    if supervisor is not None:
+        supervisor.stop(remaining())
+    if message_queue.running and not message_queue.stop(remaining()):
+        logger.warning(f'{message_queue.depth()} messages unsent at '
+                       f'shutdown, notifications stay in the outbox')
+    close_stores()
+    logger.info(f'Stopped in {SHUTDOWN_TIMEOUT - remaining():.1f}s')
+    close_telegram_loggers(remaining())
+    leader.release()
+
+
+def close_stores():
+    """Flush pending state to SQLite and close the stores."""
+    outbox.close()
+    event_log.close()
+    cursor_store.close()
+    state_index.close()
+    subscription_store.close()
+    started_chats.close()
+
+
+def close_telegram_loggers(timeout: float):
+    """Send the buffered error digests within timeout seconds."""
+    for handler in logger.handlers:
+        if isinstance(handler, TelegramBotLogger):
+            handler.close(timeout)
 
 
 def main():
@@ -220,14 +811,50 @@ def main():
         logger.critical("Tokens are not set. The bot is stopped")
         return
 
+    updater = supervisor = engine = None
+    handle_stop_signals()
     try:
+        if LEADER_LEASE_SECONDS:
+            leader.open()
+        # A standby waits here, its chats are resumed from the store.
+        if not leader.wait(shutdown_requested):
+            return
+        leader.start(on_lost=shutdown_requested.set)
+        restore_state()
+        if METRICS_PORT:
+            MetricsServer(METRICS_PORT).start()
+            logger.info(f'Metrics served at :{METRICS_PORT}/metrics')
         updater = Updater(TELEGRAM_TOKEN, use_context=True)
-        updater.dispatcher.add_handler(CommandHandler('start', start))
-        updater.dispatcher.add_handler(CommandHandler('stop', stop))
-        updater.start_polling()
-        updater.idle()
+        message_queue.start(updater.bot)
+        start_outbox()
+        updater.dispatcher.add_handler(CommandHandler('profile', profile))
+        if hasattr(signal, 'SIGUSR1'):
+            signal.signal(signal.SIGUSR1, toggle_profiling)
+        if WORKER_PROCESSES:
+            supervisor = start_supervisor(updater)
+        else:
+            event_log.open()
+            updater.dispatcher.add_handler(CommandHandler('start', start))
+            updater.dispatcher.add_handler(CommandHandler('stop', stop))
+            updater.dispatcher.add_handler(CommandHandler('status', status))
+            updater.dispatcher.add_handler(CommandHandler('history',
+                                                          history))
+            resume_checks(updater.job_queue)
+        if TENANTS_FILE and not WORKER_PROCESSES:
+            tenants = load_tenants(TENANTS_FILE)
+            engine = make_engine(updater.bot)
+            engine.add(tenants)
+            updater.job_queue.run_repeating(check_tenants,
+                                            POLL_TICK,
+                                            first=0,
+                                            context=engine)
+            logger.info(f'Multi-tenant polling for {len(tenants)} tenants')
+        start_receiving(updater)
+        wait_for_shutdown()
     except Exception as exception:
         logger.critical(f"Error at bot startup:{exception}")
+    finally:
+        shutdown(updater, supervisor, engine)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,58 @@
+import threading
+from typing import Dict, Hashable, Optional
+
+from telegram.ext import Job
+
+
+class JobRegistry:
+    """Current polling job of every chat.
+
+    check_homeworks reschedules itself with run_once, so the registry
+    keeps the latest job of each chat. Lookups are dict operations,
+    cheap for any number of subscribers. A job that is no longer the
+    registered one for its chat is stale and must not reschedule.
+    """
+
+    def __init__(self) -> None:
+        self.jobs: Dict[Hashable, Job] = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, chat_id: Hashable) -> bool:
+        return chat_id in self.jobs
+
+    def __len__(self) -> int:
+        return len(self.jobs)
+
+    def get(self, chat_id: Hashable) -> Optional[Job]:
+        return self.jobs.get(chat_id)
+
+    def add(self, chat_id: Hashable, job: Job) -> bool:
+        """Register job of a new chat, False if the chat already has one."""
+        with self._lock:
+            if chat_id in self.jobs:
+                return False
+            self.jobs[chat_id] = job
+            return True
+
+    def replace(self, chat_id: Hashable, current: Job, job: Job) -> bool:
+        """Swap current job of the chat for job.
+
+        Returns False, leaving the registry untouched, when current is
+        not the registered job (the chat was stopped or restarted).
+        """
+        with self._lock:
+            if self.jobs.get(chat_id) is not current:
+                return False
+            self.jobs[chat_id] = job
+            return True
+
+    def is_current(self, chat_id: Hashable, job: Job) -> bool:
+        return self.jobs.get(chat_id) is job
+
+    def remove(self, chat_id: Hashable) -> Optional[Job]:
+        """Unregister and cancel the chat's job, return it."""
+        with self._lock:
+            job = self.jobs.pop(chat_id, None)
+        if job is not None:
+            job.schedule_removal()
+        return job
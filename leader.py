@@ -0,0 +1,124 @@
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import Callable, Optional
+
+from loggers import get_logger
+from storage import connect
+
+logger: logging.Logger = get_logger(__name__)
+
+
+class LeaderLease:
+    """Lease based leader election over a SQLite table.
+
+    The holder of the named lease is the leader until expires_at, it
+    renews the lease every ttl / 3 seconds. A replica may take the
+    lease over once it expired, so a standby becomes the leader within
+    ttl + ttl / 3 seconds after the leader died; release() on a clean
+    stop hands it over at the next attempt. The leader counts its own
+    lease from before the write, so it stops being the leader no later
+    than a standby may take over. A ttl of 0 disables the election,
+    every replica is then the leader.
+    """
+
+    def __init__(self,
+                 path: str,
+                 name: str = 'poller',
+                 ttl: float = 30,
+                 holder: str = None,
+                 clock: Callable[[], float] = time.time) -> None:
+        self.path = path
+        self.name = name
+        self.ttl = ttl
+        self.renew_interval = ttl / 3
+        self.holder = holder or f'{socket.gethostname()}:{os.getpid()}'
+        self.clock = clock
+        self.expires_at = 0.0
+        self.on_lost: Optional[Callable[[], None]] = None
+        self.connection: Optional[sqlite3.Connection] = None
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def is_leader(self) -> bool:
+        return not self.ttl or self.clock() < self.expires_at
+
+    def open(self) -> 'LeaderLease':
+        self.connection = connect(self.path)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS leases ('
+            'name TEXT PRIMARY KEY, holder TEXT NOT NULL, '
+            'expires_at REAL NOT NULL)')
+        return self
+
+    def try_acquire(self) -> bool:
+        """Take or renew the lease, False while another holder has it."""
+        now = self.clock()
+        cursor = self.connection.execute(
+            'INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?) '
+            'ON CONFLICT (name) DO UPDATE SET holder = excluded.holder, '
+            'expires_at = excluded.expires_at '
+            'WHERE leases.holder = excluded.holder OR leases.expires_at <= ?',
+            (self.name, self.holder, now + self.ttl, now))
+        if cursor.rowcount:
+            self.expires_at = now + self.ttl
+            return True
+        return False
+
+    def wait(self, stopped: threading.Event) -> bool:
+        """Block until the lease is taken, False if stopped is set first."""
+        if not self.ttl:
+            return True
+        logger.info(f'{self.holder} waits for the {self.name} lease')
+        while True:
+            try:
+                if self.try_acquire():
+                    logger.info(f'{self.holder} holds the {self.name} lease')
+                    return True
+            except sqlite3.Error as error:
+                logger.error(f'Lease {self.name} error:{error}')
+            if stopped.wait(self.renew_interval):
+                return False
+
+    def start(self, on_lost: Callable[[], None]) -> None:
+        """Renew the lease in background, call on_lost once it expires."""
+        if not self.ttl:
+            return
+        self.on_lost = on_lost
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run,
+                                        name='leader-lease',
+                                        daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.renew_interval):
+            try:
+                renewed = self.try_acquire()
+            except sqlite3.Error as error:
+                logger.error(f'Lease {self.name} renewal error:{error}')
+                renewed = False
+            if not renewed and not self.is_leader:
+                logger.error(f'{self.holder} lost the {self.name} lease')
+                self.on_lost()
+                return
+
+    def release(self) -> None:
+        """Stop renewing and give the lease up for a standby."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self.connection is None:
+            return
+        if self.expires_at:
+            self.connection.execute(
+                'DELETE FROM leases WHERE name = ? AND holder = ?',
+                (self.name, self.holder))
+            self.expires_at = 0.0
+        self.connection.close()
+        self.connection = None
@@ -0,0 +1,169 @@
+import gzip
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+from typing import List
+
+from metrics import REGISTRY
+
+LOG_RECORDS = REGISTRY.counter(
+    'homework_bot_log_file_records_total',
+    'Records taken by file log sinks by outcome',
+    ('result',))
+
+_STOP = object()
+
+
+class AsyncRotatingFileHandler(logging.Handler):
+    """Log file written by a background thread.
+
+    emit() only formats the record and puts the line into a bounded
+    queue, records that do not fit are counted and dropped instead of
+    blocking the caller. The writer buffers lines and writes them
+    every flush_interval seconds, when buffer_size bytes are collected
+    and on close(). The file is appended to, and rotated when it grows
+    over max_bytes or every rotate_interval seconds: name.log becomes
+    name.log.1 (name.log.1.gz with compress), older segments shift up
+    and the ones beyond backup_count are removed.
+    """
+
+    def __init__(self,
+                 filename: str,
+                 max_bytes: int = 10 * 1024 * 1024,
+                 rotate_interval: float = 24 * 3600,
+                 backup_count: int = 7,
+                 compress: bool = False,
+                 flush_interval: float = 1.0,
+                 buffer_size: int = 64 * 1024,
+                 queue_size: int = 10000,
+                 encoding: str = 'utf-8') -> None:
+        super().__init__()
+        self.filename = os.path.abspath(filename)
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.backup_count = backup_count
+        self.compress = compress
+        self.flush_interval = flush_interval
+        self.buffer_size = buffer_size
+        self.encoding = encoding
+        self.lines: queue.Queue = queue.Queue(queue_size)
+        self.dropped = 0
+        directory = os.path.dirname(self.filename)
+        os.makedirs(directory, exist_ok=True)
+        self.stream = open(self.filename, 'a', encoding=encoding)
+        self.size = self.stream.tell()
+        started_at = (os.stat(self.filename).st_mtime if self.size
+                      else time.time())
+        self.rotate_at = started_at + rotate_interval
+        self.writer = threading.Thread(
+            target=self._write_lines,
+            name=f'log-{os.path.basename(filename)}',
+            daemon=True)
+        self.writer.start()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            line = self.format(record) + '\n'
+        except Exception:
+            self.handleError(record)
+            return
+        try:
+            self.lines.put_nowait(line)
+        except queue.Full:
+            LOG_RECORDS.labels('dropped').inc()
+            self.dropped += 1
+
+    def _segment(self, number: int) -> str:
+        name = f'{self.filename}.{number}'
+        return f'{name}.gz' if self.compress else name
+
+    def rotate(self) -> None:
+        """Close the current file and shift the segments."""
+        self.stream.close()
+        if self.backup_count > 0:
+            for number in range(self.backup_count - 1, 0, -1):
+                source = self._segment(number)
+                if os.path.exists(source):
+                    os.replace(source, self._segment(number + 1))
+            if self.compress:
+                with open(self.filename, 'rb') as source, \
+                        gzip.open(self._segment(1), 'wb') as target:
+                    shutil.copyfileobj(source, target)
+                os.remove(self.filename)
+            else:
+                os.replace(self.filename, self._segment(1))
+        else:
+            os.remove(self.filename)
+        self.stream = open(self.filename, 'a', encoding=self.encoding)
+        self.size = 0
+        self.rotate_at = time.time() + self.rotate_interval
+
+    def _write(self, buffer: List[str]) -> None:
+        if not buffer:
+            return
+        if self.size and time.time() >= self.rotate_at:
+            self.rotate()
+        data = ''.join(buffer)
+        self.stream.write(data)
+        self.stream.flush()
+        self.size += len(data.encode(self.encoding))
+        LOG_RECORDS.labels('written').inc(len(buffer))
+        buffer.clear()
+        if self.size >= self.max_bytes:
+            self.rotate()
+
+    def _write_lines(self) -> None:
+        buffer: List[str] = []
+        buffered = 0
+        flush_at = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                line = self.lines.get(
+                    timeout=max(0.0, flush_at - time.monotonic()))
+            except queue.Empty:
+                line = None
+            if line is _STOP:
+                self._safe_write(buffer)
+                return
+            if isinstance(line, threading.Event):
+                self._safe_write(buffer)
+                buffered = 0
+                line.set()
+                continue
+            if line is not None:
+                buffer.append(line)
+                buffered += len(line)
+            if (buffered >= self.buffer_size
+                    or time.monotonic() >= flush_at):
+                self._safe_write(buffer)
+                buffered = 0
+                flush_at = time.monotonic() + self.flush_interval
+
+    def _safe_write(self, buffer: List[str]) -> None:
+        try:
+            self._write(buffer)
+        except OSError as error:
+            LOG_RECORDS.labels('failed').inc(len(buffer))
+            buffer.clear()
+            logging.lastResort.handle(logging.makeLogRecord(
+                {'msg': f'Log file {self.filename} write error:{error}',
+                 'levelno': logging.ERROR, 'levelname': 'ERROR'}))
+
+    def flush(self, timeout: float = 5.0) -> None:
+        """Wait until lines queued so far are written."""
+        if self.writer.is_alive():
+            written = threading.Event()
+            self.lines.put(written)
+            written.wait(timeout)
+
+    def close(self) -> None:
+        """Write buffered lines and close the file."""
+        if self.writer.is_alive():
+            self.lines.put(_STOP)
+            self.writer.join()
+        if not self.stream.closed:
+            self.stream.close()
+        super().close()
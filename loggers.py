@@ -1,47 +1,331 @@
+import html
+import itertools
 import logging
+import queue
+import re
+import threading
+import time
+from collections import OrderedDict
 from telegram import Bot, ParseMode
 import os
+from log_sink import AsyncRotatingFileHandler
+from metrics import REGISTRY
+
+BOT_LOGGER_NAME = 'homework_bot'
+MAX_MESSAGE_LENGTH = 4096
+
+FINGERPRINT_PATTERNS = (
+    (re.compile(r'\d{4}-\d\d-\d\d[T ]\d\d:\d\d:\d\d(\.\d+)?Z?'), '<ts>'),
+    (re.compile(r'0x[0-9a-fA-F]+'), '<hex>'),
+    (re.compile(r'\d+(\.\d+)?'), '<n>'),
+)
+
+
+MAX_SUMMARY_LENGTH = 1000
+SUMMARY_FIELD_LENGTH = 80
+REPEAT_MESSAGE_LENGTH = 200
+
+
+def summarize(value, width: int = SUMMARY_FIELD_LENGTH) -> str:
+    """Shallow repr: long strings are cut, lists show the first item."""
+    if isinstance(value, str):
+        if len(value) > width:
+            return f'{value[:width]!r}...'
+        return repr(value)
+    if isinstance(value, dict):
+        return '{' + ', '.join(f'{key!r}: {summarize(item, width)}'
+                               for key, item in value.items()) + '}'
+    if isinstance(value, (list, tuple)):
+        if len(value) > 1:
+            return (f'[{summarize(value[0], width)}, '
+                    f'... {len(value)} items]')
+        return f'[{summarize(value[0], width)}]' if value else '[]'
+    if hasattr(value, 'as_dict'):
+        return summarize(value.as_dict(), width)
+    text = repr(value)
+    return text if len(text) <= width else f'{text[:width]}...'
+
+
+class Summary:
+    """Size capped repr of a payload for %-style log arguments.
+
+    Nothing is rendered until a handler formats the record, so a
+    summary passed to a disabled level costs one small object.
+    """
+
+    __slots__ = ('payload', 'limit')
+
+    def __init__(self, payload, limit: int = MAX_SUMMARY_LENGTH) -> None:
+        self.payload = payload
+        self.limit = limit
+
+    def __str__(self) -> str:
+        text = summarize(self.payload)
+        if len(text) > self.limit:
+            text = f'{text[:self.limit]}... ({len(text)} chars)'
+        return text
+
+    __repr__ = __str__
+
+
+class LogSampler:
+    """Sampling policy for verbose logs: the first call and then one of
+    every `every` calls pass."""
+
+    def __init__(self, every: int = 10) -> None:
+        self.every = max(1, every)
+        self.calls = itertools.count()
+
+    def __call__(self) -> bool:
+        return next(self.calls) % self.every == 0
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Return child of the bot logger, sharing its handlers."""
+    return logging.getLogger(f'{BOT_LOGGER_NAME}.{name}')
+
+
+def truncate_escaped(text: str, limit: int) -> str:
+    """HTML escaped text cut to limit characters without splitting an
+    entity, a cut text ends with an ellipsis."""
+    escaped = html.escape(text)
+    if len(escaped) <= limit:
+        return escaped
+    length = 0
+    for index, char in enumerate(text):
+        length += len(html.escape(char))
+        if length > limit - 1:
+            return html.escape(text[:index]) + '…'
+    return escaped
+
+
+def fingerprint(message: str) -> str:
+    """Message with timestamps and numbers masked."""
+    for pattern, replacement in FINGERPRINT_PATTERNS:
+        message = pattern.sub(replacement, message)
+    return message
+
+
+TELEGRAM_LOG_MESSAGES = REGISTRY.counter(
+    'homework_bot_telegram_log_messages_total',
+    'TelegramBotLogger records by outcome',
+    ('result',))
+
+
+class DedupCache:
+    """TTL and LRU bounded cache of recently sent message fingerprints.
+
+    Counts how many times each fingerprint was suppressed, counters are
+    taken by pop_suppressed() to report repeats.
+    """
+
+    def __init__(self, ttl: float = 600, maxsize: int = 256) -> None:
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.entries: OrderedDict = OrderedDict()
+
+    def seen(self, message: str, now: float = None) -> bool:
+        """Register message, return True if it is a repeat to suppress."""
+        now = time.monotonic() if now is None else now
+        key = fingerprint(message)
+        entry = self.entries.get(key)
+        if entry is not None and now - entry[0] < self.ttl:
+            entry[2] += 1
+            self.entries.move_to_end(key)
+            return True
+        self.entries[key] = [now, message, entry[2] if entry else 0]
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+        return False
+
+    def pop_suppressed(self) -> list:
+        """Return (message, count) of suppressed repeats, reset counters."""
+        suppressed = []
+        for entry in self.entries.values():
+            if entry[2]:
+                suppressed.append((entry[1], entry[2]))
+                entry[2] = 0
+        return suppressed
 
 
 class TelegramBotLogger(logging.Handler):
     """Non repeating logger, which sends error log messages from given bot"""
     """to the given chat"""
+    """Records are only queued by emit(), a background thread groups"""
+    """records arrived within digest_window seconds into one message."""
 
-    def __init__(self, level: int, bot: Bot, chat_id) -> None:
+    def __init__(self,
+                 level: int,
+                 bot: Bot,
+                 chat_id,
+                 digest_window: float = 5.0,
+                 buffer_size: int = 100,
+                 dedup_ttl: float = 600,
+                 dedup_size: int = 256,
+                 repeats_flush_interval: float = 600,
+                 log_file: str = 'logs/logger.log') -> None:
         super().__init__(level)
         self.bot = bot
         self.chat_id = chat_id
-        self.init_logger(level)
-        self.last_message = ""
+        self.init_logger(level, log_file)
+        self.dedup = DedupCache(dedup_ttl, dedup_size)
+        self.repeats_flush_interval = repeats_flush_interval
+        self.repeats_flushed_at = time.monotonic()
+        self.digest_window = digest_window
+        self.records: queue.Queue = queue.Queue(buffer_size)
+        self.dropped = 0
+        self.sent = 0
+        self.closing = False
+        self.sender = threading.Thread(target=self.send_digests,
+                                       name='telegram-logger',
+                                       daemon=True)
+        self.sender.start()
 
-    def init_logger(self, logger_level: int):
-        os.makedirs('logs', exist_ok=True)
+    def init_logger(self, logger_level: int, log_file: str):
+        directory = os.path.dirname(log_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
         self.internal_logger = logging.getLogger('logger')
         formatter = logging.Formatter('%(asctime)s,%(levelname)s, %(message)s')
-        file_handler = logging.FileHandler(filename='logs/logger.log',
-                                           mode='w')
-        file_handler.setFormatter(formatter)
-        file_handler.setLevel(logger_level)
-        self.internal_logger.addHandler(file_handler)
+        self.file_handler = AsyncRotatingFileHandler(log_file)
+        self.file_handler.setFormatter(formatter)
+        self.file_handler.setLevel(logger_level)
+        self.internal_logger.addHandler(self.file_handler)
 
     def emit(self, record: logging.LogRecord):
-        if self.last_message == record.message:
+        if self.dedup.seen(record.getMessage()):
+            TELEGRAM_LOG_MESSAGES.labels('suppressed').inc()
             return
-        else:
-            self.last_message = record.message
 
-        msg: str = self.format(record)
+        try:
+            self.records.put_nowait(record)
+        except queue.Full:
+            TELEGRAM_LOG_MESSAGES.labels('dropped').inc()
+            self.dropped += 1
+
+    def format_record(self, record: logging.LogRecord) -> str:
+        msg: str = html.escape(self.format(record))
         for error_level in ['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL']:
             if error_level in msg:
                 msg = msg.replace(error_level, f'<u><b>{error_level}</b></u>')
                 break
+        return msg
+
+    def collect_digest(self, first: logging.LogRecord) -> tuple:
+        """Collect records arriving within digest_window after first.
+
+        Returns the records and whether the stop marker came among them.
+        """
+        records = [first]
+        deadline = time.monotonic() + self.digest_window
+        while True:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                record = self.records.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if record is None:
+                return records, True
+            records.append(record)
+        return records, False
 
+    def pop_repeats(self, force: bool = False) -> list:
+        """Take suppressed repeat counters once per flush interval."""
+        now = time.monotonic()
+        if not force and (now - self.repeats_flushed_at
+                          < self.repeats_flush_interval):
+            return []
+        self.repeats_flushed_at = now
+        self.acquire()
+        try:
+            suppressed = self.dedup.pop_suppressed()
+        finally:
+            self.release()
+        return [f'<i>{count} repeats suppressed:</i> '
+                f'{truncate_escaped(message, REPEAT_MESSAGE_LENGTH)}'
+                for message, count in suppressed]
+
+    def build_digest(self, records: list, repeats: list = ()) -> str:
+        header = ([f'<b>{len(records)} log messages</b>']
+                  if len(records) > 1 else [])
+        notes = list(repeats)
+        self.acquire()
+        try:
+            dropped, self.dropped = self.dropped, 0
+        finally:
+            self.release()
+        if dropped:
+            notes.append(f'<i>{dropped} log messages dropped</i>')
+        digest = '\n\n'.join(
+            header + [self.format_record(record) for record in records]
+            + notes)
+        if len(digest) > MAX_MESSAGE_LENGTH:
+            digest = self.shorten_digest(records, header, notes)
+        return digest
+
+    def shorten_digest(self, records: list, header: list,
+                       notes: list) -> str:
+        """Plain record messages cut to fit between header and notes."""
+        kept = list(notes)
+        while kept and len('\n\n'.join(header + kept)) > (
+                MAX_MESSAGE_LENGTH // 2):
+            kept.pop()
+        if len(kept) < len(notes):
+            kept.append(f'<i>{len(notes) - len(kept)} more notes '
+                        f'omitted</i>')
+        used = len('\n\n'.join(header + [''] + kept))
+        body = truncate_escaped(
+            '\n\n'.join(record.getMessage() for record in records),
+            MAX_MESSAGE_LENGTH - used)
+        return '\n\n'.join(header + [body] + kept)
+
+    def send_digests(self):
+        while True:
+            try:
+                first = self.records.get(timeout=self.repeats_flush_interval)
+            except queue.Empty:
+                first = None
+            closing = first is None and self.closing
+            records = []
+            if first is not None:
+                records, closing = self.collect_digest(first)
+            repeats = self.pop_repeats(force=closing)
+            if records or repeats:
+                self.send_digest(self.build_digest(records, repeats))
+            if closing:
+                return
+
+    def send_digest(self, digest: str):
         try:
             self.bot.send_message(chat_id=self.chat_id,
-                                  text=msg,
+                                  text=digest,
                                   parse_mode=ParseMode.HTML)
+            TELEGRAM_LOG_MESSAGES.labels('sent').inc()
+            self.sent += 1
         except Exception as exception:
+            TELEGRAM_LOG_MESSAGES.labels('failed').inc()
             (self.
              internal_logger.
              critical(f'Log to telegram(chat_id={self.chat_id})'
                       f'error:{exception}'))
+
+    def close(self, timeout: float = None):
+        """Send buffered records and repeat counters, stop the sender.
+
+        Waits for the sender at most timeout seconds, on the first call.
+        """
+        if self.sender.is_alive() and not self.closing:
+            self.closing = True
+            deadline = None if timeout is None else time.monotonic() + timeout
+            try:
+                self.records.put(None, timeout=timeout)
+            except queue.Full:
+                pass
+            self.sender.join(None if deadline is None
+                             else max(0.0, deadline - time.monotonic()))
+        self.internal_logger.removeHandler(self.file_handler)
+        self.file_handler.close()
+        super().close()
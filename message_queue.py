@@ -0,0 +1,267 @@
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+from telegram import Bot
+from telegram.error import BadRequest, NetworkError, RetryAfter, TelegramError
+
+from loggers import get_logger
+from metrics import REGISTRY
+
+logger: logging.Logger = get_logger(__name__)
+
+SEND_LATENCY_SECONDS = REGISTRY.histogram(
+    'homework_bot_send_latency_seconds',
+    'Time from enqueueing a notification to its delivery')
+SENT_MESSAGES = REGISTRY.counter(
+    'homework_bot_sent_messages_total',
+    'Outgoing notifications by result',
+    ('result',))
+
+
+class TokenBucket:
+    """Token bucket rate limiter, not thread safe."""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated_at')
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def reserve(self, now: float) -> float:
+        """Take one token and return seconds to wait before using it."""
+        self.tokens = min(self.capacity,
+                          self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+    def is_full(self, now: float) -> bool:
+        """Whether the bucket refilled, then it equals a new one."""
+        return (self.tokens + (now - self.updated_at) * self.rate
+                >= self.capacity)
+
+
+class _OutgoingMessage:
+    __slots__ = ('chat_id', 'text', 'key', 'enqueued_at', 'attempts')
+
+    def __init__(self, chat_id, text: str, key: str = None) -> None:
+        self.chat_id = chat_id
+        self.text = text
+        self.key = key
+        self.enqueued_at = time.monotonic()
+        self.attempts = 0
+
+
+_STOP = object()
+
+
+class OutgoingMessageQueue:
+    """Rate limited background delivery of Telegram messages.
+
+    Messages are sharded between workers by chat, so every chat keeps
+    its order. Sends are limited by a global and a per chat token
+    bucket (Telegram allows ~30 msg/s in total and ~1 msg/s per chat),
+    RetryAfter pauses all workers for the requested time. Chat buckets
+    that refilled are dropped every bucket_sweep_interval seconds, so
+    only recently messaged chats keep one.
+    on_delivered(key) is called for every delivered message put with
+    a key, on_failed(key) for every such message Telegram rejected and
+    on_released(key) for every such message dropped after max_attempts
+    network errors, which may succeed later.
+    """
+
+    def __init__(self,
+                 workers: int = 4,
+                 global_rate: float = 25,
+                 chat_rate: float = 1,
+                 chat_burst: int = 3,
+                 maxsize: int = 10000,
+                 max_attempts: int = 5,
+                 latency_window: int = 1000,
+                 bucket_sweep_interval: float = 60) -> None:
+        self.workers_count = workers
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_attempts = max_attempts
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_buckets: Dict[object, TokenBucket] = {}
+        self.bucket_sweep_interval = bucket_sweep_interval
+        self.buckets_swept_at = time.monotonic()
+        self.queues: List[queue.Queue] = [queue.Queue(maxsize // workers)
+                                          for _ in range(workers)]
+        self.threads: List[threading.Thread] = []
+        self.bot: Optional[Bot] = None
+        self.on_delivered: Optional[Callable[[str], None]] = None
+        self.on_failed: Optional[Callable[[str], None]] = None
+        self.on_released: Optional[Callable[[str], None]] = None
+        self.paused_until = 0.0
+        self.latencies = deque(maxlen=latency_window)
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return bool(self.threads)
+
+    def start(self, bot: Bot) -> None:
+        self.bot = bot
+        for number, messages in enumerate(self.queues):
+            thread = threading.Thread(target=self._work,
+                                      args=(messages,),
+                                      name=f'sender-{number}',
+                                      daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def put(self, chat_id, text: str, key: str = None) -> bool:
+        """Enqueue message without blocking.
+
+        Returns False when the queue is not running or is full, so the
+        caller can fall back to a direct send.
+        """
+        if not self.running:
+            return False
+        shard = self.queues[hash(chat_id) % self.workers_count]
+        try:
+            shard.put_nowait(_OutgoingMessage(chat_id, text, key))
+        except queue.Full:
+            logger.warning(f'Outgoing queue is full, chat {chat_id}')
+            return False
+        return True
+
+    def _wait_for_slot(self, chat_id) -> None:
+        with self._lock:
+            now = time.monotonic()
+            if now - self.buckets_swept_at >= self.bucket_sweep_interval:
+                self._sweep_buckets(now)
+            bucket = self.chat_buckets.get(chat_id)
+            if bucket is None:
+                bucket = self.chat_buckets[chat_id] = TokenBucket(
+                    self.chat_rate, self.chat_burst)
+            delay = max(self.paused_until - now,
+                        self.global_bucket.reserve(now),
+                        bucket.reserve(now))
+        if delay > 0:
+            time.sleep(delay)
+
+    def _sweep_buckets(self, now: float) -> None:
+        """Drop full chat buckets, caller must hold self._lock."""
+        self.buckets_swept_at = now
+        idle = [chat_id for chat_id, bucket in self.chat_buckets.items()
+                if bucket.is_full(now)]
+        for chat_id in idle:
+            del self.chat_buckets[chat_id]
+
+    def _give_up(self, message: _OutgoingMessage,
+                 callback: Optional[Callable[[str], None]]) -> None:
+        SENT_MESSAGES.labels('failed').inc()
+        with self._lock:
+            self.failed += 1
+        if message.key is not None and callback is not None:
+            callback(message.key)
+
+    def _deliver(self, message: _OutgoingMessage) -> bool:
+        """Try to send message, return True when it is done with."""
+        self._wait_for_slot(message.chat_id)
+        message.attempts += 1
+        try:
+            self.bot.send_message(chat_id=message.chat_id, text=message.text)
+        except RetryAfter as error:
+            with self._lock:
+                self.paused_until = max(self.paused_until,
+                                        time.monotonic() + error.retry_after)
+            logger.warning(f'Telegram flood control, retry after '
+                           f'{error.retry_after}s')
+        except BadRequest as error:
+            # A NetworkError subclass, but resending cannot fix the request.
+            logger.error(f'Sending message error:{error}')
+            self._give_up(message, self.on_failed)
+            return True
+        except NetworkError as error:
+            logger.warning(f'Sending message error:{error}, '
+                           f'attempt {message.attempts}')
+            time.sleep(min(2 ** message.attempts, 60))
+        except TelegramError as error:
+            logger.error(f'Sending message error:{error}')
+            self._give_up(message, self.on_failed)
+            return True
+        else:
+            latency = time.monotonic() - message.enqueued_at
+            SEND_LATENCY_SECONDS.observe(latency)
+            SENT_MESSAGES.labels('sent').inc()
+            with self._lock:
+                self.sent += 1
+                self.latencies.append(latency)
+            if message.key is not None and self.on_delivered is not None:
+                self.on_delivered(message.key)
+            return True
+        if message.attempts >= self.max_attempts:
+            logger.error(f'Message to {message.chat_id} dropped after '
+                         f'{message.attempts} attempts')
+            self._give_up(message, self.on_released)
+            return True
+        SENT_MESSAGES.labels('retried').inc()
+        with self._lock:
+            self.retried += 1
+        return False
+
+    def _work(self, messages: queue.Queue) -> None:
+        while True:
+            message = messages.get()
+            try:
+                if message is _STOP:
+                    return
+                while not self._deliver(message):
+                    pass
+            except Exception as error:
+                logger.exception(f'Sender worker error:{error}')
+            finally:
+                messages.task_done()
+
+    def join(self) -> None:
+        """Wait until every queued message is handled."""
+        for messages in self.queues:
+            messages.join()
+
+    def stop(self, timeout: float = None) -> bool:
+        """Deliver queued messages and stop the workers.
+
+        Returns False when messages are still queued after timeout
+        seconds, the workers are left to finish them in the background.
+        """
+        threads, self.threads = self.threads, []
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for messages in self.queues:
+            try:
+                messages.put(_STOP, timeout=None if deadline is None
+                             else max(0.0, deadline - time.monotonic()))
+            except queue.Full:
+                pass
+        for thread in threads:
+            thread.join(None if deadline is None
+                        else max(0.0, deadline - time.monotonic()))
+        return not any(thread.is_alive() for thread in threads)
+
+    def depth(self) -> int:
+        return sum(messages.qsize() for messages in self.queues)
+
+    def stats(self) -> dict:
+        latencies = sorted(self.latencies)
+        result = {'depth': self.depth(),
+                  'sent': self.sent,
+                  'failed': self.failed,
+                  'retried': self.retried}
+        if latencies:
+            result['latency_p50'] = latencies[len(latencies) // 2]
+            result['latency_p95'] = latencies[int(len(latencies) * 0.95)]
+        return result
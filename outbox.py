@@ -0,0 +1,311 @@
+import logging
+import sqlite3
+import threading
+import time
+from typing import Callable, Iterable, List, Optional, Set, Tuple
+
+from loggers import get_logger
+from metrics import REGISTRY
+from storage import connect
+
+logger: logging.Logger = get_logger(__name__)
+
+PENDING = 'pending'
+DELIVERED = 'delivered'
+FAILED = 'failed'
+
+OUTBOX_MESSAGES = REGISTRY.counter(
+    'homework_bot_outbox_messages_total',
+    'Outbox messages by event',
+    ('event',))
+
+Message = Tuple[object, str, str]
+
+
+def notification_key(chat_id, record) -> str:
+    """Idempotency key of a status notification."""
+    return (f'{chat_id}:{record.id or record.homework_name}:'
+            f'{record.status}:{record.date_updated}')
+
+
+class Outbox:
+    """Persisted outgoing notifications.
+
+    put_many() returns once the messages are committed, so the caller
+    may advance its cursor: a crash after that never loses them.
+    Writers arriving while a commit is running are committed together
+    in the next transaction (group commit). Every message has an
+    idempotency key, a key seen before is ignored, so re-polled
+    statuses and restarts never resend delivered messages.
+
+    Committed messages are handed to send(chat_id, text, key), which
+    returns True when it took the message and should then call
+    delivered(key) once Telegram accepted it, failed(key) when Telegram
+    rejected it for good, or released(key) when it gave the message up
+    and it may be sent again. Until then the message is in flight and
+    is not handed over again, however long it waits in the send queue.
+    Undelivered messages are handed over again with exponential
+    backoff, also after a restart, and are given up after max_attempts.
+    """
+
+    def __init__(self,
+                 path: str,
+                 retry_backoff: float = 30,
+                 max_backoff: float = 3600,
+                 max_attempts: int = 20,
+                 retention: float = 7 * 24 * 3600,
+                 relay_interval: float = 5.0,
+                 clock: Callable[[], float] = time.time) -> None:
+        self.path = path
+        self.retry_backoff = retry_backoff
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts
+        self.retention = retention
+        self.relay_interval = relay_interval
+        self.clock = clock
+        self.send: Optional[Callable[[object, str, str], bool]] = None
+        self.connection: Optional[sqlite3.Connection] = None
+        self.pending: List[Message] = []
+        self.deliveries: List[Tuple[str, str]] = []
+        self.in_flight: Set[str] = set()
+        self.batches = 0
+        self.committed = 0
+        self.relayed_at = 0.0
+        self._changed = threading.Condition()
+        self._db_lock = threading.Lock()
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def open(self) -> 'Outbox':
+        self.connection = connect(self.path)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS outbox ('
+            'key TEXT PRIMARY KEY, chat_id TEXT NOT NULL, '
+            'text TEXT NOT NULL, state TEXT NOT NULL, '
+            'attempts INTEGER NOT NULL DEFAULT 0, '
+            'next_attempt_at REAL NOT NULL, updated_at REAL NOT NULL)')
+        self.connection.execute(
+            'CREATE INDEX IF NOT EXISTS outbox_due '
+            'ON outbox (state, next_attempt_at)')
+        return self
+
+    def start(self, send: Callable[[object, str, str], bool]) -> None:
+        """Start committing and relaying messages through send."""
+        self.send = send
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run,
+                                        name='outbox',
+                                        daemon=True)
+        self._thread.start()
+
+    def put_many(self, messages: Iterable[Message],
+                 timeout: float = None) -> bool:
+        """Persist (chat_id, text, key) messages.
+
+        Returns False when the outbox is not running or the messages
+        were not committed within timeout. Messages still waiting for
+        their commit are then withdrawn, so the caller can send them
+        another way.
+        """
+        messages = list(messages)
+        if not messages:
+            return True
+        if not self.running:
+            return False
+        with self._changed:
+            self.pending.extend(messages)
+            batch = self.batches + 1
+            self._changed.notify_all()
+            if self._changed.wait_for(lambda: self.committed >= batch,
+                                      timeout):
+                return True
+            withdrawn = set(messages)
+            self.pending = [message for message in self.pending
+                            if message not in withdrawn]
+        logger.warning(f'Outbox commit takes over {timeout}s, '
+                       f'{len(messages)} messages withdrawn')
+        return False
+
+    def put(self, chat_id, text: str, key: str,
+            timeout: float = None) -> bool:
+        return self.put_many([(chat_id, text, key)], timeout)
+
+    def _finish(self, key: str, state: str) -> None:
+        with self._changed:
+            self.in_flight.discard(key)
+            self.deliveries.append((state, key))
+            self._changed.notify_all()
+
+    def delivered(self, key: str) -> None:
+        """Mark message delivered, persisted with the next commit."""
+        self._finish(key, DELIVERED)
+
+    def failed(self, key: str) -> None:
+        """Mark message rejected by Telegram, it is never sent again."""
+        self._finish(key, FAILED)
+
+    def released(self, key: str) -> None:
+        """Let the relay hand over an undelivered message again."""
+        with self._changed:
+            self.in_flight.discard(key)
+
+    def _backoff(self, attempts: int) -> float:
+        return min(self.max_backoff,
+                   self.retry_backoff * 2 ** max(0, attempts - 1))
+
+    def _commit(self, messages: List[Message],
+                deliveries: List[Tuple[str, str]]) -> List[Message]:
+        """Write one group, return the messages that are new."""
+        now = self.clock()
+        lease = now + self._backoff(1)
+        new = []
+        with self._db_lock:
+            self.connection.execute('BEGIN')
+            try:
+                for chat_id, text, key in messages:
+                    cursor = self.connection.execute(
+                        'INSERT OR IGNORE INTO outbox (key, chat_id, text, '
+                        'state, attempts, next_attempt_at, updated_at) '
+                        'VALUES (?, ?, ?, ?, 1, ?, ?)',
+                        (key, str(chat_id), text, PENDING, lease, now))
+                    if cursor.rowcount:
+                        new.append((chat_id, text, key))
+                self.connection.executemany(
+                    'UPDATE outbox SET state = ?, updated_at = ? '
+                    'WHERE key = ?',
+                    [(state, now, key) for state, key in deliveries])
+                self.connection.execute('COMMIT')
+            except sqlite3.Error:
+                if self.connection.in_transaction:
+                    self.connection.execute('ROLLBACK')
+                raise
+        OUTBOX_MESSAGES.labels('added').inc(len(new))
+        OUTBOX_MESSAGES.labels('duplicate').inc(len(messages) - len(new))
+        for state in (DELIVERED, FAILED):
+            OUTBOX_MESSAGES.labels(state).inc(
+                sum(done == state for done, _ in deliveries))
+        return new
+
+    def _hand_over(self, messages: List[Message]) -> None:
+        for chat_id, text, key in messages:
+            with self._changed:
+                self.in_flight.add(key)
+            try:
+                taken = self.send(chat_id, text, key)
+            except Exception as error:
+                logger.error(f'Outbox send error:{error}')
+                taken = False
+            if not taken:
+                self.released(key)
+
+    def relay(self) -> int:
+        """Hand over undelivered messages whose retry time has come.
+
+        Safe to call from any thread, the connection is shared with the
+        outbox thread under a lock.
+        """
+        now = self.clock()
+        self.relayed_at = now
+        with self._db_lock:
+            retries, failed = self._claim_due(now)
+        for _, _, key in failed:
+            logger.error(f'Outbox message {key} given up after '
+                         f'{self.max_attempts} attempts')
+        OUTBOX_MESSAGES.labels('failed').inc(len(failed))
+        OUTBOX_MESSAGES.labels('retried').inc(len(retries))
+        self._hand_over([(chat_id, text, key)
+                         for key, chat_id, text, _ in retries])
+        return len(retries)
+
+    def _claim_due(self, now: float) -> Tuple[list, list]:
+        """Count an attempt of the due messages, give up the exhausted."""
+        rows = self.connection.execute(
+            'SELECT key, chat_id, text, attempts FROM outbox '
+            'WHERE state = ? AND next_attempt_at <= ? '
+            'ORDER BY next_attempt_at LIMIT 1000',
+            (PENDING, now)).fetchall()
+        with self._changed:
+            in_flight = set(self.in_flight)
+        retries, failed, waiting = [], [], []
+        for key, chat_id, text, attempts in rows:
+            if key in in_flight:
+                waiting.append((now + self._backoff(attempts), now, key))
+                continue
+            if attempts >= self.max_attempts:
+                failed.append((FAILED, now, key))
+                continue
+            retries.append((key, chat_id, text, attempts + 1))
+        self.connection.execute('BEGIN')
+        try:
+            self.connection.executemany(
+                'UPDATE outbox SET state = ?, updated_at = ? WHERE key = ?',
+                failed)
+            self.connection.executemany(
+                'UPDATE outbox SET attempts = ?, next_attempt_at = ?, '
+                'updated_at = ? WHERE key = ?',
+                [(attempts, now + self._backoff(attempts), now, key)
+                 for key, _, _, attempts in retries])
+            self.connection.executemany(
+                'UPDATE outbox SET next_attempt_at = ?, updated_at = ? '
+                'WHERE key = ?', waiting)
+            self.connection.execute(
+                'DELETE FROM outbox WHERE state != ? AND updated_at < ?',
+                (PENDING, now - self.retention))
+            self.connection.execute('COMMIT')
+        except sqlite3.Error:
+            if self.connection.in_transaction:
+                self.connection.execute('ROLLBACK')
+            raise
+        return retries, failed
+
+    def _run(self) -> None:
+        while True:
+            with self._changed:
+                self._changed.wait_for(
+                    lambda: (self.pending or self.deliveries
+                             or self._stopped),
+                    max(0.0, self.relayed_at + self.relay_interval
+                        - self.clock()))
+                messages, self.pending = self.pending, []
+                deliveries, self.deliveries = self.deliveries, []
+                stopped = self._stopped
+                self.batches += 1
+                batch = self.batches
+            try:
+                new = (self._commit(messages, deliveries)
+                       if messages or deliveries else [])
+            except sqlite3.Error as error:
+                logger.error(f'Outbox commit error:{error}')
+                with self._changed:
+                    self.pending[:0] = messages
+                    self.deliveries[:0] = deliveries
+                    self.batches -= 1
+                time.sleep(1)
+                continue
+            with self._changed:
+                self.committed = batch
+                self._changed.notify_all()
+            if stopped:
+                return
+            self._hand_over(new)
+            if self.clock() >= self.relayed_at + self.relay_interval:
+                try:
+                    self.relay()
+                except sqlite3.Error as error:
+                    logger.error(f'Outbox relay error:{error}')
+
+    def close(self) -> None:
+        """Commit pending writes and deliveries, stop the relay."""
+        if self._thread is not None:
+            with self._changed:
+                self._stopped = True
+                self._changed.notify_all()
+            self._thread.join()
+            self._thread = None
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
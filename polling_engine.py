@@ -0,0 +1,179 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, List
+
+from api_client import PracticumAPIClient
+from event_log import EventLog
+from exceptions import CircuitOpenError
+from loggers import get_logger
+from outbox import notification_key
+from retry_policy import Retry, RetryPolicy
+from scheduler import AdaptivePollScheduler
+from storage import HomeworkStateIndex
+from timing_wheel import TimingWheel
+
+logger: logging.Logger = get_logger(__name__)
+
+
+class Tenant:
+    """Student subscribed to homework status notifications."""
+
+    __slots__ = ('token', 'chat_id', 'from_date')
+
+    def __init__(self, token: str, chat_id, from_date: int = None) -> None:
+        self.token = token
+        self.chat_id = chat_id
+        self.from_date = from_date or int(time.time())
+
+    @property
+    def headers(self) -> dict:
+        return {'Authorization': f'OAuth {self.token}'}
+
+    def __repr__(self) -> str:
+        return f'Tenant(chat_id={self.chat_id}, from_date={self.from_date})'
+
+
+class PollingEngine:
+    """Polls the API for many tenants concurrently.
+
+    The API client is blocking, so requests run on a thread pool while
+    an asyncio semaphore bounds the number of requests in flight.
+    With a timing wheel every polled tenant is put back on the wheel
+    at its next scheduler interval, and run_due() polls the tenants
+    the wheel hands out instead of scanning all of them. A retry policy
+    replaces the interval after a failed poll by its retry delay.
+    """
+
+    def __init__(self,
+                 api_client: PracticumAPIClient,
+                 check_response: Callable[[dict], list],
+                 parse_status: Callable[[dict], str],
+                 notify: Callable[[object, str, str], None],
+                 max_in_flight: int = 50,
+                 scheduler: AdaptivePollScheduler = None,
+                 on_cursor: Callable[[Tenant], None] = None,
+                 state_index: HomeworkStateIndex = None,
+                 event_log: EventLog = None,
+                 from_date_overlap: int = 0,
+                 wheel: TimingWheel = None,
+                 retry_policy: RetryPolicy = None) -> None:
+        self.api_client = api_client
+        self.check_response = check_response
+        self.parse_status = parse_status
+        self.notify = notify
+        self.max_in_flight = max_in_flight
+        self.scheduler = scheduler
+        self.on_cursor = on_cursor
+        self.state_index = state_index
+        self.event_log = event_log
+        self.from_date_overlap = from_date_overlap
+        self.wheel = wheel
+        self.retry_policy = retry_policy
+        self.executor = ThreadPoolExecutor(max_workers=max_in_flight,
+                                           thread_name_prefix='poll')
+
+    def _notify_changes(self, tenant: Tenant, homeworks: list) -> List[str]:
+        """Notify changed homeworks, then record their states.
+
+        Returns the statuses of the recorded transitions.
+        """
+        changed = [homework for homework in homeworks or ()
+                   if self.state_index is None
+                   or self.state_index.is_changed(tenant.chat_id, homework)]
+        messages = [(self.parse_status(homework),
+                     notification_key(tenant.chat_id, homework))
+                    for homework in changed]
+        for text, key in messages:
+            self.notify(tenant.chat_id, text, key)
+        statuses = []
+        for homework in changed:
+            if (self.state_index is not None
+                    and not self.state_index.is_transition(tenant.chat_id,
+                                                           homework)):
+                continue
+            if self.event_log is not None:
+                self.event_log.append(tenant.chat_id, homework)
+            statuses.append(homework['status'])
+        return statuses
+
+    def _poll_tenant_sync(self, tenant: Tenant) -> int:
+        statuses = None
+        retry: Retry = None
+        try:
+            response = self.api_client.get_homework_statuses(
+                tenant.from_date - self.from_date_overlap, tenant.headers)
+            statuses = self._notify_changes(tenant,
+                                            self.check_response(response))
+            tenant.from_date = response.get('current_date', tenant.from_date)
+            if self.on_cursor is not None:
+                self.on_cursor(tenant)
+        except CircuitOpenError:
+            raise
+        except Exception as error:
+            if self.retry_policy is not None:
+                retry = self.retry_policy.on_failure(tenant.chat_id, error)
+            raise
+        else:
+            if self.retry_policy is not None:
+                self.retry_policy.on_success(tenant.chat_id)
+        finally:
+            if self.scheduler is not None:
+                interval = self.scheduler.schedule(
+                    tenant.chat_id, statuses,
+                    override=retry.delay if retry is not None else None)
+                if self.wheel is not None:
+                    self.wheel.schedule(tenant.chat_id, interval, tenant)
+        return len(statuses)
+
+    async def poll_tenant(self,
+                          tenant: Tenant,
+                          semaphore: asyncio.Semaphore) -> int:
+        """Poll one tenant and return the number of notifications."""
+        async with semaphore:
+            loop = asyncio.get_running_loop()
+            try:
+                return await loop.run_in_executor(self.executor,
+                                                  self._poll_tenant_sync,
+                                                  tenant)
+            except CircuitOpenError:
+                return 0
+            except Exception as error:
+                logger.error('Polling failed for %s: %s', tenant, error)
+                return 0
+
+    async def poll_all(self, tenants: Iterable[Tenant]) -> List[int]:
+        """Poll every due tenant, keeping at most max_in_flight requests."""
+        breaker = self.api_client.breaker
+        if breaker is not None and breaker.remaining() > 0:
+            logger.warning(f'Practicum API is unavailable, polling resumes '
+                           f'in {breaker.remaining():.0f}s')
+            if self.wheel is not None:
+                for tenant in tenants:
+                    self.wheel.schedule(tenant.chat_id, breaker.remaining(),
+                                        tenant)
+            return []
+        if self.scheduler is not None and self.wheel is None:
+            tenants = [tenant for tenant in tenants
+                       if self.scheduler.is_due(tenant.chat_id)]
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+        return await asyncio.gather(
+            *(self.poll_tenant(tenant, semaphore) for tenant in tenants))
+
+    def run_once(self, tenants: Iterable[Tenant]) -> List[int]:
+        """Blocking entry point for job queue callbacks."""
+        return asyncio.run(self.poll_all(tenants))
+
+    def add(self, tenants: Iterable[Tenant], delay: float = 0) -> None:
+        """Put tenants on the timing wheel."""
+        for tenant in tenants:
+            self.wheel.schedule(tenant.chat_id, delay, tenant)
+
+    def run_due(self) -> List[int]:
+        """Poll the tenants that fell due on the timing wheel."""
+        due = self.wheel.advance()
+        return self.run_once(due) if due else []
+
+    def close(self, wait: bool = True) -> None:
+        self.executor.shutdown(wait=wait)
@@ -0,0 +1,164 @@
+import cProfile
+import io
+import logging
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from functools import wraps
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from loggers import get_logger
+
+logger: logging.Logger = get_logger(__name__)
+
+Target = Tuple[object, str]
+
+
+class Profiler:
+    """Switchable profiling of selected functions.
+
+    targets are (module or class, attribute name) pairs. While profiling
+    is off they hold the original functions, so it costs nothing.
+    start() replaces them with wrappers which time every call per stage
+    and run the outermost call under cProfile, tracemalloc traces
+    allocations meanwhile. cProfile follows one thread at a time, calls
+    made while another thread is profiled are only timed.
+
+    stop() puts the originals back and writes the report of the top
+    entries to directory, with the raw stats next to it for pstats.
+    Functions looked up before start(), like already scheduled jobs,
+    run unprofiled until they look the target up again.
+    """
+
+    def __init__(self,
+                 targets: Iterable[Target],
+                 directory: str = 'logs/profiles',
+                 top: int = 30,
+                 memory_frames: int = 1,
+                 clock: Callable[[], float] = time.perf_counter) -> None:
+        self.targets = list(targets)
+        self.directory = directory
+        self.top = top
+        self.memory_frames = memory_frames
+        self.clock = clock
+        self.profile: Optional[cProfile.Profile] = None
+        self.originals: List[Tuple[object, str, Callable]] = []
+        self.stages: Dict[str, List[float]] = {}
+        self.started_at = 0.0
+        self.tracing = False
+        self._lock = threading.Lock()
+        self._profiling = threading.Lock()
+        self._stages_lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def running(self) -> bool:
+        return self.profile is not None
+
+    def start(self) -> bool:
+        """Start profiling, False if it is already running."""
+        with self._lock:
+            if self.running:
+                return False
+            self.stages = {}
+            self.started_at = time.time()
+            self.profile = cProfile.Profile()
+            self.tracing = not tracemalloc.is_tracing()
+            if self.tracing:
+                tracemalloc.start(self.memory_frames)
+            for owner, name in self.targets:
+                original = getattr(owner, name)
+                self.originals.append((owner, name, original))
+                setattr(owner, name, self._wrap(original))
+        logger.info(f'Profiling started for {len(self.targets)} functions')
+        return True
+
+    def _wrap(self, function: Callable) -> Callable:
+        stage = function.__qualname__
+
+        @wraps(function)
+        def profiled(*args, **kwargs):
+            depth = getattr(self._local, 'depth', 0)
+            profile = self.profile
+            enabled = (not depth and profile is not None
+                       and self._profiling.acquire(blocking=False))
+            self._local.depth = depth + 1
+            started = self.clock()
+            if enabled:
+                profile.enable()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                if enabled:
+                    profile.disable()
+                    self._profiling.release()
+                self._local.depth = depth
+                self._record(stage, self.clock() - started)
+
+        return profiled
+
+    def _record(self, stage: str, seconds: float) -> None:
+        with self._stages_lock:
+            timing = self.stages.get(stage)
+            if timing is None:
+                self.stages[stage] = [1, seconds, seconds]
+                return
+            timing[0] += 1
+            timing[1] += seconds
+            timing[2] = max(timing[2], seconds)
+
+    def stage_report(self) -> List[str]:
+        """Calls, total, mean and max time of every stage so far."""
+        with self._stages_lock:
+            stages = sorted(self.stages.items(),
+                            key=lambda item: item[1][1], reverse=True)
+        return [f'{stage}: {calls} calls, total {total:.3f}s, '
+                f'mean {total / calls * 1000:.2f}ms, '
+                f'max {longest * 1000:.2f}ms'
+                for stage, (calls, total, longest) in stages]
+
+    def stop(self) -> Optional[str]:
+        """Stop profiling, return the report path, None if not running."""
+        with self._lock:
+            if not self.running:
+                return None
+            for owner, name, original in self.originals:
+                setattr(owner, name, original)
+            self.originals = []
+            with self._profiling:
+                profile, self.profile = self.profile, None
+            snapshot = None
+            if tracemalloc.is_tracing():
+                snapshot = tracemalloc.take_snapshot()
+                if self.tracing:
+                    tracemalloc.stop()
+            path = self._dump(profile, snapshot)
+        logger.info(f'Profiling stopped, report {path}')
+        return path
+
+    def _dump(self, profile: cProfile.Profile,
+              snapshot: Optional[tracemalloc.Snapshot]) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        name = time.strftime('profile-%Y%m%d-%H%M%S',
+                             time.localtime(self.started_at))
+        path = os.path.join(self.directory, f'{name}.txt')
+        profile.dump_stats(os.path.join(self.directory, f'{name}.prof'))
+        stats_text = io.StringIO()
+        try:
+            stats = pstats.Stats(profile, stream=stats_text)
+            stats.sort_stats('cumulative').print_stats(self.top)
+        except TypeError:
+            stats_text.write('No profiled calls\n')
+        lines = [f'Profile of {time.time() - self.started_at:.1f}s '
+                 f'started {time.ctime(self.started_at)}',
+                 '', 'Stage timing:', *self.stage_report(),
+                 '', f'cProfile, top {self.top} by cumulative time:',
+                 stats_text.getvalue()]
+        if snapshot is not None:
+            lines += [f'tracemalloc, top {self.top} allocation sites:',
+                      *map(str, snapshot.statistics('lineno')[:self.top])]
+        with open(path, 'w', encoding='utf-8') as report:
+            report.write('\n'.join(lines) + '\n')
+        return path
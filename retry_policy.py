@@ -0,0 +1,141 @@
+import threading
+from http import HTTPStatus
+from typing import Dict, Hashable, Optional, Tuple
+
+from exceptions import APIRequestProcessingError, BadAPIHttpResponseCode
+from metrics import REGISTRY
+
+TRANSIENT = 'transient'
+RATE_LIMITED = 'rate_limited'
+AUTH = 'auth'
+PERMANENT = 'permanent'
+
+RETRIES = REGISTRY.counter(
+    'homework_bot_poll_retries_total',
+    'Failed polls by error class and retry decision',
+    ('kind', 'decision'))
+
+TRANSIENT_STATUSES = {HTTPStatus.REQUEST_TIMEOUT, HTTPStatus.CONFLICT,
+                      HTTPStatus.TOO_EARLY}
+AUTH_STATUSES = {HTTPStatus.UNAUTHORIZED, HTTPStatus.FORBIDDEN}
+
+
+def classify(error: Exception) -> str:
+    """Error class of a failed poll.
+
+    Network errors, timeouts and 5xx answers are transient, 429 is rate
+    limited, 401 and 403 are auth failures. Other API answers, invalid
+    payloads and unexpected errors are permanent: the same request
+    fails the same way until something changes.
+    """
+    if isinstance(error, APIRequestProcessingError):
+        return TRANSIENT
+    if isinstance(error, BadAPIHttpResponseCode):
+        status_code = error.status_code or 0
+        if status_code == HTTPStatus.TOO_MANY_REQUESTS:
+            return RATE_LIMITED
+        if status_code in AUTH_STATUSES:
+            return AUTH
+        if (status_code >= HTTPStatus.INTERNAL_SERVER_ERROR
+                or status_code in TRANSIENT_STATUSES):
+            return TRANSIENT
+    return PERMANENT
+
+
+class RetryRule:
+    """Retry schedule of an error class.
+
+    The first budget consecutive failures are retried after delay
+    seconds, doubling up to max_delay; delay None keeps the regular
+    poll interval. Once the budget is spent every retry waits park
+    seconds, None for the regular interval.
+    """
+
+    __slots__ = ('delay', 'max_delay', 'budget', 'park')
+
+    def __init__(self, delay: Optional[float], max_delay: float,
+                 budget: int, park: Optional[float]) -> None:
+        self.delay = delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self.park = park
+
+    def delay_for(self, attempt: int) -> Optional[float]:
+        if attempt > self.budget:
+            return self.park
+        if self.delay is None:
+            return None
+        return min(self.max_delay, self.delay * 2 ** (attempt - 1))
+
+
+DEFAULT_RULES = {
+    TRANSIENT: RetryRule(5, 60, budget=5, park=None),
+    RATE_LIMITED: RetryRule(60, 900, budget=5, park=None),
+    AUTH: RetryRule(3600, 4 * 3600, budget=3, park=24 * 3600),
+    PERMANENT: RetryRule(None, 0, budget=3, park=3600),
+}
+
+
+class Retry:
+    """Retry decision for a failed poll, delay None is the regular one."""
+
+    __slots__ = ('kind', 'attempt', 'delay', 'parked')
+
+    def __init__(self, kind: str, attempt: int, delay: Optional[float],
+                 parked: bool = False) -> None:
+        self.kind = kind
+        self.attempt = attempt
+        self.delay = delay
+        self.parked = parked
+
+    def __repr__(self) -> str:
+        return (f'Retry(kind={self.kind}, attempt={self.attempt}, '
+                f'delay={self.delay}, parked={self.parked})')
+
+
+class RetryPolicy:
+    """Per key retry decisions by error class.
+
+    Consecutive failures of the same class count against the class
+    budget of the key, a success or a failure of another class starts
+    the count anew. So a network blip is retried within seconds instead
+    of a full poll interval, while a revoked token is parked for hours
+    instead of being sent every interval.
+    """
+
+    def __init__(self, rules: Dict[str, RetryRule] = None) -> None:
+        self.rules = dict(DEFAULT_RULES, **(rules or {}))
+        self.failures: Dict[Hashable, Tuple[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def on_failure(self, key: Hashable, error: Exception) -> Retry:
+        """Record failed poll of key and decide when to retry."""
+        kind = classify(error)
+        with self._lock:
+            previous_kind, attempts = self.failures.get(key, (None, 0))
+            attempt = attempts + 1 if previous_kind == kind else 1
+            self.failures[key] = (kind, attempt)
+        rule = self.rules[kind]
+        delay = rule.delay_for(attempt)
+        retry_after = getattr(error, 'retry_after', None)
+        if kind == RATE_LIMITED and retry_after:
+            delay = max(delay or 0, retry_after)
+        parked = attempt > rule.budget
+        RETRIES.labels(kind, 'parked' if parked else 'retry').inc()
+        return Retry(kind, attempt, delay, parked)
+
+    def on_success(self, key: Hashable) -> None:
+        if key in self.failures:
+            with self._lock:
+                self.failures.pop(key, None)
+
+    def forget(self, key: Hashable) -> None:
+        self.on_success(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            failures = list(self.failures.values())
+        stats = dict.fromkeys(self.rules, 0)
+        for kind, _ in failures:
+            stats[kind] += 1
+        return stats
@@ -0,0 +1,165 @@
+import random
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Hashable, Iterable, Optional
+
+# How long we expect the next status change to take, relative to the
+# base interval, depending on the last seen homework status.
+STATUS_FACTORS = {
+    None: 1.0,
+    'reviewing': 2.0,
+    'rejected': 1.0,
+    'approved': 4.0,
+}
+IDLE_BACKOFF = 1.25
+MAX_IDLE_STEPS = 8
+NIGHT_FACTOR = 2.0
+# Idle polls are not spaced wider than this part of the mean time
+# between the status changes kept in the history.
+CHANGE_GAP_FRACTION = 0.5
+
+
+class _PollState:
+    __slots__ = ('last_status', 'idle_polls', 'history', 'next_poll_at')
+
+    def __init__(self, history_size: int) -> None:
+        self.last_status = None
+        self.idle_polls = 0
+        self.history = deque(maxlen=history_size)
+        self.next_poll_at = 0.0
+
+
+class AdaptivePollScheduler:
+    """Per tenant poll interval based on status history and time of day.
+
+    Right after a status change the tenant is polled at min_interval,
+    because follow-up changes (e.g. reviewing -> approved) tend to come
+    soon. Every poll without changes backs the interval off, slower for
+    work that sits in review and at night, within min/max bounds. A
+    tenant whose last history_size changes came often keeps being
+    polled at a fraction of the mean time between them.
+    """
+
+    def __init__(self,
+                 base_interval: float,
+                 min_interval: float,
+                 max_interval: float,
+                 jitter: float = 0.1,
+                 night_hours: tuple = (1, 8),
+                 history_size: int = 10,
+                 clock: Callable[[], float] = time.time,
+                 rng: Callable[[], float] = random.random) -> None:
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.jitter = jitter
+        self.night_hours = night_hours
+        self.history_size = history_size
+        self.clock = clock
+        self.rng = rng
+        self.states: Dict[Hashable, _PollState] = {}
+        self.polls = 0
+        self.baseline_polls = 0.0
+        self._lock = threading.Lock()
+
+    def _is_night(self, now: float) -> bool:
+        start, end = self.night_hours
+        return start <= time.localtime(now).tm_hour < end
+
+    @staticmethod
+    def _change_gap(state: _PollState, now: float) -> Optional[float]:
+        """Mean seconds between the changes in the history window."""
+        if len(state.history) < 2:
+            return None
+        return (now - state.history[0]) / len(state.history)
+
+    def _interval(self,
+                  state: _PollState,
+                  changed: Optional[bool],
+                  now: float) -> float:
+        if changed is None:
+            interval = self.base_interval
+        elif changed:
+            interval = self.min_interval
+        else:
+            interval = (self.base_interval
+                        * STATUS_FACTORS.get(state.last_status, 1.0)
+                        * IDLE_BACKOFF ** min(state.idle_polls,
+                                              MAX_IDLE_STEPS))
+            if self._is_night(now):
+                interval *= NIGHT_FACTOR
+            gap = self._change_gap(state, now)
+            if gap is not None:
+                interval = min(interval, CHANGE_GAP_FRACTION * gap)
+        interval *= 1 + self.jitter * (2 * self.rng() - 1)
+        return max(self.min_interval, min(self.max_interval, interval))
+
+    def schedule(self,
+                 key: Hashable,
+                 statuses: Optional[Iterable[str]] = (),
+                 now: float = None,
+                 override: float = None,
+                 at_least: float = 0.0) -> float:
+        """Record poll outcome for key and return seconds to the next poll.
+
+        statuses are the homework statuses received by the poll, None
+        means the poll failed and the base interval is used. override
+        replaces the interval (e.g. a retry delay) and at_least delays
+        the poll further (e.g. an open circuit), so the next due time
+        is the one the caller really schedules.
+        """
+        now = self.clock() if now is None else now
+        with self._lock:
+            state = self.states.get(key)
+            if state is None:
+                state = self.states[key] = _PollState(self.history_size)
+            changed = None
+            if statuses is not None:
+                statuses = list(statuses)
+                changed = bool(statuses)
+                if changed:
+                    state.last_status = statuses[-1]
+                    state.idle_polls = 0
+                    state.history.extend(now for _ in statuses)
+                else:
+                    state.idle_polls += 1
+            interval = self._interval(state, changed, now)
+            if override is not None:
+                interval = override
+            interval = max(interval, at_least)
+            state.next_poll_at = now + interval
+            self.polls += 1
+            self.baseline_polls += interval / self.base_interval
+        return interval
+
+    def is_due(self, key: Hashable, now: float = None) -> bool:
+        """Check whether key should be polled now."""
+        state = self.states.get(key)
+        if state is None:
+            return True
+        now = self.clock() if now is None else now
+        return state.next_poll_at <= now
+
+    def lag(self, key: Hashable, now: float = None) -> float:
+        """Seconds passed since key was due, 0 for unknown keys."""
+        state = self.states.get(key)
+        if state is None:
+            return 0.0
+        now = self.clock() if now is None else now
+        return max(0.0, now - state.next_poll_at)
+
+    def forget(self, key: Hashable) -> None:
+        with self._lock:
+            self.states.pop(key, None)
+
+    @property
+    def saved_calls(self) -> float:
+        """API calls saved compared to polling every base_interval."""
+        return self.baseline_polls - self.polls
+
+    def stats(self) -> dict:
+        return {'tenants': len(self.states),
+                'polls': self.polls,
+                'baseline_polls': round(self.baseline_polls, 1),
+                'saved_calls': round(self.saved_calls, 1)}
@@ -0,0 +1,228 @@
+import hashlib
+import logging
+import multiprocessing
+import os
+import queue
+import time
+from bisect import bisect
+from typing import Dict, List, Optional
+
+from loggers import get_logger
+from storage import SubscriptionStore
+
+logger: logging.Logger = get_logger(__name__)
+
+SUBSCRIBE = 'subscribe'
+UNSUBSCRIBE = 'unsubscribe'
+STOP = 'stop'
+# Seconds between stop checks while waiting for commands.
+COMMAND_WAIT = 1.0
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], 'big')
+
+
+class HashRing:
+    """Consistent hash ring with virtual nodes.
+
+    Removing a node only moves the keys it owned, adding one only takes
+    keys from its ring neighbours.
+    """
+
+    def __init__(self, nodes=(), replicas: int = 64) -> None:
+        self.replicas = replicas
+        self.points: List[int] = []
+        self.owners: Dict[int, object] = {}
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node) -> None:
+        for replica in range(self.replicas):
+            point = _hash(f'{node}#{replica}')
+            if point not in self.owners:
+                self.owners[point] = node
+                self.points.insert(bisect(self.points, point), point)
+
+    def remove(self, node) -> None:
+        points = [point for point, owner in self.owners.items()
+                  if owner == node]
+        for point in points:
+            del self.owners[point]
+        removed = set(points)
+        self.points = [point for point in self.points
+                       if point not in removed]
+
+    @property
+    def nodes(self) -> set:
+        return set(self.owners.values())
+
+    def node_for(self, key) -> Optional[object]:
+        if not self.points:
+            return None
+        index = bisect(self.points, _hash(str(key))) % len(self.points)
+        return self.owners[self.points[index]]
+
+
+def run_worker(shard: int, commands: multiprocessing.Queue,
+               tick: float, workers: int) -> None:
+    """Shard process: polls its subscribers with its own engine and sender."""
+    import homework_bot
+    from message_queue import TokenBucket
+    from polling_engine import Tenant
+    from telegram import Bot
+
+    homework_bot.init_logger(homework_bot.LOG_LEVEL,
+                             log_file=f'logs/shard-{shard}.log')
+    # A stop signal sent to the whole process group flushes the shard too.
+    homework_bot.handle_stop_signals()
+    stopping = homework_bot.shutdown_requested
+    # Every shard relays its own outbox, whichever chats it serves later.
+    root, extension = os.path.splitext(homework_bot.OUTBOX_DB_PATH)
+    homework_bot.outbox.path = f'{root}-{shard}{extension}'
+    homework_bot.restore_state()
+    bot = Bot(token=homework_bot.TELEGRAM_TOKEN)
+    global_rate = homework_bot.TELEGRAM_GLOBAL_RATE / workers
+    homework_bot.message_queue.global_bucket = TokenBucket(global_rate,
+                                                           global_rate)
+    homework_bot.message_queue.start(bot)
+    homework_bot.start_outbox()
+    engine = homework_bot.make_engine(bot)
+    logger.info(f'Shard {shard} started')
+    while not stopping.is_set():
+        deadline = time.monotonic() + tick
+        while not stopping.is_set():
+            remaining = deadline - time.monotonic()
+            try:
+                command = commands.get(
+                    timeout=min(COMMAND_WAIT, max(0.0, remaining)))
+            except queue.Empty:
+                if remaining <= COMMAND_WAIT:
+                    break
+                continue
+            action = command[0]
+            if action == STOP:
+                stopping.set()
+                break
+            if action == SUBSCRIBE:
+                _, chat_id, token = command
+                homework_bot.state_index.refresh(chat_id)
+                from_date = homework_bot.cursor_store.refresh(
+                    homework_bot.tenant_cursor_key(chat_id))
+                engine.add([Tenant(token, chat_id, from_date)])
+            elif action == UNSUBSCRIBE:
+                engine.wheel.cancel(command[1])
+                homework_bot.cursor_store.flush()
+                homework_bot.state_index.flush()
+        if not stopping.is_set():
+            engine.run_due()
+    homework_bot.shutdown(engine=engine)
+    logger.info(f'Shard {shard} stopped')
+
+
+class Supervisor:
+    """Partitions subscribers between worker processes.
+
+    Subscribers are assigned to shards by consistent hashing of chat_id.
+    check_workers() restarts dead workers and moves their subscribers,
+    so a crash only touches the dead shard's chats. Subscriptions are
+    kept in store, if given, and resubscribed by start().
+    """
+
+    def __init__(self, workers: int, tick: float = 60,
+                 store: SubscriptionStore = None) -> None:
+        self.workers_count = workers
+        self.tick = tick
+        self.store = store
+        self.context = multiprocessing.get_context('spawn')
+        self.ring = HashRing()
+        self.processes: Dict[int, multiprocessing.Process] = {}
+        self.queues: Dict[int, multiprocessing.Queue] = {}
+        self.subscribers: Dict[object, str] = {}
+        self.assignment: Dict[object, int] = {}
+
+    def _spawn(self, shard: int) -> None:
+        commands = self.context.Queue()
+        process = self.context.Process(target=run_worker,
+                                       args=(shard, commands, self.tick,
+                                             self.workers_count),
+                                       name=f'shard-{shard}',
+                                       daemon=True)
+        process.start()
+        self.queues[shard] = commands
+        self.processes[shard] = process
+        self.ring.add(shard)
+
+    def start(self) -> None:
+        for shard in range(self.workers_count):
+            self._spawn(shard)
+        logger.info(f'Started {self.workers_count} shard workers')
+        if self.store is not None:
+            for chat_id, token in self.store.items():
+                self.subscribe(chat_id, token)
+
+    def _assign(self, chat_id) -> None:
+        shard = self.ring.node_for(chat_id)
+        previous = self.assignment.get(chat_id)
+        if previous == shard:
+            return
+        if previous is not None and previous in self.queues:
+            self.queues[previous].put((UNSUBSCRIBE, chat_id))
+        self.assignment[chat_id] = shard
+        self.queues[shard].put((SUBSCRIBE, chat_id, self.subscribers[chat_id]))
+
+    def subscribe(self, chat_id, token: str) -> int:
+        """Route subscriber to its shard, return shard number."""
+        self.subscribers[chat_id] = token
+        if self.store is not None:
+            self.store.set(chat_id, token)
+        self._assign(chat_id)
+        return self.assignment[chat_id]
+
+    def unsubscribe(self, chat_id) -> None:
+        self.subscribers.pop(chat_id, None)
+        if self.store is not None:
+            self.store.remove(chat_id)
+        shard = self.assignment.pop(chat_id, None)
+        if shard is not None and shard in self.queues:
+            self.queues[shard].put((UNSUBSCRIBE, chat_id))
+
+    def rebalance(self) -> int:
+        """Reassign subscribers after ring changes, return moved count."""
+        moved = 0
+        for chat_id in list(self.subscribers):
+            if self.assignment.get(chat_id) != self.ring.node_for(chat_id):
+                self._assign(chat_id)
+                moved += 1
+        return moved
+
+    def check_workers(self, context=None) -> None:
+        """Replace dead workers and move their subscribers."""
+        dead = [shard for shard, process in self.processes.items()
+                if not process.is_alive()]
+        if not dead:
+            return
+        for shard in dead:
+            logger.error(f'Shard {shard} worker died, '
+                         f'exit code {self.processes[shard].exitcode}')
+            self.ring.remove(shard)
+            self.queues.pop(shard).close()
+            del self.processes[shard]
+            for chat_id, assigned in list(self.assignment.items()):
+                if assigned == shard:
+                    del self.assignment[chat_id]
+        if self.ring.nodes:
+            self.rebalance()
+        for shard in dead:
+            self._spawn(shard)
+        logger.info(f'Rebalanced {self.rebalance()} subscribers')
+
+    def stop(self, timeout: float = 30) -> None:
+        """Stop workers, terminate the ones still alive after timeout."""
+        for commands in self.queues.values():
+            commands.put((STOP,))
+        deadline = time.monotonic() + timeout
+        for process in self.processes.values():
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.terminate()
@@ -0,0 +1,98 @@
+import threading
+import time
+from typing import Callable, Dict, Hashable
+
+from metrics import REGISTRY
+
+SAVED_CALLS = REGISTRY.counter(
+    'homework_bot_api_calls_saved_total',
+    'Upstream calls avoided by request coalescing',
+    ('reason',))
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesces concurrent identical calls into one.
+
+    Callers of do() with the same key while a call is in flight wait
+    for it and share its result or exception. Successful results are
+    kept for ttl seconds, so a burst right after the call is answered
+    from memory as well. Shared results must not be mutated.
+    """
+
+    def __init__(self, ttl: float = 0,
+                 maxsize: int = 10000,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.clock = clock
+        self.in_flight: Dict[Hashable, _Call] = {}
+        self.cache: Dict[Hashable, tuple] = {}
+        self.calls = 0
+        self.coalesced = 0
+        self.cached = 0
+        self._lock = threading.Lock()
+
+    def _cached(self, key: Hashable, now: float):
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= now:
+            del self.cache[key]
+            return None
+        return entry
+
+    def _store(self, key: Hashable, result, now: float) -> None:
+        if len(self.cache) >= self.maxsize:
+            self.cache = {key: entry for key, entry in self.cache.items()
+                          if entry[0] > now}
+            if len(self.cache) >= self.maxsize:
+                self.cache.clear()
+        self.cache[key] = (now + self.ttl, result)
+
+    def do(self, key: Hashable, function: Callable, *args):
+        """Return function(*args), sharing it between identical calls."""
+        with self._lock:
+            entry = self._cached(key, self.clock()) if self.ttl else None
+            if entry is not None:
+                self.cached += 1
+                SAVED_CALLS.labels('cached').inc()
+                return entry[1]
+            call = self.in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = self.in_flight[key] = _Call()
+                self.calls += 1
+            else:
+                self.coalesced += 1
+                SAVED_CALLS.labels('coalesced').inc()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = function(*args)
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self.in_flight[key]
+                if self.ttl and call.error is None:
+                    self._store(key, call.result, self.clock())
+            call.done.set()
+        return call.result
+
+    def stats(self) -> dict:
+        return {'calls': self.calls,
+                'coalesced': self.coalesced,
+                'cached': self.cached}
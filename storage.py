@@ -0,0 +1,292 @@
+import logging
+import os
+import sqlite3
+import sys
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Tuple
+
+from loggers import get_logger
+
+logger: logging.Logger = get_logger(__name__)
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """Open SQLite database in WAL mode, shared by the bot stores."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    connection = sqlite3.connect(path,
+                                 check_same_thread=False,
+                                 isolation_level=None)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    return connection
+
+
+class BatchedStore(ABC):
+    """In-memory state persisted by batched background commits.
+
+    Reads and writes hit memory only. Changed entries are written to
+    SQLite by a background thread every flush_interval seconds, one
+    transaction per batch, so polling never waits on disk. Until open()
+    is called the store works purely in memory.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 5.0) -> None:
+        self.path = path
+        self.flush_interval = flush_interval
+        self.dirty: dict = {}
+        self.connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @abstractmethod
+    def create_tables(self, connection: sqlite3.Connection) -> None:
+        """Create the tables of the store if they do not exist."""
+
+    @abstractmethod
+    def load(self, connection: sqlite3.Connection) -> int:
+        """Load stored entries into memory, return their number."""
+
+    @abstractmethod
+    def write(self, connection: sqlite3.Connection, batch: dict) -> None:
+        """Write a batch of changed entries within a transaction."""
+
+    def open(self):
+        """Open database, load stored entries and start the writer."""
+        self.connection = connect(self.path)
+        self.create_tables(self.connection)
+        with self._lock:
+            loaded = self.load(self.connection)
+        logger.info(f'{type(self).__name__} loaded {loaded} entries '
+                    f'from {self.path}')
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run,
+                                        name=type(self).__name__,
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def mark_dirty(self, key, value) -> None:
+        """Schedule entry write, caller must hold self._lock."""
+        self.dirty[key] = value
+
+    def flush(self) -> int:
+        """Write all changed entries in one transaction."""
+        if self.connection is None:
+            return 0
+        with self._lock:
+            batch, self.dirty = self.dirty, {}
+        if not batch:
+            return 0
+        with self._db_lock:
+            try:
+                self.connection.execute('BEGIN')
+                self.write(self.connection, batch)
+                self.connection.execute('COMMIT')
+            except sqlite3.Error as error:
+                if self.connection.in_transaction:
+                    self.connection.execute('ROLLBACK')
+                with self._lock:
+                    for key, value in batch.items():
+                        self.dirty.setdefault(key, value)
+                logger.error(f'{type(self).__name__} flush error:{error}')
+                return 0
+        return len(batch)
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.flush_interval):
+            self.flush()
+
+    def close(self) -> None:
+        """Stop the writer and persist pending entries."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+class CursorStore(BatchedStore):
+    """Durable from_date cursors."""
+
+    def __init__(self, path: str, flush_interval: float = 5.0) -> None:
+        super().__init__(path, flush_interval)
+        self.cursors: Dict[str, int] = {}
+
+    def create_tables(self, connection: sqlite3.Connection) -> None:
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS cursors ('
+            'key TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+
+    def load(self, connection: sqlite3.Connection) -> int:
+        for key, value in connection.execute(
+                'SELECT key, value FROM cursors'):
+            self.cursors.setdefault(key, value)
+        return len(self.cursors)
+
+    def write(self, connection: sqlite3.Connection, batch: dict) -> None:
+        connection.executemany(
+            'INSERT INTO cursors (key, value) VALUES (?, ?) '
+            'ON CONFLICT(key) DO UPDATE SET value = excluded.value',
+            batch.items())
+
+    def get(self, key: str, default: int = None) -> Optional[int]:
+        return self.cursors.get(key, default)
+
+    def refresh(self, key: str) -> Optional[int]:
+        """Reload cursor written by another process."""
+        if self.connection is None:
+            return self.get(key)
+        with self._db_lock:
+            row = self.connection.execute(
+                'SELECT value FROM cursors WHERE key = ?', (key,)).fetchone()
+        if row is not None:
+            with self._lock:
+                if key not in self.dirty:
+                    self.cursors[key] = row[0]
+        return self.get(key)
+
+    def set(self, key: str, value: int) -> None:
+        """Update cursor in memory, it is persisted by the next flush."""
+        with self._lock:
+            if self.cursors.get(key) == value:
+                return
+            self.cursors[key] = value
+            self.mark_dirty(key, value)
+
+
+class HomeworkStateIndex(BatchedStore):
+    """Last seen (status, date_updated) of every homework.
+
+    Lets the bot notify only about real status transitions, so
+    overlapping from_date windows and API retries never produce
+    duplicate messages. Lookup is a single dict access.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 5.0) -> None:
+        super().__init__(path, flush_interval)
+        self.states: Dict[Tuple[str, object], Tuple[str, str]] = {}
+
+    def create_tables(self, connection: sqlite3.Connection) -> None:
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS homework_states ('
+            'owner TEXT NOT NULL, homework TEXT NOT NULL, '
+            'status TEXT NOT NULL, date_updated TEXT, '
+            'PRIMARY KEY (owner, homework)) WITHOUT ROWID')
+
+    def load(self, connection: sqlite3.Connection) -> int:
+        for owner, homework, status, date_updated in connection.execute(
+                'SELECT owner, homework, status, date_updated '
+                'FROM homework_states'):
+            self.states.setdefault((owner, homework),
+                                   (sys.intern(status), date_updated))
+        return len(self.states)
+
+    def write(self, connection: sqlite3.Connection, batch: dict) -> None:
+        connection.executemany(
+            'INSERT INTO homework_states '
+            '(owner, homework, status, date_updated) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT(owner, homework) DO UPDATE SET '
+            'status = excluded.status, date_updated = excluded.date_updated',
+            [(*key, *value) for key, value in batch.items()])
+
+    def refresh(self, owner) -> None:
+        """Reload owner states written by another process."""
+        if self.connection is None:
+            return
+        owner = str(owner)
+        with self._db_lock:
+            rows = self.connection.execute(
+                'SELECT homework, status, date_updated '
+                'FROM homework_states WHERE owner = ?', (owner,)).fetchall()
+        with self._lock:
+            for homework, status, date_updated in rows:
+                key = (owner, homework)
+                if key not in self.dirty:
+                    self.states[key] = (sys.intern(status), date_updated)
+
+    def get(self, owner, homework) -> Optional[Tuple[str, str]]:
+        return self.states.get((str(owner), str(homework)))
+
+    def _changed(self, key: tuple, state: tuple) -> bool:
+        previous = self.states.get(key)
+        if previous is None:
+            return True
+        if previous == state:
+            return False
+        return not (previous[1] and state[1] and previous[1] > state[1])
+
+    def is_changed(self, owner, record) -> bool:
+        """Return True if record differs from the state, keep the state."""
+        key = (str(owner), str(record.id or record.homework_name))
+        return self._changed(key, (record.status, record.date_updated))
+
+    def is_transition(self, owner, record) -> bool:
+        """Record homework state, return True if it has changed."""
+        key = (str(owner), str(record.id or record.homework_name))
+        state = (sys.intern(record.status), record.date_updated)
+        with self._lock:
+            if not self._changed(key, state):
+                return False
+            self.states[key] = state
+            self.mark_dirty(key, state)
+        return True
+
+
+class SubscriptionStore(BatchedStore):
+    """Practicum tokens of the chats subscribed in sharded mode.
+
+    Chat ids keep their type, the column has no affinity. Removed
+    subscriptions are deleted by the next flush. Another table keeps
+    the chats started in single-tenant mode, with the tenant they poll.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 5.0,
+                 table: str = 'subscriptions') -> None:
+        super().__init__(path, flush_interval)
+        self.table = table
+        self.tokens: Dict[object, str] = {}
+
+    def create_tables(self, connection: sqlite3.Connection) -> None:
+        connection.execute(
+            f'CREATE TABLE IF NOT EXISTS {self.table} ('
+            'chat_id PRIMARY KEY, token TEXT NOT NULL)')
+
+    def load(self, connection: sqlite3.Connection) -> int:
+        for chat_id, token in connection.execute(
+                f'SELECT chat_id, token FROM {self.table}'):
+            self.tokens.setdefault(chat_id, token)
+        return len(self.tokens)
+
+    def write(self, connection: sqlite3.Connection, batch: dict) -> None:
+        connection.executemany(
+            f'DELETE FROM {self.table} WHERE chat_id = ?',
+            [(chat_id,) for chat_id, token in batch.items() if token is None])
+        connection.executemany(
+            f'INSERT INTO {self.table} (chat_id, token) VALUES (?, ?) '
+            'ON CONFLICT(chat_id) DO UPDATE SET token = excluded.token',
+            [(chat_id, token) for chat_id, token in batch.items()
+             if token is not None])
+
+    def items(self) -> list:
+        with self._lock:
+            return list(self.tokens.items())
+
+    def set(self, chat_id, token: str) -> None:
+        with self._lock:
+            if self.tokens.get(chat_id) == token:
+                return
+            self.tokens[chat_id] = token
+            self.mark_dirty(chat_id, token)
+
+    def remove(self, chat_id) -> None:
+        with self._lock:
+            if self.tokens.pop(chat_id, None) is not None:
+                self.mark_dirty(chat_id, None)
@@ -0,0 +1,121 @@
+import pytest
+import requests
+
+from api_client import PracticumAPIClient, retry_after
+from circuit_breaker import CLOSED, OPEN, CircuitBreaker
+from exceptions import (APIError, APIRequestProcessingError,
+                        BadAPIHttpResponseCode, BadAPIResponseFormat)
+
+ENDPOINT = 'https://practicum.yandex.ru/api/user_api/homework_statuses/'
+HEADERS = {'Authorization': 'OAuth token'}
+
+
+class FakeResponse:
+
+    def __init__(self, status_code=200, payload=None, error=None,
+                 headers=None) -> None:
+        self.status_code = status_code
+        self.payload = payload
+        self.error = error
+        self.headers = headers or {}
+
+    def json(self):
+        if self.error is not None:
+            raise self.error
+        return self.payload
+
+
+class FakeSession:
+    """Answers get() with the queued responses or exceptions."""
+
+    def __init__(self, *answers) -> None:
+        self.answers = list(answers)
+        self.calls = []
+
+    def get(self, url, **kwargs):
+        self.calls.append((url, kwargs))
+        answer = self.answers.pop(0) if len(self.answers) > 1 else (
+            self.answers[0])
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+
+def make_client(*answers, **kwargs) -> PracticumAPIClient:
+    client = PracticumAPIClient(ENDPOINT, **kwargs)
+    client.session = FakeSession(*answers)
+    return client
+
+
+class TestPracticumAPIClient:
+
+    def test_answer(self):
+        payload = {'homeworks': [], 'current_date': 2}
+        client = make_client(FakeResponse(payload=payload),
+                             connect_timeout=1, read_timeout=2)
+        assert client.get_homework_statuses(1, HEADERS) == payload
+        url, kwargs = client.session.calls[0]
+        assert url == ENDPOINT
+        assert kwargs == {'headers': HEADERS, 'params': {'from_date': 1},
+                          'timeout': (1, 2)}
+
+    def test_bad_status_code(self):
+        client = make_client(FakeResponse(429, headers={'Retry-After': '30'}))
+        with pytest.raises(BadAPIHttpResponseCode) as error:
+            client.get_homework_statuses(1, HEADERS)
+        assert error.value.status_code == 429
+        assert error.value.retry_after == 30
+
+    def test_invalid_json_is_format_error(self):
+        # requests' JSONDecodeError is a RequestException and a ValueError,
+        # it must be reported as a format error, not as a request error.
+        decode_error = requests.exceptions.JSONDecodeError(
+            'Expecting value', '<html>', 0)
+        assert isinstance(decode_error, requests.RequestException)
+        client = make_client(FakeResponse(error=decode_error))
+        with pytest.raises(BadAPIResponseFormat):
+            client.get_homework_statuses(1, HEADERS)
+
+    def test_plain_value_error_is_format_error(self):
+        client = make_client(FakeResponse(error=ValueError('bad json')))
+        with pytest.raises(BadAPIResponseFormat):
+            client.get_homework_statuses(1, HEADERS)
+
+    def test_network_error(self):
+        client = make_client(requests.ConnectionError('refused'))
+        with pytest.raises(APIRequestProcessingError):
+            client.get_homework_statuses(1, HEADERS)
+
+    def test_error_in_payload(self):
+        client = make_client(FakeResponse(payload={'error': 'wrong date'}))
+        with pytest.raises(APIError):
+            client.get_homework_statuses(1, HEADERS)
+
+    def test_breaker_counts_server_errors_only(self):
+        breaker = CircuitBreaker(failure_threshold=2, jitter=0)
+        client = make_client(FakeResponse(401), breaker=breaker)
+        for _ in range(3):
+            with pytest.raises(BadAPIHttpResponseCode):
+                client.get_homework_statuses(1, HEADERS)
+        assert breaker.state == CLOSED
+        client.session = FakeSession(FakeResponse(502))
+        for _ in range(2):
+            with pytest.raises(BadAPIHttpResponseCode):
+                client.get_homework_statuses(1, HEADERS)
+        assert breaker.state == OPEN
+
+    def test_cached_answer(self):
+        payload = {'homeworks': [], 'current_date': 2}
+        client = make_client(FakeResponse(payload=payload), cache_ttl=60)
+        client.get_homework_statuses(1, HEADERS)
+        client.get_homework_statuses(1, HEADERS)
+        client.get_homework_statuses(2, HEADERS)
+        assert len(client.session.calls) == 2
+
+
+@pytest.mark.parametrize('value, seconds', [
+    ('120', 120), ('0', 0), (None, None), ('', None),
+    ('Wed, 21 Oct 2015 07:28:00 GMT', None),
+])
+def test_retry_after(value, seconds):
+    assert retry_after(value) == seconds
@@ -1,11 +1,28 @@
 import os
 from http import HTTPStatus
 
-import requests
+import pytest
 import telegram
 import utils
 
 
+def patch_api_get(monkeypatch, mock_get):
+    """Route requests of the pooled API session to mock_get."""
+    import homework_bot
+    monkeypatch.setattr(homework_bot.api_client.session, 'get', mock_get)
+
+
+@pytest.fixture(autouse=True)
+def fresh_api_client():
+    """Close the shared circuit breaker and drop cached API answers."""
+    import homework_bot
+    homework_bot.api_breaker.record_success()
+    homework_bot.api_client.flights.cache.clear()
+    yield
+    homework_bot.api_breaker.record_success()
+    homework_bot.api_client.flights.cache.clear()
+
+
 class MockResponseGET:
 
     def __init__(self, url, params=None, random_timestamp=None,
@@ -86,7 +103,7 @@ class TestHomework:
         except KeyError:
             pass
     try:
-        import homework
+        import homework_bot as homework
     except KeyError as e:
         for arg in e.args:
             if arg in ENV_VARS:
@@ -109,7 +126,7 @@ class TestHomework:
             except KeyError:
                 pass
 
-        import homework
+        import homework_bot as homework
 
         for v in self.ENV_VARS:
             utils.check_default_var_exists(homework, v)
@@ -133,7 +150,7 @@ class TestHomework:
             except KeyError:
                 pass
 
-        import homework
+        import homework_bot as homework
 
         for v in self.ENV_VARS:
             utils.check_default_var_exists(homework, v)
@@ -151,7 +168,7 @@ class TestHomework:
         )
 
     def test_bot_init_not_global(self):
-        import homework
+        import homework_bot as homework
 
         assert not (hasattr(homework, 'bot') and isinstance(getattr(homework, 'bot'), telegram.Bot)), (
             'Убедитесь, что бот инициализирован только в main()'
@@ -163,7 +180,7 @@ class TestHomework:
 
         monkeypatch.setattr(telegram, "Bot", mock_telegram_bot)
 
-        import homework
+        import homework_bot as homework
 
         assert hasattr(homework, 'logging'), (
             'Убедитесь, что настроили логирование для вашего бота'
@@ -175,7 +192,7 @@ class TestHomework:
 
         monkeypatch.setattr(telegram, "Bot", mock_telegram_bot)
 
-        import homework
+        import homework_bot as homework
         utils.check_function(homework, 'send_message', 2)
 
     def test_get_api_answers(self, monkeypatch, random_timestamp,
@@ -186,9 +203,9 @@ class TestHomework:
                 current_timestamp=current_timestamp, **kwargs
             )
 
-        monkeypatch.setattr(requests, 'get', mock_response_get)
+        patch_api_get(monkeypatch, mock_response_get)
 
-        import homework
+        import homework_bot as homework
 
         func_name = 'get_api_answer'
         utils.check_function(homework, func_name, 1)
@@ -232,9 +249,9 @@ class TestHomework:
             response.json = json_invalid
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_500_response_get)
+        patch_api_get(monkeypatch, mock_500_response_get)
 
-        import homework
+        import homework_bot as homework
 
         func_name = 'get_api_answer'
         try:
@@ -257,7 +274,7 @@ class TestHomework:
             "lesson_name": "Итоговый проект"
         }
 
-        import homework
+        import homework_bot as homework
 
         func_name = 'parse_status'
 
@@ -315,9 +332,9 @@ class TestHomework:
             response.json = valid_response_json
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_response_get)
+        patch_api_get(monkeypatch, mock_response_get)
 
-        import homework
+        import homework_bot as homework
 
         func_name = 'check_response'
         response = homework.get_api_answer(current_timestamp)
@@ -352,30 +369,26 @@ class TestHomework:
             response.json = valid_response_json
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_response_get)
+        patch_api_get(monkeypatch, mock_response_get)
 
-        import homework
+        import homework_bot as homework
 
         func_name = 'parse_status'
         response = homework.get_api_answer(current_timestamp)
         homeworks = homework.check_response(response)
-        for hw in homeworks:
-            status_message = None
-            try:
-                status_message = homework.parse_status(hw)
-            except:
-                pass
-            else:
-                assert False, (
-                    f'Убедитесь, что функция `{func_name}` выбрасывает ошибку '
-                    'при недокументированном статусе домашней работы в ответе от API'
-                )
-            if status_message is not None:
-                for hw_status in self.HOMEWORK_STATUSES:
-                    assert not status_message.endswith(hw_status), (
-                        f'Убедитесь, что функция `{func_name} не возвращает корректный '
-                        'ответ при получении домашки с недокументированным статусом'
-                    )
+        assert not homeworks, (
+            'Убедитесь, что `check_response` отбрасывает записи '
+            'с недокументированным статусом'
+        )
+        try:
+            homework.parse_status(response['homeworks'][0])
+        except KeyError:
+            pass
+        else:
+            assert False, (
+                f'Убедитесь, что функция `{func_name}` выбрасывает ошибку '
+                'при недокументированном статусе домашней работы в ответе от API'
+            )
 
     def test_parse_status_no_status_key(self, monkeypatch, random_timestamp,
                                         current_timestamp, api_url):
@@ -400,9 +413,9 @@ class TestHomework:
             response.json = valid_response_json
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_response_get)
+        patch_api_get(monkeypatch, mock_response_get)
 
-        import homework
+        import homework_bot as homework
 
         func_name = 'parse_status'
         response = homework.get_api_answer(current_timestamp)
@@ -448,16 +461,19 @@ class TestHomework:
             response.json = valid_response_json
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_response_get)
+        patch_api_get(monkeypatch, mock_response_get)
 
-        import homework
+        import homework_bot as homework
 
         func_name = 'parse_status'
         response = homework.get_api_answer(current_timestamp)
         homeworks = homework.check_response(response)
+        assert not homeworks, (
+            'Убедитесь, что `check_response` отбрасывает записи '
+            'без ключа `homework_name`'
+        )
         try:
-            for hw in homeworks:
-                homework.parse_status(hw)
+            homework.parse_status(response['homeworks'][0])
         except KeyError:
             pass
         else:
@@ -484,9 +500,9 @@ class TestHomework:
             response.json = json_invalid
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_no_homeworks_response_get)
+        patch_api_get(monkeypatch, mock_no_homeworks_response_get)
 
-        import homework
+        import homework_bot as homework
 
         func_name = 'check_response'
         result = homework.get_api_answer(current_timestamp)
@@ -525,9 +541,9 @@ class TestHomework:
             response.json = valid_response_json
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_response_get)
+        patch_api_get(monkeypatch, mock_response_get)
 
-        import homework
+        import homework_bot as homework
 
         func_name = 'check_response'
         response = homework.get_api_answer(current_timestamp)
@@ -565,9 +581,9 @@ class TestHomework:
             response.json = valid_response_json
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_response_get)
+        patch_api_get(monkeypatch, mock_response_get)
 
-        import homework
+        import homework_bot as homework
 
         func_name = 'check_response'
         response = homework.get_api_answer(current_timestamp)
@@ -599,9 +615,9 @@ class TestHomework:
             response.json = json_invalid
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_empty_response_get)
+        patch_api_get(monkeypatch, mock_empty_response_get)
 
-        import homework
+        import homework_bot as homework
 
         func_name = 'check_response'
         result = homework.get_api_answer(current_timestamp)
@@ -626,9 +642,9 @@ class TestHomework:
             )
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_response_get)
+        patch_api_get(monkeypatch, mock_response_get)
 
-        import homework
+        import homework_bot as homework
 
         func_name = 'check_response'
         try:
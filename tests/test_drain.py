@@ -0,0 +1,48 @@
+import threading
+
+from drain import Drain
+
+
+class TestDrain:
+
+    def test_jobs_run_while_open(self):
+        drain = Drain()
+        calls = []
+        job = drain.job(lambda value: calls.append(value) or value)
+        assert job(1) == 1
+        assert drain.close(0)
+        assert job(2) is None
+        assert calls == [1]
+
+    def test_close_waits_for_running_job(self):
+        drain = Drain()
+        entered, release = threading.Event(), threading.Event()
+
+        @drain.job
+        def poll():
+            entered.set()
+            release.wait(5)
+
+        thread = threading.Thread(target=poll)
+        thread.start()
+        entered.wait(5)
+        assert not drain.close(0.01)
+        assert drain.active == 1
+        assert not drain.enter()
+        release.set()
+        assert drain.close(5)
+        thread.join()
+        assert drain.active == 0
+
+    def test_exception_leaves_job(self):
+        drain = Drain()
+
+        @drain.job
+        def failing():
+            raise ValueError
+
+        try:
+            failing()
+        except ValueError:
+            pass
+        assert drain.active == 0
@@ -0,0 +1,89 @@
+import os
+
+import pytest
+
+from event_log import EventLog
+
+
+def record(number, status, date_updated):
+    return {'id': number, 'homework_name': f'hw{number}.zip',
+            'status': status, 'date_updated': date_updated}
+
+
+@pytest.fixture
+def directory(tmp_path):
+    return str(tmp_path / 'events')
+
+
+def make_log(directory, **kwargs):
+    return EventLog(directory, flush_interval=60, **kwargs).open()
+
+
+def fill(log):
+    log.append('chat', record(1, 'reviewing', '2022-01-01'), 1)
+    log.append('chat', record(2, 'reviewing', '2022-01-02'), 2)
+    log.append('other', record(1, 'reviewing', '2022-01-02'), 3)
+    log.append('chat', record(1, 'rejected', '2022-01-03'), 4)
+    log.append('chat', record(1, 'approved', '2022-01-04'), 5)
+
+
+class TestEventLog:
+
+    def test_status_is_latest_event(self, directory):
+        log = make_log(directory, block_events=2)
+        fill(log)
+        assert [event[:3] for event in log.status('chat')] == [
+            ('2', 'hw2.zip', 'reviewing'), ('1', 'hw1.zip', 'approved')]
+        assert log.status('nobody') == []
+        log.close()
+
+    def test_history_newest_first(self, directory):
+        log = make_log(directory, block_events=2)
+        fill(log)
+        assert [event[2] for event in log.history('chat')] == [
+            'approved', 'rejected', 'reviewing', 'reviewing']
+        assert [event[2] for event in log.history('chat', limit=2)] == [
+            'approved', 'rejected']
+        log.close()
+
+    def test_history_of_homework_by_id_or_name(self, directory):
+        log = make_log(directory, block_events=2)
+        fill(log)
+        expected = ['approved', 'rejected', 'reviewing']
+        assert [event[2] for event in log.history('chat', '1')] == expected
+        assert [event[2]
+                for event in log.history('chat', 'hw1.zip')] == expected
+        assert log.history('chat', 'missing') == []
+        log.close()
+
+    def test_reopen_rebuilds_index(self, directory):
+        log = make_log(directory, block_events=2, segment_bytes=1)
+        fill(log)
+        log.close()
+        assert len(os.listdir(directory)) > 1
+
+        log = make_log(directory)
+        assert log.events == 5
+        assert [event[2] for event in log.history('chat', '1')] == [
+            'approved', 'rejected', 'reviewing']
+        assert log.status('other')[0][2] == 'reviewing'
+        log.close()
+
+    def test_torn_block_is_cut_off(self, directory):
+        log = make_log(directory, block_events=2)
+        fill(log)
+        log.close()
+        path = os.path.join(directory, sorted(os.listdir(directory))[-1])
+        with open(path, 'ab') as segment:
+            segment.write(b'\x00\x00\x01\x00garbage')
+
+        log = make_log(directory)
+        assert log.events == 5
+        log.append('chat', record(3, 'reviewing', '2022-01-05'))
+        log.close()
+        assert make_log(directory).events == 6
+
+    def test_closed_log_ignores_events(self, directory):
+        log = EventLog(directory)
+        log.append('chat', record(1, 'approved', '2022-01-01'))
+        assert log.status('chat') == []
@@ -0,0 +1,367 @@
+import secrets
+import socket
+import threading
+from http import HTTPStatus
+from types import SimpleNamespace
+
+import pytest
+import requests
+from telegram import Update, User
+from telegram.ext import TypeHandler, Updater
+
+import homework_bot
+from exceptions import BadAPIHttpResponseCode
+from job_registry import JobRegistry
+from leader import LeaderLease
+from message_queue import OutgoingMessageQueue
+from outbox import DELIVERED, Outbox
+from scheduler import AdaptivePollScheduler
+from storage import CursorStore, HomeworkStateIndex, SubscriptionStore
+
+
+def homework(name, status, date_updated='2022-01-01T00:00:00Z'):
+    return {'id': len(name), 'homework_name': name, 'status': status,
+            'date_updated': date_updated}
+
+
+class FakeJob:
+
+    def __init__(self, callback=None, interval=None, context=None) -> None:
+        self.callback = callback
+        self.interval = interval
+        self.context = context
+        self.removed = False
+
+    def schedule_removal(self) -> None:
+        self.removed = True
+
+
+class FakeJobQueue:
+
+    def __init__(self) -> None:
+        self.jobs = []
+
+    def run_once(self, callback, interval, context=None) -> FakeJob:
+        job = FakeJob(callback, interval, context)
+        self.jobs.append(job)
+        return job
+
+
+class FakeContext:
+
+    def __init__(self, job: FakeJob) -> None:
+        self.job = job
+        self.job_queue = FakeJobQueue()
+        self.bot = None
+
+
+class BotJob:
+    """check_homeworks wired to in-memory state and recorded sends."""
+
+    def __init__(self, monkeypatch, tmp_path) -> None:
+        path = str(tmp_path / 'state.sqlite3')
+        self.chat_id = homework_bot.TELEGRAM_CHAT_ID
+        self.responses = []
+        self.sent = []
+        self.events = []
+        self.send_error = None
+        self.state_index = HomeworkStateIndex(path)
+        self.leader = LeaderLease(path, ttl=0)
+        self.jobs = JobRegistry()
+        self.job = FakeJob(context=self.chat_id)
+        self.jobs.add(self.chat_id, self.job)
+        self.monkeypatch = monkeypatch
+        monkeypatch.setattr(homework_bot, 'state_index', self.state_index)
+        monkeypatch.setattr(homework_bot, 'cursor_store', CursorStore(path))
+        monkeypatch.setattr(homework_bot, 'leader', self.leader)
+        monkeypatch.setattr(homework_bot, 'polling_jobs', self.jobs)
+        monkeypatch.setattr(homework_bot, 'event_log', self)
+        monkeypatch.setattr(homework_bot, 'get_api_answer', self.answer)
+        monkeypatch.setattr(homework_bot, 'notify_many', self.notify_many)
+        monkeypatch.setattr(homework_bot.retry_policy, 'failures', {})
+
+    def use_leader(self, lease: LeaderLease) -> None:
+        self.monkeypatch.setattr(homework_bot, 'leader', lease)
+
+    def answer(self, timestamp):
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    def notify_many(self, bot, messages) -> None:
+        if self.send_error is not None:
+            raise self.send_error
+        self.sent.extend(text for _, text, _ in messages)
+
+    def append(self, owner, record) -> None:
+        self.events.append(record.homework_name)
+
+    def run(self, *homeworks) -> FakeContext:
+        self.responses.append({'homeworks': list(homeworks),
+                               'current_date': 1})
+        return self.run_job()
+
+    def run_job(self) -> FakeContext:
+        context = FakeContext(self.job)
+        homework_bot.check_homeworks(context)
+        if context.job_queue.jobs:
+            self.job = context.job_queue.jobs[-1]
+        return context
+
+
+@pytest.fixture
+def bot_job(monkeypatch, tmp_path):
+    return BotJob(monkeypatch, tmp_path)
+
+
+class TestCheckHomeworks:
+
+    def test_mixed_batch_notifies_known_statuses(self, bot_job):
+        bot_job.run(homework('first', 'approved'),
+                    homework('second', 'unknown'),
+                    homework('third', 'rejected'))
+        assert len(bot_job.sent) == 2
+        assert '"first"' in bot_job.sent[0]
+        assert '"third"' in bot_job.sent[1]
+        assert bot_job.events == ['first', 'third']
+        assert bot_job.state_index.get(homework_bot.DEFAULT_TENANT,
+                                       len('second')) is None
+
+    def test_state_kept_until_notified(self, bot_job):
+        bot_job.send_error = ValueError('outbox is broken')
+        context = bot_job.run(homework('first', 'approved'))
+        assert not bot_job.events
+        assert bot_job.state_index.get(homework_bot.DEFAULT_TENANT,
+                                       len('first')) is None
+        assert context.job_queue.jobs
+
+        bot_job.send_error = None
+        bot_job.run(homework('first', 'approved'))
+        assert len(bot_job.sent) == 1
+        assert bot_job.events == ['first']
+
+    def test_known_state_not_notified_again(self, bot_job):
+        bot_job.run(homework('first', 'reviewing'))
+        bot_job.run(homework('first', 'reviewing'))
+        assert len(bot_job.sent) == 1
+
+    def test_retry_delay_is_not_lag(self, bot_job, monkeypatch, clock):
+        scheduler = AdaptivePollScheduler(600, 120, 3600, clock=clock)
+        monkeypatch.setattr(homework_bot, 'poll_scheduler', scheduler)
+        bot_job.responses.append(
+            BadAPIHttpResponseCode('rejected', HTTPStatus.UNAUTHORIZED))
+        context = bot_job.run_job()
+        delay = context.job_queue.jobs[-1].interval
+        assert delay == homework_bot.API_AUTH_BACKOFF
+        clock.now += delay
+        assert scheduler.lag(bot_job.chat_id) == 0
+
+    def test_standby_keeps_polling_chain(self, bot_job, tmp_path, clock):
+        path = str(tmp_path / 'lease.sqlite3')
+        active = LeaderLease(path, holder='active', clock=clock).open()
+        standby = LeaderLease(path, holder='standby', clock=clock).open()
+        assert active.try_acquire()
+        assert not standby.try_acquire()
+        bot_job.use_leader(standby)
+
+        context = bot_job.run(homework('first', 'approved'))
+        assert not bot_job.sent
+        assert context.job_queue.jobs[0].interval == homework_bot.RETRY_TIME
+        assert bot_job.jobs.is_current(bot_job.chat_id, bot_job.job)
+
+        clock.now += active.ttl
+        assert standby.try_acquire()
+        # The skipped check left its answer queued, the next one gets it.
+        bot_job.run()
+        assert len(bot_job.sent) == 1
+        standby.release()
+        active.release()
+
+
+def command(chat_id) -> SimpleNamespace:
+    return SimpleNamespace(message=SimpleNamespace(chat_id=chat_id))
+
+
+class Replica:
+    """Bot process state: started chats, check jobs and the job queue."""
+
+    def __init__(self, monkeypatch, path: str) -> None:
+        self.store = SubscriptionStore(path, table='started_chats')
+        self.jobs = JobRegistry()
+        self.context = FakeContext(None)
+        self.context.bot = RecordingBot()
+        monkeypatch.setattr(homework_bot, 'started_chats', self.store)
+        monkeypatch.setattr(homework_bot, 'polling_jobs', self.jobs)
+
+    @property
+    def checked_chats(self) -> list:
+        return [job.context for job in self.context.job_queue.jobs
+                if job.callback is homework_bot.check_homeworks
+                and self.jobs.is_current(job.context, job)]
+
+
+class TestResumeChecks:
+
+    def test_standby_resumes_started_chats(self, monkeypatch, tmp_path,
+                                           clock):
+        path = str(tmp_path / 'state.sqlite3')
+        active = LeaderLease(path, holder='active', clock=clock).open()
+        standby = LeaderLease(path, holder='standby', clock=clock).open()
+        assert active.try_acquire()
+        first = Replica(monkeypatch, path)
+        first.store.open()
+        homework_bot.start(command(42), first.context)
+        assert first.checked_chats == [42]
+
+        # The active replica dies without a shutdown.
+        clock.now += active.ttl
+        assert standby.wait(threading.Event())
+        second = Replica(monkeypatch, path)
+        assert homework_bot.resume_checks(second.context.job_queue) == 1
+        assert second.checked_chats == [42]
+        for replica in (first, second):
+            replica.store.close()
+        standby.release()
+        active.release()
+
+
+    def test_restart_resumes_started_chats(self, monkeypatch, tmp_path):
+        path = str(tmp_path / 'state.sqlite3')
+        replica = Replica(monkeypatch, path)
+        replica.store.open()
+        for chat_id in (1, 2):
+            homework_bot.start(command(chat_id), replica.context)
+        homework_bot.stop(command(2), replica.context)
+        homework_bot.close_stores()
+
+        replica = Replica(monkeypatch, path)
+        assert homework_bot.resume_checks(replica.context.job_queue) == 1
+        assert replica.checked_chats == [1]
+        replica.store.close()
+
+
+@pytest.mark.parametrize('workers, valid', [(0, False), (2, True)])
+def test_practicum_token_required_without_shards(monkeypatch, workers,
+                                                 valid):
+    monkeypatch.setattr(homework_bot, 'PRACTICUM_TOKEN', None)
+    monkeypatch.setattr(homework_bot, 'TELEGRAM_TOKEN', '1234:abcdefg')
+    monkeypatch.setattr(homework_bot, 'TELEGRAM_CHAT_ID', 12345)
+    monkeypatch.setattr(homework_bot, 'BOT_MODE', 'polling')
+    monkeypatch.setattr(homework_bot, 'WORKER_PROCESSES', workers)
+    assert homework_bot.check_tokens() is valid
+
+
+def free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+@pytest.fixture
+def webhook_mode(monkeypatch):
+    monkeypatch.setattr(homework_bot, 'BOT_MODE', 'webhook')
+    monkeypatch.setattr(homework_bot, 'WEBHOOK_URL', 'https://bot.example')
+    monkeypatch.setattr(homework_bot, 'WEBHOOK_LISTEN', '127.0.0.1')
+    monkeypatch.setattr(homework_bot, 'WEBHOOK_PORT', free_port())
+    monkeypatch.setattr(homework_bot, 'WEBHOOK_PATH',
+                        secrets.token_urlsafe(32))
+    # Telegram is not asked to set the webhook.
+    monkeypatch.setattr(Updater, '_bootstrap', lambda self, **kwargs: None)
+
+
+class TestWebhook:
+
+    @pytest.mark.parametrize('path', [None, '', 'telegram', '/short/'])
+    def test_guessable_path_refused(self, webhook_mode, monkeypatch, path):
+        monkeypatch.setattr(homework_bot, 'WEBHOOK_PATH', path)
+        assert not homework_bot.check_tokens()
+        with pytest.raises(ValueError):
+            homework_bot.start_receiving(None)
+
+    def test_updates_routed_by_secret_path(self, webhook_mode):
+        updater = Updater('123456:' + 'A' * 35, use_context=True)
+        updater.bot._bot = User(123456, 'bot', is_bot=True, username='bot')
+        received = threading.Event()
+        updater.dispatcher.add_handler(
+            TypeHandler(Update, lambda update, context: received.set()))
+        homework_bot.start_receiving(updater)
+        base = f'http://127.0.0.1:{homework_bot.WEBHOOK_PORT}/'
+        update = {'update_id': 1, 'message': {
+            'message_id': 1, 'date': 0, 'text': '/start',
+            'chat': {'id': 1, 'type': 'private'}}}
+        try:
+            guessed = requests.post(base + 'telegram', json=update, timeout=5)
+            assert guessed.status_code == HTTPStatus.NOT_FOUND
+            assert not received.wait(0.2)
+            answer = requests.post(base + homework_bot.WEBHOOK_PATH,
+                                   json=update, timeout=5)
+            assert answer.status_code == HTTPStatus.OK
+            assert received.wait(5)
+        finally:
+            updater.stop()
+
+
+class RecordingBot:
+
+    def __init__(self) -> None:
+        self.sent = []
+        self.changed = threading.Condition()
+
+    def send_message(self, chat_id, text, **kwargs):
+        with self.changed:
+            self.sent.append((chat_id, text))
+            self.changed.notify_all()
+
+    def wait_for(self, count: int) -> bool:
+        with self.changed:
+            return self.changed.wait_for(lambda: len(self.sent) >= count, 5)
+
+
+class TestNotifyMany:
+
+    MESSAGES = [(1, 'first', '1:hw:approved'), (2, 'second', '2:hw:approved')]
+
+    def test_direct_send_without_outbox_and_queue(self, monkeypatch,
+                                                  tmp_path):
+        monkeypatch.setattr(homework_bot, 'outbox',
+                            Outbox(str(tmp_path / 'outbox.sqlite3')))
+        monkeypatch.setattr(homework_bot, 'message_queue',
+                            OutgoingMessageQueue())
+        bot = RecordingBot()
+        homework_bot.notify_many(bot, self.MESSAGES)
+        assert bot.sent == [(1, 'first'), (2, 'second')]
+
+    def test_direct_send_when_outbox_hangs(self, monkeypatch, tmp_path):
+        outbox = Outbox(str(tmp_path / 'outbox.sqlite3')).open()
+        monkeypatch.setattr(homework_bot, 'outbox', outbox)
+        monkeypatch.setattr(homework_bot, 'message_queue',
+                            OutgoingMessageQueue())
+        monkeypatch.setattr(homework_bot, 'OUTBOX_PUT_TIMEOUT', 0.1)
+        bot = RecordingBot()
+        outbox.start(lambda chat_id, text, key: True)
+        with outbox._db_lock:
+            homework_bot.notify_many(bot, self.MESSAGES)
+        outbox.close()
+        assert bot.sent == [(1, 'first'), (2, 'second')]
+
+    def test_outbox_relays_through_queue(self, monkeypatch, tmp_path):
+        outbox = Outbox(str(tmp_path / 'outbox.sqlite3')).open()
+        sender = OutgoingMessageQueue(workers=2, global_rate=1000,
+                                      chat_rate=1000)
+        monkeypatch.setattr(homework_bot, 'outbox', outbox)
+        monkeypatch.setattr(homework_bot, 'message_queue', sender)
+        bot = RecordingBot()
+        sender.start(bot)
+        homework_bot.start_outbox()
+        homework_bot.notify_many(bot, self.MESSAGES)
+        homework_bot.notify_many(bot, self.MESSAGES)
+        assert bot.wait_for(2)
+        sender.stop(5)
+        outbox.close()
+        assert sorted(bot.sent) == [(1, 'first'), (2, 'second')]
+        outbox = Outbox(outbox.path).open()
+        states = dict(outbox.connection.execute(
+            'SELECT key, state FROM outbox'))
+        outbox.close()
+        assert states == {key: DELIVERED for _, _, key in self.MESSAGES}
@@ -0,0 +1,150 @@
+import heapq
+from types import SimpleNamespace
+
+import pytest
+
+import homework_bot
+from job_registry import JobRegistry
+
+
+class FakeJob:
+    def __init__(self, callback, when, context):
+        self.callback = callback
+        self.when = when
+        self.context = context
+        self.removed = False
+
+    def schedule_removal(self):
+        self.removed = True
+
+
+class FakeJobQueue:
+    """Runs run_once jobs on a simulated clock."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.jobs = []
+        self.sequence = 0
+
+    def run_once(self, callback, when, context=None):
+        job = FakeJob(callback, self.now + when, context)
+        self.sequence += 1
+        heapq.heappush(self.jobs, (job.when, self.sequence, job))
+        return job
+
+    def run_until(self, deadline, bot):
+        while self.jobs and self.jobs[0][0] <= deadline:
+            when, _, job = heapq.heappop(self.jobs)
+            self.now = when
+            if not job.removed:
+                job.callback(SimpleNamespace(job=job, job_queue=self,
+                                             bot=bot))
+        self.now = deadline
+
+
+class FakeBot:
+    def __init__(self):
+        self.messages = []
+
+    def send_message(self, chat_id, text):
+        self.messages.append((chat_id, text))
+
+
+def command(chat_id, job_queue, bot):
+    update = SimpleNamespace(message=SimpleNamespace(chat_id=chat_id))
+    context = SimpleNamespace(job_queue=job_queue, bot=bot, args=[])
+    return update, context
+
+
+@pytest.fixture
+def polling(monkeypatch):
+    calls = []
+
+    def get_api_answer(timestamp):
+        calls.append(timestamp)
+        return {'homeworks': [], 'current_date': timestamp + 1}
+
+    monkeypatch.setattr(homework_bot, 'get_api_answer', get_api_answer)
+    monkeypatch.setattr(homework_bot, 'polling_jobs', JobRegistry())
+    monkeypatch.setattr(homework_bot.poll_scheduler, 'jitter', 0)
+    monkeypatch.setattr(homework_bot.cursor_store, 'set',
+                        lambda *args: None)
+    yield calls, FakeJobQueue(), FakeBot()
+    homework_bot.poll_scheduler.states.clear()
+
+
+class TestJobRegistry:
+
+    def test_add_is_idempotent(self):
+        registry = JobRegistry()
+        first, second = FakeJob(None, 0, 1), FakeJob(None, 0, 1)
+        assert registry.add(1, first)
+        assert not registry.add(1, second)
+        assert registry.get(1) is first
+
+    def test_replace_only_current_job(self):
+        registry = JobRegistry()
+        first, second, stale = (FakeJob(None, 0, 1) for _ in range(3))
+        registry.add(1, first)
+        assert registry.replace(1, first, second)
+        assert not registry.replace(1, stale, FakeJob(None, 0, 1))
+        assert registry.is_current(1, second)
+
+    def test_remove_cancels_job(self):
+        registry = JobRegistry()
+        job = FakeJob(None, 0, 1)
+        registry.add(1, job)
+        assert registry.remove(1) is job
+        assert job.removed
+        assert 1 not in registry
+        assert registry.remove(1) is None
+
+    def test_many_chats(self):
+        registry = JobRegistry()
+        for chat_id in range(100000):
+            registry.add(chat_id, FakeJob(None, 0, chat_id))
+        assert len(registry) == 100000
+        assert 99999 in registry
+
+
+class TestStartStop:
+
+    @pytest.mark.parametrize('starts', [2, 10, 100])
+    def test_repeated_start_keeps_api_call_rate(self, polling, starts):
+        calls, _, bot = polling
+
+        def api_calls(starts_count):
+            job_queue = FakeJobQueue()
+            homework_bot.polling_jobs = JobRegistry()
+            homework_bot.poll_scheduler.states.clear()
+            calls.clear()
+            for second in range(starts_count):
+                job_queue.run_until(second, bot)
+                homework_bot.start(*command(1, job_queue, bot))
+            job_queue.run_until(6 * 3600, bot)
+            return len(calls)
+
+        single_start_calls = api_calls(1)
+        assert single_start_calls > 1
+        assert api_calls(starts) == single_start_calls
+        assert len(homework_bot.polling_jobs) == 1
+
+    def test_stop_removes_only_own_job(self, polling):
+        calls, job_queue, bot = polling
+        homework_bot.start(*command(1, job_queue, bot))
+        homework_bot.start(*command(2, job_queue, bot))
+        job_queue.run_until(0, bot)
+        homework_bot.stop(*command(1, job_queue, bot))
+        calls.clear()
+        job_queue.run_until(3600, bot)
+        assert 1 not in homework_bot.polling_jobs
+        assert 2 in homework_bot.polling_jobs
+        assert calls
+
+    def test_start_after_stop(self, polling):
+        calls, job_queue, bot = polling
+        homework_bot.start(*command(1, job_queue, bot))
+        homework_bot.stop(*command(1, job_queue, bot))
+        homework_bot.start(*command(1, job_queue, bot))
+        job_queue.run_until(0, bot)
+        assert len(calls) == 1
@@ -0,0 +1,65 @@
+import threading
+
+import pytest
+
+from leader import LeaderLease
+
+
+@pytest.fixture
+def replicas(tmp_path, clock):
+    path = str(tmp_path / 'state.sqlite3')
+    leases = [LeaderLease(path, ttl=30, holder=holder, clock=clock).open()
+              for holder in ('first', 'second')]
+    yield leases
+    for lease in leases:
+        lease.release()
+
+
+class TestLeaderLease:
+
+    def test_one_leader(self, replicas):
+        first, second = replicas
+        assert first.try_acquire()
+        assert not second.try_acquire()
+        assert first.is_leader
+        assert not second.is_leader
+
+    def test_renewal_keeps_lease(self, replicas, clock):
+        first, second = replicas
+        assert first.try_acquire()
+        clock.now += 20
+        assert first.try_acquire()
+        clock.now += 20
+        assert first.is_leader
+        assert not second.try_acquire()
+
+    def test_takeover_after_expiry(self, replicas, clock):
+        first, second = replicas
+        assert first.try_acquire()
+        clock.now += 29
+        assert not second.try_acquire()
+        clock.now += 1
+        assert not first.is_leader
+        assert second.try_acquire()
+        assert second.is_leader
+        assert not first.try_acquire()
+
+    def test_release_hands_over(self, replicas):
+        first, second = replicas
+        assert first.try_acquire()
+        first.release()
+        assert second.try_acquire()
+
+    def test_wait(self, replicas):
+        first, second = replicas
+        assert first.wait(threading.Event())
+        stopped = threading.Event()
+        stopped.set()
+        assert not second.wait(stopped)
+
+    def test_disabled(self, tmp_path):
+        lease = LeaderLease(str(tmp_path / 'state.sqlite3'), ttl=0)
+        assert lease.is_leader
+        assert lease.wait(threading.Event())
+        lease.release()
+        assert lease.is_leader
@@ -0,0 +1,68 @@
+import gzip
+import logging
+
+import pytest
+
+from log_sink import AsyncRotatingFileHandler
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    return str(tmp_path / 'logs' / 'bot.log')
+
+
+def make_logger(handler):
+    logger = logging.getLogger(f'test_log_sink.{id(handler)}')
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addHandler(handler)
+    return logger
+
+
+class TestAsyncRotatingFileHandler:
+
+    def test_lines_written_on_close(self, log_file):
+        handler = AsyncRotatingFileHandler(log_file, flush_interval=60)
+        logger = make_logger(handler)
+        for number in range(100):
+            logger.info('line %d', number)
+        handler.close()
+        with open(log_file, encoding='utf-8') as file:
+            assert file.read().splitlines() == [f'line {number}'
+                                                for number in range(100)]
+
+    def test_restart_appends(self, log_file):
+        for number in range(2):
+            handler = AsyncRotatingFileHandler(log_file)
+            make_logger(handler).info('run %d', number)
+            handler.close()
+        with open(log_file, encoding='utf-8') as file:
+            assert file.read() == 'run 0\nrun 1\n'
+
+    def test_rotates_by_size_with_gzip(self, log_file):
+        handler = AsyncRotatingFileHandler(log_file, max_bytes=100,
+                                           backup_count=2, compress=True)
+        logger = make_logger(handler)
+        for number in range(3):
+            logger.info('%d%s', number, 'x' * 150)
+            handler.flush()
+        handler.close()
+        with gzip.open(f'{log_file}.1.gz', 'rt') as segment:
+            assert segment.read().startswith('2x')
+        with gzip.open(f'{log_file}.2.gz', 'rt') as segment:
+            assert segment.read().startswith('1x')
+        with open(log_file, encoding='utf-8') as file:
+            assert file.read() == ''
+
+    def test_rotates_by_time(self, log_file):
+        handler = AsyncRotatingFileHandler(log_file)
+        logger = make_logger(handler)
+        logger.info('old')
+        handler.flush()
+        handler.rotate_at = 0
+        logger.info('new')
+        handler.close()
+        with open(f'{log_file}.1', encoding='utf-8') as segment:
+            assert segment.read() == 'old\n'
+        with open(log_file, encoding='utf-8') as file:
+            assert file.read() == 'new\n'
@@ -0,0 +1,188 @@
+import html
+import logging
+import queue
+import threading
+import time
+
+import pytest
+
+from loggers import (MAX_MESSAGE_LENGTH, DedupCache, LogSampler, Summary,
+                     TelegramBotLogger, fingerprint, summarize,
+                     truncate_escaped)
+from validators import validate_homework
+
+
+class FakeBot:
+
+    def __init__(self) -> None:
+        self.messages = []
+
+    def send_message(self, chat_id, text, parse_mode=None):
+        self.messages.append(text)
+
+
+def make_record(message: str, level: int = logging.ERROR):
+    return logging.LogRecord('homework_bot', level, __file__, 1, message,
+                             None, None)
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    return str(tmp_path / 'logger.log')
+
+
+@pytest.fixture
+def bot_logger(log_file):
+    handler = TelegramBotLogger(logging.ERROR, FakeBot(), 1,
+                                digest_window=0.05,
+                                repeats_flush_interval=3600,
+                                log_file=log_file)
+    yield handler
+    handler.close(5)
+
+
+class TestSummary:
+
+    def test_long_values_are_cut(self):
+        payload = {'homeworks': [{'reviewer_comment': 'x' * 1000}] * 50,
+                   'current_date': 1}
+        text = str(Summary(payload))
+        assert len(text) < 200
+        assert '... 50 items' in text
+        assert "'current_date': 1" in text
+
+    def test_limit(self):
+        text = str(Summary({str(key): key for key in range(1000)}, limit=50))
+        assert text.startswith("{'0': 0")
+        assert text.endswith('chars)')
+
+    def test_record(self):
+        record = validate_homework({'homework_name': 'hw.zip',
+                                    'status': 'approved'})
+        assert "'homework_name': 'hw.zip'" in summarize(record)
+
+    def test_small_values_unchanged(self):
+        assert summarize([]) == '[]'
+        assert summarize({'a': [1]}) == "{'a': [1]}"
+
+
+class TestLogSampler:
+
+    def test_first_and_every_nth(self):
+        sample = LogSampler(3)
+        assert [sample() for _ in range(7)] == [True, False, False,
+                                                True, False, False, True]
+
+    def test_every_one_passes_all(self):
+        sample = LogSampler(1)
+        assert all(sample() for _ in range(5))
+
+
+class TestFingerprint:
+
+    def test_variable_parts_are_masked(self):
+        first = fingerprint('Timeout after 5.2s at 2022-01-01T10:00:00Z, '
+                            'object 0x7f3a')
+        second = fingerprint('Timeout after 30s at 2023-05-06 11:12:13, '
+                             'object 0x10')
+        assert first == second == 'Timeout after <n>s at <ts>, object <hex>'
+
+
+class TestDedupCache:
+
+    def test_repeats_suppressed_within_ttl(self):
+        cache = DedupCache(ttl=60)
+        assert not cache.seen('API error 500', now=0)
+        assert cache.seen('API error 502', now=30)
+        assert cache.seen('API error 503', now=59)
+        assert not cache.seen('API error 500', now=60)
+        assert cache.pop_suppressed() == [('API error 500', 2)]
+        assert cache.pop_suppressed() == []
+
+    def test_least_recently_seen_evicted(self):
+        cache = DedupCache(ttl=60, maxsize=2)
+        cache.seen('first', now=0)
+        cache.seen('second', now=0)
+        cache.seen('first', now=1)
+        cache.seen('third', now=1)
+        assert list(cache.entries) == ['first', 'third']
+        assert not cache.seen('second', now=2)
+
+
+class TestTelegramBotLogger:
+
+    def test_records_sent_as_one_digest(self, bot_logger):
+        for number in ('one', 'two', 'three'):
+            bot_logger.emit(make_record(f'error {number}'))
+        bot_logger.close(5)
+        assert len(bot_logger.bot.messages) == 1
+        digest = bot_logger.bot.messages[0]
+        assert digest.startswith('<b>3 log messages</b>')
+        assert 'error two' in digest
+
+    def test_repeats_reported_on_close(self, bot_logger):
+        bot_logger.emit(make_record('API error 500'))
+        bot_logger.emit(make_record('API error 502'))
+        bot_logger.close(5)
+        messages = bot_logger.bot.messages
+        assert 'API error 500' in messages[0]
+        assert '1 repeats suppressed' in messages[-1]
+
+    def test_close_with_full_buffer_keeps_deadline(self, log_file):
+        bot = FakeBot()
+        sending = threading.Event()
+        bot.send_message = lambda **kwargs: sending.wait(5)
+        handler = TelegramBotLogger(logging.ERROR, bot, 1, digest_window=0,
+                                    buffer_size=2, log_file=log_file)
+        for number in ('one', 'two', 'three', 'four'):
+            handler.emit(make_record(f'error {number}'))
+        started = time.monotonic()
+        handler.close(0.2)
+        assert time.monotonic() - started < 1
+        sending.set()
+
+    def test_stop_marker_not_queued_again(self, bot_logger):
+        bot_logger.close(5)
+        first = make_record('error one')
+
+        class RacingQueue(queue.Queue):
+            """emit() fills the queue right after the marker is taken."""
+
+            def get(self, *args, **kwargs):
+                item = super().get(*args, **kwargs)
+                self.put_nowait(make_record('error two'))
+                return item
+
+        bot_logger.records = RacingQueue(1)
+        bot_logger.records.put_nowait(None)
+        assert bot_logger.collect_digest(first) == ([first], True)
+
+    def test_oversize_digest_keeps_header_and_notes(self, bot_logger):
+        bot_logger.dropped = 7
+        records = [make_record('<' * 3000), make_record('&' * 3000)]
+        digest = bot_logger.build_digest(
+            records, ['<i>2 repeats suppressed:</i> timeout'])
+        assert len(digest) <= MAX_MESSAGE_LENGTH
+        assert digest.startswith('<b>2 log messages</b>\n\n&lt;')
+        assert digest.endswith('<i>7 log messages dropped</i>')
+        assert '<i>2 repeats suppressed:</i> timeout' in digest
+        body = digest.split('\n\n')[1]
+        assert body.endswith('…')
+        assert html.escape(html.unescape(body)) == body
+
+    def test_oversize_notes_are_omitted(self, bot_logger):
+        repeats = [f'<i>1 repeats suppressed:</i> {"x" * 150} {number}'
+                   for number in range(100)]
+        digest = bot_logger.build_digest([make_record('error')], repeats)
+        assert len(digest) <= MAX_MESSAGE_LENGTH
+        assert digest.startswith('error')
+        assert digest.endswith('more notes omitted</i>')
+
+
+@pytest.mark.parametrize('text, limit, result', [
+    ('a<b', 10, 'a&lt;b'),
+    ('a<b', 5, 'a…'),
+    ('<<<', 9, '&lt;&lt;…'),
+])
+def test_truncate_escaped(text, limit, result):
+    assert truncate_escaped(text, limit) == result
@@ -0,0 +1,136 @@
+import threading
+import time
+
+import pytest
+from telegram.error import BadRequest, RetryAfter
+
+from message_queue import OutgoingMessageQueue, TokenBucket
+
+
+class BlockedBot:
+    """Bot whose sends wait until released."""
+
+    def __init__(self) -> None:
+        self.sending = threading.Event()
+        self.released = threading.Event()
+        self.sent = []
+
+    def send_message(self, chat_id, text):
+        self.sending.set()
+        self.released.wait(5)
+        self.sent.append((chat_id, text))
+
+
+class ScriptedBot:
+    """Bot raising the scripted errors of a text before sending it."""
+
+    def __init__(self, errors=None) -> None:
+        self.errors = errors or {}
+        self.sent = []
+
+    def send_message(self, chat_id, text):
+        errors = self.errors.get(text)
+        if errors:
+            raise errors.pop(0)
+        self.sent.append((chat_id, text))
+
+
+@pytest.fixture
+def sender():
+    messages = OutgoingMessageQueue(workers=2, global_rate=1000,
+                                    chat_rate=1000, chat_burst=1000)
+    yield messages
+    messages.stop(5)
+
+
+class TestTokenBucket:
+
+    def test_burst_then_rate(self):
+        bucket = TokenBucket(rate=2, capacity=3)
+        bucket.updated_at = 0
+        assert [bucket.reserve(0) for _ in range(3)] == [0, 0, 0]
+        assert bucket.reserve(0) == 0.5
+        assert bucket.reserve(0) == 1.0
+        assert bucket.reserve(10) == 0, 'Tokens must refill over time'
+
+    def test_is_full_after_refill(self):
+        bucket = TokenBucket(rate=2, capacity=3)
+        bucket.updated_at = 0
+        bucket.reserve(0)
+        bucket.reserve(0)
+        assert not bucket.is_full(0.5)
+        assert bucket.is_full(1)
+
+
+class TestOutgoingMessageQueue:
+
+    def test_idle_chat_buckets_are_dropped(self, monkeypatch):
+        sender = OutgoingMessageQueue(global_rate=1000, chat_rate=0.05,
+                                      bucket_sweep_interval=60)
+        now = sender.buckets_swept_at
+        monkeypatch.setattr(time, 'monotonic', lambda: now)
+        for chat_id in range(100):
+            sender._wait_for_slot(chat_id)
+        assert len(sender.chat_buckets) == 100
+        now += 30
+        sender._wait_for_slot('busy')
+        sender._wait_for_slot('busy')
+        assert len(sender.chat_buckets) == 101
+        now += 30
+        sender._wait_for_slot('new')
+        assert set(sender.chat_buckets) == {'busy', 'new'}
+
+    def test_put_before_start_is_refused(self, sender):
+        assert not sender.put(1, 'text')
+
+    def test_chat_order_kept(self, sender):
+        bot = ScriptedBot()
+        sender.start(bot)
+        for number in range(20):
+            sender.put(number % 3, f'text {number}')
+        sender.join()
+        for chat_id in range(3):
+            texts = [text for chat, text in bot.sent if chat == chat_id]
+            assert texts == [f'text {number}' for number in range(20)
+                             if number % 3 == chat_id]
+
+    def test_flood_control_pauses_and_retries(self, sender):
+        bot = ScriptedBot({'first': [RetryAfter(0.05)]})
+        delivered = []
+        sender.on_delivered = delivered.append
+        sender.start(bot)
+        started = time.monotonic()
+        sender.put(1, 'first', key='k1')
+        sender.join()
+        assert time.monotonic() - started >= 0.05
+        assert bot.sent == [(1, 'first')]
+        assert delivered == ['k1']
+        assert sender.stats()['retried'] == 1
+
+    def test_rejected_message_given_up(self, sender):
+        bot = ScriptedBot({'bad': [BadRequest('chat not found')]})
+        delivered, failed = [], []
+        sender.on_delivered = delivered.append
+        sender.on_failed = failed.append
+        sender.start(bot)
+        sender.put(1, 'bad', key='k1')
+        sender.put(1, 'good', key='k2')
+        sender.join()
+        assert failed == ['k1']
+        assert delivered == ['k2']
+        assert sender.stats()['failed'] == 1
+
+    def test_stop_with_full_queue_keeps_deadline(self):
+        messages = OutgoingMessageQueue(workers=1, maxsize=2,
+                                        global_rate=1000, chat_rate=1000)
+        bot = BlockedBot()
+        messages.start(bot)
+        messages.put(1, 'sending')
+        assert bot.sending.wait(5)
+        assert messages.put(1, 'queued')
+        assert messages.put(1, 'queued')
+        assert not messages.put(1, 'overflow')
+        started = time.monotonic()
+        assert not messages.stop(0.2)
+        assert time.monotonic() - started < 1
+        bot.released.set()
@@ -0,0 +1,67 @@
+import urllib.error
+import urllib.request
+
+import pytest
+
+from metrics import MetricsServer, Registry, _Metric
+
+
+@pytest.fixture
+def registry():
+    return Registry()
+
+
+class TestMetrics:
+
+    def test_counter_labels_cached(self, registry):
+        counter = registry.counter('sent_total', 'Messages sent.',
+                                   ('outcome',))
+        assert counter.labels('ok') is counter.labels('ok')
+        counter.labels('ok').inc()
+        counter.labels('ok').inc(2)
+        counter.labels('failed').inc()
+        assert registry.render() == (
+            '# HELP sent_total Messages sent.\n'
+            '# TYPE sent_total counter\n'
+            'sent_total{outcome="ok"} 3.0\n'
+            'sent_total{outcome="failed"} 1.0\n'
+        )
+
+    def test_histogram_buckets_are_cumulative(self, registry):
+        histogram = registry.histogram('poll_seconds', 'Poll duration.',
+                                       buckets=(1, 0.5))
+        for value in (0.25, 0.5, 0.75, 2):
+            histogram.observe(value)
+        assert histogram.render().splitlines()[2:] == [
+            'poll_seconds_bucket{le="0.5"} 2',
+            'poll_seconds_bucket{le="1"} 3',
+            'poll_seconds_bucket{le="+Inf"} 4',
+            'poll_seconds_sum 3.5',
+            'poll_seconds_count 4',
+        ]
+
+    def test_gauge_read_at_scrape(self, registry):
+        depth = [3]
+        registry.gauge('queue_depth', 'Queued messages.', lambda: depth[0])
+        depth[0] = 5
+        assert registry.render().endswith('queue_depth 5\n')
+
+    def test_metric_is_abstract(self):
+        with pytest.raises(TypeError):
+            _Metric('name', 'documentation')
+
+
+def test_metrics_server(registry):
+    registry.counter('polls_total', 'Polls made.').inc()
+    server = MetricsServer(0, registry=registry).start()
+    url = f'http://127.0.0.1:{server.server.server_address[1]}'
+    try:
+        with urllib.request.urlopen(url + '/metrics', timeout=5) as response:
+            assert response.status == 200
+            assert response.headers['Content-Type'].startswith('text/plain')
+            assert b'polls_total 1.0' in response.read()
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(url + '/other', timeout=5)
+        assert error.value.code == 404
+    finally:
+        server.stop()
@@ -0,0 +1,191 @@
+import threading
+
+import pytest
+from telegram.error import BadRequest
+
+from message_queue import OutgoingMessageQueue
+from outbox import DELIVERED, FAILED, PENDING, Outbox
+
+
+class Sender:
+    def __init__(self, accept=True, forward=None):
+        self.accept = accept
+        self.forward = forward
+        self.sent = []
+        self.handed = threading.Condition()
+
+    def __call__(self, chat_id, text, key):
+        with self.handed:
+            self.sent.append(key)
+            self.handed.notify_all()
+        if self.forward is not None:
+            return self.forward(chat_id, text, key)
+        return self.accept
+
+    def wait_for(self, count):
+        with self.handed:
+            assert self.handed.wait_for(lambda: len(self.sent) >= count, 5)
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'outbox.sqlite3')
+
+
+class RejectingBot:
+
+    def send_message(self, chat_id, text):
+        raise BadRequest('Chat not found')
+
+
+class SlowBot:
+    """Bot whose sends block until released."""
+
+    def __init__(self):
+        self.released = threading.Event()
+        self.sent = []
+
+    def send_message(self, chat_id, text):
+        self.released.wait(5)
+        self.sent.append(text)
+
+
+def make_outbox(path, clock, sender, relay_interval=0.01):
+    outbox = Outbox(path, retry_backoff=10, max_attempts=3,
+                    relay_interval=relay_interval, clock=clock).open()
+    outbox.start(sender)
+    return outbox
+
+
+def states(path):
+    outbox = Outbox(path).open()
+    rows = dict(outbox.connection.execute('SELECT key, state FROM outbox'))
+    outbox.close()
+    return rows
+
+
+class TestOutbox:
+
+    def test_committed_messages_are_handed_over(self, path, clock):
+        sender = Sender()
+        outbox = make_outbox(path, clock, sender)
+        assert outbox.put_many([(1, 'a', 'k1'), (2, 'b', 'k2')])
+        sender.wait_for(2)
+        outbox.delivered('k1')
+        outbox.close()
+        assert sender.sent == ['k1', 'k2']
+        assert states(path) == {'k1': DELIVERED, 'k2': PENDING}
+
+    def test_duplicate_keys_are_ignored(self, path, clock):
+        sender = Sender()
+        outbox = make_outbox(path, clock, sender)
+        outbox.put(1, 'a', 'k1')
+        outbox.put(1, 'a again', 'k1')
+        outbox.close()
+        assert sender.sent == ['k1']
+
+    def test_restart_does_not_resend_delivered(self, path, clock):
+        sender = Sender()
+        outbox = make_outbox(path, clock, sender)
+        outbox.put_many([(1, 'a', 'k1'), (1, 'b', 'k2')])
+        sender.wait_for(2)
+        outbox.delivered('k1')
+        outbox.close()
+
+        clock.now += 60
+        sender = Sender()
+        outbox = make_outbox(path, clock, sender)
+        sender.wait_for(1)
+        outbox.put(1, 'a', 'k1')
+        outbox.close()
+        assert sender.sent == ['k2']
+
+    def test_not_taken_retried_then_given_up(self, path, clock):
+        sender = Sender(accept=False)
+        outbox = make_outbox(path, clock, sender)
+        outbox.put(1, 'a', 'k1')
+        for attempt, backoff in ((2, 10), (3, 20)):
+            clock.now += backoff
+            sender.wait_for(attempt)
+        clock.now += 40
+        outbox.relay()
+        outbox.close()
+        assert sender.sent == ['k1'] * 3
+        assert states(path) == {'k1': FAILED}
+
+    def test_queued_messages_are_not_handed_over_again(self, path, clock):
+        queue = OutgoingMessageQueue(workers=1, global_rate=1000,
+                                     chat_rate=1000)
+        bot = SlowBot()
+        queue.start(bot)
+        sender = Sender(forward=queue.put)
+        outbox = make_outbox(path, clock, sender, relay_interval=3600)
+        queue.on_delivered = outbox.delivered
+        queue.on_failed = outbox.failed
+        queue.on_released = outbox.released
+        outbox.put_many([(1, 'a', 'k1'), (1, 'b', 'k2')])
+        sender.wait_for(2)
+        clock.now += 100
+        assert outbox.relay() == 0
+        bot.released.set()
+        queue.stop(5)
+        outbox.close()
+        assert bot.sent == ['a', 'b']
+        assert states(path) == {'k1': DELIVERED, 'k2': DELIVERED}
+
+    def test_released_messages_are_handed_over_again(self, path, clock):
+        sender = Sender()
+        outbox = make_outbox(path, clock, sender, relay_interval=3600)
+        outbox.put(1, 'a', 'k1')
+        sender.wait_for(1)
+        clock.now += 100
+        assert outbox.relay() == 0
+        outbox.released('k1')
+        clock.now += 100
+        assert outbox.relay() == 1
+        outbox.close()
+        assert sender.sent == ['k1', 'k1']
+
+    def test_rejected_messages_are_not_sent_again(self, path, clock):
+        queue = OutgoingMessageQueue(workers=1, global_rate=1000,
+                                     chat_rate=1000)
+        queue.start(RejectingBot())
+        sender = Sender(forward=queue.put)
+        outbox = make_outbox(path, clock, sender, relay_interval=3600)
+        queue.on_failed = outbox.failed
+        queue.on_released = outbox.released
+        outbox.put(1, 'a', 'k1')
+        sender.wait_for(1)
+        queue.stop(5)
+        outbox.close()
+
+        clock.now += 100
+        outbox = make_outbox(path, clock, sender, relay_interval=3600)
+        assert outbox.relay() == 0
+        outbox.close()
+        assert sender.sent == ['k1']
+        assert states(path) == {'k1': FAILED}
+
+    def test_uncommitted_messages_are_withdrawn(self, path, clock):
+        sender = Sender()
+        outbox = make_outbox(path, clock, sender, relay_interval=3600)
+        with outbox._db_lock:
+            # The first commit hangs, the second batch waits behind it.
+            assert not outbox.put(1, 'a', 'k1', timeout=0.1)
+            assert not outbox.put(1, 'b', 'k2', timeout=0.1)
+        outbox.close()
+        assert sender.sent == ['k1']
+        assert states(path) == {'k1': PENDING}
+
+    def test_concurrent_writers_share_commits(self, path, clock):
+        outbox = make_outbox(path, clock, Sender())
+        writers = [threading.Thread(target=outbox.put,
+                                    args=(number, 'text', f'k{number}'))
+                   for number in range(200)]
+        for writer in writers:
+            writer.start()
+        for writer in writers:
+            writer.join()
+        outbox.close()
+        assert len(states(path)) == 200
+        assert outbox.committed < 200
@@ -0,0 +1,143 @@
+import threading
+import time
+
+import pytest
+
+from circuit_breaker import CircuitBreaker
+from exceptions import APIRequestProcessingError
+from polling_engine import PollingEngine, Tenant
+from retry_policy import RetryPolicy
+from scheduler import AdaptivePollScheduler
+from storage import HomeworkStateIndex
+from timing_wheel import TimingWheel
+from validators import validate_homework
+
+VERDICTS = {'approved': 'approved', 'rejected': 'rejected'}
+
+
+def check_response(response: dict) -> list:
+    return [validate_homework(homework) for homework in response['homeworks']]
+
+
+def parse_status(homework) -> str:
+    return f'{homework["homework_name"]}: {VERDICTS[homework["status"]]}'
+
+
+def homework(name, status):
+    return {'homework_name': name, 'status': status,
+            'date_updated': '2022-01-01T00:00:00Z'}
+
+
+class FakeClient:
+    """API client answering every tenant from answers[token]."""
+
+    def __init__(self, answers=None, latency: float = 0) -> None:
+        self.answers = answers or {}
+        self.latency = latency
+        self.breaker = None
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def get_homework_statuses(self, from_date, headers):
+        token = headers['Authorization'].split()[-1]
+        with self._lock:
+            self.calls.append((token, from_date))
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.latency)
+            answer = self.answers.get(token, [])
+            if isinstance(answer, Exception):
+                raise answer
+            return {'homeworks': answer, 'current_date': from_date + 100}
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+class Notifications(list):
+
+    def __call__(self, chat_id, text, key):
+        self.append((chat_id, text))
+
+
+@pytest.fixture
+def notifications():
+    return Notifications()
+
+
+def make_engine(client, notify, **kwargs) -> PollingEngine:
+    return PollingEngine(client, check_response, parse_status, notify,
+                         **kwargs)
+
+
+class TestPollingEngine:
+
+    def test_requests_in_flight_are_bounded(self, notifications):
+        client = FakeClient(latency=0.02)
+        engine = make_engine(client, notifications, max_in_flight=5)
+        tenants = [Tenant(f'token-{number}', number, from_date=1)
+                   for number in range(30)]
+        assert engine.run_once(tenants) == [0] * 30
+        engine.close()
+        assert len(client.calls) == 30
+        assert client.max_in_flight <= 5
+
+    def test_only_transitions_are_notified(self, notifications, tmp_path):
+        client = FakeClient({'token': [homework('hw1', 'approved')]})
+        state_index = HomeworkStateIndex(str(tmp_path / 'state.sqlite3'))
+        cursors = []
+        engine = make_engine(client, notifications, state_index=state_index,
+                             on_cursor=lambda tenant: cursors.append(
+                                 tenant.from_date))
+        tenant = Tenant('token', 1, from_date=1)
+        assert engine.run_once([tenant]) == [1]
+        assert engine.run_once([tenant]) == [0]
+        engine.close()
+        assert notifications == [(1, 'hw1: approved')]
+        assert cursors == [101, 201]
+
+    def test_failed_batch_records_no_state(self, notifications, tmp_path):
+        client = FakeClient({'token': [homework('hw1', 'approved'),
+                                       homework('hw2', 'reviewing')]})
+        state_index = HomeworkStateIndex(str(tmp_path / 'state.sqlite3'))
+        engine = make_engine(client, notifications, state_index=state_index)
+        tenant = Tenant('token', 1, from_date=1)
+        assert engine.run_once([tenant]) == [0]
+        engine.close()
+        assert not notifications
+        assert state_index.get(1, 'hw1') is None
+        assert tenant.from_date == 1, 'Cursor must not pass a failed batch'
+
+    def test_failed_poll_retried_by_policy(self, notifications, clock):
+        client = FakeClient({'token': APIRequestProcessingError('refused')})
+        wheel = TimingWheel(1, clock=clock)
+        scheduler = AdaptivePollScheduler(600, 60, 3600, jitter=0)
+        engine = make_engine(client, notifications, wheel=wheel,
+                             scheduler=scheduler,
+                             retry_policy=RetryPolicy())
+        engine.add([Tenant('token', 1, from_date=1)])
+        clock.now = 1
+        assert engine.run_due() == [0]
+        clock.now = 5
+        assert not wheel.advance()
+        clock.now = 6
+        assert engine.run_due() == [0]
+        engine.close()
+        assert len(client.calls) == 2
+
+    def test_open_breaker_postpones_all_tenants(self, notifications, clock):
+        client = FakeClient()
+        client.breaker = CircuitBreaker(failure_threshold=1, jitter=0,
+                                        clock=clock)
+        client.breaker.record_failure()
+        wheel = TimingWheel(1, clock=clock)
+        engine = make_engine(client, notifications, wheel=wheel)
+        tenants = [Tenant('token', number, from_date=1)
+                   for number in range(3)]
+        assert engine.run_once(tenants) == []
+        engine.close()
+        assert not client.calls
+        assert len(wheel) == 3
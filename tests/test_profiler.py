@@ -0,0 +1,91 @@
+import os
+import threading
+import types
+
+from profiler import Profiler
+
+
+class Service:
+
+    def handle(self, value):
+        return value * 2
+
+
+def make_module():
+    module = types.SimpleNamespace()
+
+    def work(value):
+        return module.step(value) + [value]
+
+    def step(value):
+        return [value] * 1000
+
+    module.work = work
+    module.step = step
+    return module
+
+
+class TestProfiler:
+
+    def test_targets_untouched_while_off(self, tmp_path):
+        module = make_module()
+        work, handle = module.work, Service.handle
+        profiler = Profiler([(module, 'work'), (Service, 'handle')],
+                            directory=str(tmp_path))
+        assert module.work is work
+        assert Service.handle is handle
+        profiler.start()
+        assert module.work is not work
+        assert Service.handle is not handle
+        profiler.stop()
+        assert module.work is work
+        assert Service.handle is handle
+
+    def test_stage_timing(self, tmp_path):
+        module = make_module()
+        profiler = Profiler([(module, 'work'), (module, 'step'),
+                             (Service, 'handle')],
+                            directory=str(tmp_path))
+        profiler.start()
+        for _ in range(3):
+            assert len(module.work(1)) == 1001
+        assert Service().handle(2) == 4
+        report = profiler.stage_report()
+        profiler.stop()
+        stages = {line.split(':')[0]: line for line in report}
+        assert set(stages) == {'make_module.<locals>.work',
+                               'make_module.<locals>.step',
+                               'Service.handle'}
+        assert '3 calls' in stages['make_module.<locals>.work']
+        assert '1 calls' in stages['Service.handle']
+
+    def test_report_written(self, tmp_path):
+        module = make_module()
+        profiler = Profiler([(module, 'work'), (module, 'step')],
+                            directory=str(tmp_path), top=5)
+        assert profiler.stop() is None
+        assert profiler.start()
+        assert not profiler.start()
+        module.work(1)
+        path = profiler.stop()
+        assert not profiler.running
+        text = open(path, encoding='utf-8').read()
+        assert 'Stage timing:' in text
+        assert 'cProfile, top 5 by cumulative time:' in text
+        assert 'step' in text
+        assert 'tracemalloc, top 5 allocation sites:' in text
+        assert os.path.exists(path[:-len('.txt')] + '.prof')
+
+    def test_calls_in_other_threads(self, tmp_path):
+        module = make_module()
+        profiler = Profiler([(module, 'work')], directory=str(tmp_path))
+        profiler.start()
+        threads = [threading.Thread(target=module.work, args=(1,))
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        report = profiler.stage_report()
+        assert profiler.stop()
+        assert '4 calls' in report[0]
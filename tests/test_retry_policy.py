@@ -0,0 +1,81 @@
+import pytest
+
+from exceptions import (APIError, APIRequestProcessingError,
+                        BadAPIHttpResponseCode, BadAPIResponseFormat)
+from retry_policy import (AUTH, PERMANENT, RATE_LIMITED, TRANSIENT,
+                          RetryPolicy, RetryRule, classify)
+
+
+def http_error(status_code, retry_after=None):
+    return BadAPIHttpResponseCode(f'code {status_code}', status_code,
+                                  retry_after)
+
+
+@pytest.mark.parametrize('error, kind', [
+    (APIRequestProcessingError('timeout'), TRANSIENT),
+    (http_error(500), TRANSIENT),
+    (http_error(503), TRANSIENT),
+    (http_error(408), TRANSIENT),
+    (http_error(429), RATE_LIMITED),
+    (http_error(401), AUTH),
+    (http_error(403), AUTH),
+    (http_error(400), PERMANENT),
+    (http_error(None), PERMANENT),
+    (APIError('wrong from_date'), PERMANENT),
+    (BadAPIResponseFormat('not json'), PERMANENT),
+    (KeyError('homeworks'), PERMANENT),
+])
+def test_classify(error, kind):
+    assert classify(error) == kind
+
+
+class TestRetryPolicy:
+
+    def test_transient_fast_retries_then_regular_interval(self):
+        policy = RetryPolicy({TRANSIENT: RetryRule(5, 15, budget=3,
+                                                   park=None)})
+        delays = [policy.on_failure('chat', APIRequestProcessingError())
+                  .delay for _ in range(4)]
+        assert delays == [5, 10, 15, None]
+
+    def test_auth_parked(self):
+        policy = RetryPolicy()
+        retries = [policy.on_failure('chat', http_error(401))
+                   for _ in range(4)]
+        assert [retry.delay for retry in retries] == [
+            3600, 7200, 14400, 24 * 3600]
+        assert [retry.parked for retry in retries] == [
+            False, False, False, True]
+
+    def test_success_resets_budget(self):
+        policy = RetryPolicy()
+        policy.on_failure('chat', APIRequestProcessingError())
+        policy.on_failure('chat', APIRequestProcessingError())
+        policy.on_success('chat')
+        retry = policy.on_failure('chat', APIRequestProcessingError())
+        assert retry.attempt == 1
+        assert retry.delay == 5
+
+    def test_other_class_starts_anew(self):
+        policy = RetryPolicy()
+        policy.on_failure('chat', APIRequestProcessingError())
+        retry = policy.on_failure('chat', http_error(401))
+        assert (retry.kind, retry.attempt) == (AUTH, 1)
+        assert policy.stats()[AUTH] == 1
+
+    def test_keys_are_independent(self):
+        policy = RetryPolicy()
+        policy.on_failure('first', APIRequestProcessingError())
+        assert policy.on_failure('second',
+                                 APIRequestProcessingError()).attempt == 1
+
+    def test_rate_limit_honours_retry_after(self):
+        policy = RetryPolicy()
+        assert policy.on_failure('chat', http_error(429)).delay == 60
+        assert policy.on_failure('chat', http_error(429, 500)).delay == 500
+
+    def test_permanent_keeps_regular_interval(self):
+        policy = RetryPolicy()
+        delays = [policy.on_failure('chat', APIError('error')).delay
+                  for _ in range(4)]
+        assert delays == [None, None, None, 3600]
@@ -0,0 +1,70 @@
+from scheduler import AdaptivePollScheduler
+
+NOON = 1668686400  # 2022-11-17 12:00 UTC
+
+
+def make_scheduler(**kwargs):
+    params = dict(base_interval=600, min_interval=60, max_interval=3600,
+                  jitter=0, night_hours=(0, 0), clock=lambda: NOON)
+    params.update(kwargs)
+    return AdaptivePollScheduler(**params)
+
+
+class TestAdaptivePollScheduler:
+
+    def test_change_polls_at_min_interval(self):
+        scheduler = make_scheduler()
+        assert scheduler.schedule('chat', ['reviewing']) == 60, (
+            'Right after a status change the tenant must be polled '
+            'at min_interval'
+        )
+
+    def test_idle_polls_back_off_within_bounds(self):
+        scheduler = make_scheduler()
+        scheduler.schedule('chat', ['reviewing'])
+        intervals = [scheduler.schedule('chat', []) for _ in range(20)]
+        assert intervals == sorted(intervals), (
+            'Interval must grow while nothing changes'
+        )
+        assert intervals[-1] == 3600, 'Interval must be capped by max'
+
+    def test_frequent_changes_limit_backoff(self):
+        scheduler = make_scheduler()
+        for minutes in (0, 10, 20):
+            scheduler.schedule('chat', ['reviewing'], now=NOON + minutes * 60)
+        interval = scheduler.schedule('chat', [], now=NOON + 1500)
+        assert interval == 0.5 * 1500 / 3, (
+            'Idle interval must follow the recent rate of changes'
+        )
+        assert make_scheduler().schedule('other', []) > interval
+
+    def test_failed_poll_uses_base_interval(self):
+        scheduler = make_scheduler()
+        assert scheduler.schedule('chat', None) == 600
+
+    def test_caller_interval_is_the_due_time(self):
+        scheduler = make_scheduler()
+        assert scheduler.schedule('retry', None, override=5) == 5
+        assert scheduler.lag('retry', now=NOON + 5) == 0
+        assert scheduler.lag('retry', now=NOON + 7) == 2
+        assert scheduler.schedule('parked', None, override=3600) == 3600
+        assert scheduler.lag('parked', now=NOON + 3600) == 0
+        assert scheduler.schedule('outage', [], at_least=1800) == 1800
+        assert not scheduler.is_due('outage', now=NOON + 1000)
+
+    def test_jitter_is_bounded(self):
+        scheduler = make_scheduler(jitter=0.1, rng=lambda: 1.0)
+        assert scheduler.schedule('chat', None) == 660
+
+    def test_night_slows_down(self):
+        day = make_scheduler().schedule('chat', [])
+        night = make_scheduler(night_hours=(0, 24)).schedule('chat', [])
+        assert night > day
+
+    def test_is_due_and_saved_calls(self):
+        scheduler = make_scheduler()
+        assert scheduler.is_due('chat')
+        scheduler.schedule('chat', [])
+        assert not scheduler.is_due('chat')
+        assert scheduler.is_due('chat', now=NOON + 3600)
+        assert scheduler.saved_calls > 0
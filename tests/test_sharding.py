@@ -0,0 +1,130 @@
+import queue
+from collections import Counter
+
+import pytest
+
+from sharding import SUBSCRIBE, UNSUBSCRIBE, HashRing, Supervisor
+from storage import SubscriptionStore
+
+
+class FakeProcess:
+
+    def __init__(self) -> None:
+        self.alive = True
+        self.exitcode = None
+
+    def is_alive(self) -> bool:
+        return self.alive
+
+
+class CommandQueue(queue.Queue):
+
+    def close(self) -> None:
+        pass
+
+
+class FakeSupervisor(Supervisor):
+    """Supervisor with in-process shards: plain queues, fake processes."""
+
+    def _spawn(self, shard: int) -> None:
+        self.queues[shard] = CommandQueue()
+        self.processes[shard] = FakeProcess()
+        self.ring.add(shard)
+
+    def commands(self, shard: int) -> list:
+        commands = []
+        while not self.queues[shard].empty():
+            commands.append(self.queues[shard].get_nowait())
+        return commands
+
+
+@pytest.fixture
+def supervisor():
+    supervisor = FakeSupervisor(4)
+    supervisor.start()
+    return supervisor
+
+
+class TestHashRing:
+
+    def test_keys_spread_over_nodes(self):
+        ring = HashRing(range(4))
+        shares = Counter(ring.node_for(chat_id) for chat_id in range(10000))
+        assert set(shares) == {0, 1, 2, 3}
+        assert all(1500 < share < 3500 for share in shares.values()), shares
+
+    def test_removed_node_only_moves_its_keys(self):
+        ring = HashRing(range(4))
+        before = {key: ring.node_for(key) for key in range(2000)}
+        ring.remove(2)
+        for key, node in before.items():
+            if node != 2:
+                assert ring.node_for(key) == node
+            else:
+                assert ring.node_for(key) != 2
+
+    def test_added_node_only_takes_keys(self):
+        ring = HashRing(range(3))
+        before = {key: ring.node_for(key) for key in range(2000)}
+        ring.add(3)
+        moved = [key for key in before if ring.node_for(key) != before[key]]
+        assert moved
+        assert all(ring.node_for(key) == 3 for key in moved)
+
+    def test_empty_ring(self):
+        assert HashRing().node_for('chat') is None
+
+
+class TestSupervisor:
+
+    def test_subscribe_routes_to_ring_owner(self, supervisor):
+        shard = supervisor.subscribe(42, 'token')
+        assert shard == supervisor.ring.node_for(42)
+        assert supervisor.commands(shard) == [(SUBSCRIBE, 42, 'token')]
+        supervisor.unsubscribe(42)
+        assert supervisor.commands(shard) == [(UNSUBSCRIBE, 42)]
+
+    def test_dead_worker_chats_move_and_come_back(self, supervisor):
+        for chat_id in range(100):
+            supervisor.subscribe(chat_id, f'token-{chat_id}')
+        owned = {chat_id for chat_id, shard in supervisor.assignment.items()
+                 if shard == 1}
+        for shard in range(4):
+            supervisor.commands(shard)
+        supervisor.processes[1].alive = False
+
+        supervisor.check_workers()
+        assert supervisor.processes[1].is_alive()
+        assert supervisor.assignment[min(owned)] == 1
+        moved = {command[1] for shard in (0, 2, 3)
+                 for command in supervisor.commands(shard)}
+        assert moved == owned, 'Only the dead shard chats must move'
+        assert {command[1] for command in supervisor.commands(1)} == owned
+
+    def test_rebalance_after_new_shard(self, supervisor):
+        for chat_id in range(400):
+            supervisor.subscribe(chat_id, 'token')
+        assert supervisor.rebalance() == 0
+        supervisor._spawn(4)
+        moved = supervisor.rebalance()
+        assert 0 < moved < 200
+        assert sum(shard == 4 for shard in
+                   supervisor.assignment.values()) == moved
+
+    def test_subscriptions_survive_restart(self, tmp_path):
+        path = str(tmp_path / 'state.sqlite3')
+        store = SubscriptionStore(path).open()
+        supervisor = FakeSupervisor(2, store=store)
+        supervisor.start()
+        supervisor.subscribe(1, 'first')
+        supervisor.subscribe('@channel', 'second')
+        supervisor.subscribe(3, 'third')
+        supervisor.unsubscribe(3)
+        store.close()
+
+        store = SubscriptionStore(path).open()
+        supervisor = FakeSupervisor(2, store=store)
+        supervisor.start()
+        store.close()
+        assert supervisor.subscribers == {1: 'first', '@channel': 'second'}
+        assert set(supervisor.assignment) == {1, '@channel'}
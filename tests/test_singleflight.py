@@ -0,0 +1,74 @@
+import threading
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+class TestSingleFlight:
+
+    def test_concurrent_calls_share_one_call(self):
+        flights = SingleFlight()
+        entered = threading.Event()
+        release = threading.Event()
+        waiting = threading.Barrier(10)
+        calls = []
+
+        class ArrivalEvent(threading.Event):
+            """Lets the test know a coalesced caller started waiting."""
+
+            def wait(self, timeout=None):
+                waiting.wait(5)
+                return super().wait(timeout)
+
+        def request():
+            calls.append(1)
+            entered.set()
+            release.wait(5)
+            return {'homeworks': []}
+
+        results = []
+
+        def call():
+            results.append(flights.do(('token', 1), request))
+
+        threads = [threading.Thread(target=call) for _ in range(10)]
+        threads[0].start()
+        assert entered.wait(5)
+        flights.in_flight[('token', 1)].done = ArrivalEvent()
+        for thread in threads[1:]:
+            thread.start()
+        waiting.wait(5)
+        release.set()
+        for thread in threads:
+            thread.join()
+        assert len(calls) == 1
+        assert flights.coalesced == 9
+        assert all(result is results[0] for result in results)
+
+    def test_different_keys_are_not_shared(self):
+        flights = SingleFlight(ttl=10)
+        assert flights.do(('token', 1), lambda: 1) == 1
+        assert flights.do(('token', 2), lambda: 2) == 2
+        assert flights.do(('other', 1), lambda: 3) == 3
+        assert flights.calls == 3
+
+    def test_result_cached_for_ttl(self, clock):
+        flights = SingleFlight(ttl=5, clock=clock)
+        flights.do('key', lambda: 'first')
+        clock.now = 4
+        assert flights.do('key', lambda: 'second') == 'first'
+        assert flights.cached == 1
+        clock.now = 5
+        assert flights.do('key', lambda: 'third') == 'third'
+
+    def test_errors_are_not_cached(self):
+        flights = SingleFlight(ttl=5)
+
+        def fail():
+            raise ValueError('boom')
+
+        with pytest.raises(ValueError):
+            flights.do('key', fail)
+        assert flights.do('key', lambda: 'ok') == 'ok'
+        assert not flights.in_flight
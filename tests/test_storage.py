@@ -0,0 +1,85 @@
+import pytest
+
+from storage import BatchedStore, CursorStore, HomeworkStateIndex
+from validators import validate_homework
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'state.sqlite3')
+
+
+def record(status, date_updated, homework_id=1):
+    return validate_homework({'id': homework_id, 'homework_name': 'hw',
+                              'status': status,
+                              'date_updated': date_updated})
+
+
+class TestCursorStore:
+
+    def test_values_persisted_by_flush(self, path):
+        store = CursorStore(path, flush_interval=3600).open()
+        store.set('chat:1', 100)
+        store.set('chat:2', 200)
+        assert store.get('chat:1') == 100
+        assert store.flush() == 2
+        assert store.flush() == 0, 'Unchanged entries must not be rewritten'
+        store.set('chat:1', 150)
+        store.close()
+
+        store = CursorStore(path).open()
+        assert store.get('chat:1') == 150
+        assert store.get('chat:2') == 200
+        store.close()
+
+    def test_refresh_reads_other_process_writes(self, path):
+        first = CursorStore(path, flush_interval=3600).open()
+        second = CursorStore(path, flush_interval=3600).open()
+        first.set('chat:1', 100)
+        first.flush()
+        assert second.get('chat:1') is None
+        assert second.refresh('chat:1') == 100
+        first.close()
+        second.close()
+
+    def test_works_in_memory_until_opened(self, path):
+        store = CursorStore(path)
+        store.set('chat:1', 100)
+        assert store.flush() == 0
+        assert store.get('chat:1') == 100
+        store.close()
+
+
+class TestHomeworkStateIndex:
+
+    def test_transitions(self, path):
+        index = HomeworkStateIndex(path)
+        assert index.is_transition(1, record('reviewing', '2022-01-02'))
+        assert not index.is_transition(1, record('reviewing', '2022-01-02'))
+        assert index.is_transition(1, record('approved', '2022-01-03'))
+        assert not index.is_transition(1, record('reviewing', '2022-01-02')), (
+            'An older status must not replace a newer one'
+        )
+        assert index.is_transition(2, record('reviewing', '2022-01-02'))
+
+    def test_is_changed_keeps_state(self, path):
+        index = HomeworkStateIndex(path)
+        assert index.is_changed(1, record('approved', '2022-01-03'))
+        assert index.get(1, 1) is None
+        index.is_transition(1, record('approved', '2022-01-03'))
+        assert not index.is_changed(1, record('approved', '2022-01-03'))
+
+    def test_states_survive_restart(self, path):
+        index = HomeworkStateIndex(path, flush_interval=3600).open()
+        index.is_transition(1, record('approved', '2022-01-03'))
+        index.close()
+
+        index = HomeworkStateIndex(path).open()
+        assert index.get(1, 1) == ('approved', '2022-01-03')
+        assert not index.is_transition(1, record('approved', '2022-01-03'))
+        index.close()
+
+
+def test_batched_store_is_abstract(path):
+    with pytest.raises(TypeError):
+        BatchedStore(path)
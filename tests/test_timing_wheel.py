@@ -0,0 +1,55 @@
+import random
+
+from timing_wheel import TimingWheel
+
+
+def run_until(wheel, clock, end):
+    fired = {}
+    for second in range(1, end + 1):
+        clock.now = second
+        batch = wheel.advance()
+        for job in batch:
+            fired[job] = second
+    return fired
+
+
+class TestTimingWheel:
+
+    def test_jobs_fire_on_due_tick(self, clock):
+        wheel = TimingWheel(1, (8, 4, 4), clock=clock)
+        rng = random.Random(0)
+        expected = {}
+        for key in range(1000):
+            delay = rng.uniform(0, 400)
+            wheel.schedule(key, delay)
+            expected[key] = max(1, -int(-delay // 1))
+        assert run_until(wheel, clock, 500) == expected
+        assert len(wheel) == 0
+
+    def test_jobs_beyond_top_level(self, clock):
+        wheel = TimingWheel(1, (4, 4), clock=clock)
+        wheel.schedule('far', 100)
+        assert run_until(wheel, clock, 120) == {'far': 100}
+
+    def test_cancel_and_reschedule(self, clock):
+        wheel = TimingWheel(1, (8, 4), clock=clock)
+        wheel.schedule('cancelled', 5)
+        wheel.schedule('moved', 5)
+        wheel.schedule('moved', 20, 'moved job')
+        assert wheel.cancel('cancelled')
+        assert not wheel.cancel('cancelled')
+        assert run_until(wheel, clock, 30) == {'moved job': 20}
+
+    def test_batches_jobs_of_one_tick(self, clock):
+        wheel = TimingWheel(10, clock=clock)
+        for key in range(100):
+            wheel.schedule(key, 1 + key % 9)
+        clock.now = 10
+        assert sorted(wheel.advance()) == list(range(100))
+
+    def test_advance_catches_up_missed_ticks(self, clock):
+        wheel = TimingWheel(1, (8, 4), clock=clock)
+        for key in range(50):
+            wheel.schedule(key, key)
+        clock.now = 100
+        assert sorted(wheel.advance()) == list(range(50))
@@ -0,0 +1,42 @@
+import pytest
+
+from exceptions import BadHomeworkRecord
+from validators import HomeworkRecord, validate_homework
+
+VALID_HOMEWORK = {
+    'id': 123,
+    'status': 'approved',
+    'homework_name': 'hw123',
+    'reviewer_comment': 'Всё нравится',
+    'date_updated': '2020-02-13T14:40:57Z',
+    'lesson_name': 'Итоговый проект'
+}
+
+
+class TestValidateHomework:
+
+    def test_valid_record(self):
+        record = validate_homework(VALID_HOMEWORK)
+        assert isinstance(record, HomeworkRecord)
+        assert record.as_dict() == VALID_HOMEWORK
+        assert record['status'] == 'approved', (
+            'Record must support item access like the raw dict'
+        )
+
+    def test_optional_fields(self):
+        record = validate_homework({'homework_name': 'hw', 'status': 'x'})
+        assert record.id is None
+        with pytest.raises(KeyError):
+            record['unknown']
+
+    @pytest.mark.parametrize('raw', [
+        [],
+        {'status': 'approved'},
+        {'homework_name': 'hw123'},
+        {'homework_name': 'hw123', 'status': 1},
+        {'homework_name': 'hw123', 'status': 'approved', 'id': '1'},
+        {'homework_name': 'hw123', 'status': 'approved', 'id': True},
+    ])
+    def test_invalid_record(self, raw):
+        with pytest.raises(BadHomeworkRecord):
+            validate_homework(raw)
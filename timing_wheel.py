@@ -0,0 +1,112 @@
+import math
+import threading
+import time
+from typing import Callable, Dict, Hashable, List, Tuple
+
+DEFAULT_LEVELS = (256, 64, 64, 64)
+
+
+class TimingWheel:
+    """Hierarchical timing wheel of poll jobs.
+
+    Level 0 has one slot per tick, every slot of the next level spans
+    a whole turn of the previous one. A job is put into the lowest
+    level that reaches its due tick and falls down a level when the
+    wheel turns to its slot, so schedule() and cancel() are O(1) dict
+    operations and advance() touches only the slots it passes.
+    Jobs due in the same tick are returned as one batch. Jobs beyond
+    the top level wait in its farthest slot and are placed again when
+    it comes round.
+    """
+
+    def __init__(self,
+                 tick: float = 1.0,
+                 levels: Tuple[int, ...] = DEFAULT_LEVELS,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.tick = tick
+        self.levels = levels
+        self.spans = [math.prod(levels[:level])
+                      for level in range(len(levels))]
+        self.clock = clock
+        self.origin = clock()
+        self.current = 0
+        self.slots: List[List[Dict[Hashable, tuple]]] = [
+            [{} for _ in range(size)] for size in levels]
+        self.index: Dict[Hashable, Dict[Hashable, tuple]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.index
+
+    def _slot_for(self, due: int) -> Dict[Hashable, tuple]:
+        for level, (size, span) in enumerate(zip(self.levels, self.spans)):
+            if due // span - self.current // span < size:
+                return self.slots[level][(due // span) % size]
+        top = len(self.levels) - 1
+        size, span = self.levels[top], self.spans[top]
+        return self.slots[top][(self.current // span + size - 1) % size]
+
+    def _place(self, key: Hashable, due: int, job) -> None:
+        slot = self._slot_for(due)
+        slot[key] = (due, job)
+        self.index[key] = slot
+
+    def schedule(self, key: Hashable, delay: float, job=None,
+                 now: float = None) -> None:
+        """Run job (key by default) after delay seconds.
+
+        A pending job of the same key is replaced.
+        """
+        now = self.clock() if now is None else now
+        with self._lock:
+            due = max(self.current + 1,
+                      math.ceil((now + delay - self.origin) / self.tick))
+            slot = self.index.get(key)
+            if slot is not None:
+                del slot[key]
+            self._place(key, due, key if job is None else job)
+
+    def cancel(self, key: Hashable) -> bool:
+        with self._lock:
+            slot = self.index.pop(key, None)
+            if slot is None:
+                return False
+            del slot[key]
+            return True
+
+    def _turn(self, tick: int) -> list:
+        self.current = tick
+        for level in range(len(self.levels) - 1, 0, -1):
+            span = self.spans[level]
+            if tick % span:
+                continue
+            slot = self.slots[level][(tick // span) % self.levels[level]]
+            if slot:
+                jobs = list(slot.items())
+                slot.clear()
+                for key, (due, job) in jobs:
+                    self._place(key, due, job)
+        slot = self.slots[0][tick % self.levels[0]]
+        if not slot:
+            return []
+        due = [entry[1] for entry in slot.values()]
+        for key in slot:
+            del self.index[key]
+        slot.clear()
+        return due
+
+    def advance(self, now: float = None) -> list:
+        """Turn the wheel up to now, return jobs that became due."""
+        now = self.clock() if now is None else now
+        target = int((now - self.origin) // self.tick)
+        due = []
+        with self._lock:
+            while self.current < target:
+                if not self.index:
+                    self.current = target
+                    break
+                due.extend(self._turn(self.current + 1))
+        return due
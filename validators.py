@@ -0,0 +1,97 @@
+from typing import Callable, Iterable, Tuple
+
+from exceptions import BadHomeworkRecord
+
+# (name, type, required) of the homework record fields.
+HOMEWORK_FIELDS: Tuple[Tuple[str, type, bool], ...] = (
+    ('homework_name', str, True),
+    ('status', str, True),
+    ('id', int, False),
+    ('date_updated', str, False),
+    ('lesson_name', str, False),
+    ('reviewer_comment', str, False),
+)
+
+
+class HomeworkRecord:
+    """Validated homework record.
+
+    Supports item access, so it can be used where the raw API dict was.
+    """
+
+    __slots__ = tuple(name for name, _, _ in HOMEWORK_FIELDS)
+
+    def __init__(self, homework_name, status, id=None, date_updated=None,
+                 lesson_name=None, reviewer_comment=None) -> None:
+        self.homework_name = homework_name
+        self.status = status
+        self.id = id
+        self.date_updated = date_updated
+        self.lesson_name = lesson_name
+        self.reviewer_comment = reviewer_comment
+
+    def __getitem__(self, key: str):
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError):
+            raise KeyError(key)
+
+    def get(self, key: str, default=None):
+        value = getattr(self, key, None)
+        return default if value is None else value
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, HomeworkRecord):
+            return NotImplemented
+        return self.as_dict() == other.as_dict()
+
+    def __repr__(self) -> str:
+        return (f'HomeworkRecord(id={self.id}, '
+                f'homework_name={self.homework_name!r}, '
+                f'status={self.status!r})')
+
+
+def compile_validator(
+        record_class: type,
+        fields: Iterable[Tuple[str, type, bool]]) -> Callable[[dict], object]:
+    """Generate function which validates raw dict and builds the record.
+
+    Checks are unrolled into straight-line code, so validating a record
+    costs a few dict lookups and type() comparisons.
+    """
+    lines = ['def validate(raw):',
+             '    if type(raw) is not dict:',
+             '        raise BadHomeworkRecord(',
+             '            f"record must be a dict, not {type(raw).__name__}")']
+    namespace = {'BadHomeworkRecord': BadHomeworkRecord,
+                 'record_class': record_class}
+    arguments = []
+    for number, (name, field_type, required) in enumerate(fields):
+        variable = f'value_{number}'
+        type_name = f'type_{number}'
+        namespace[type_name] = field_type
+        arguments.append(f'{name}={variable}')
+        lines.append(f'    {variable} = raw.get({name!r})')
+        if required:
+            lines += [f'    if {variable} is None:',
+                      '        raise BadHomeworkRecord(',
+                      f'            f"required field {name!r} is missing '
+                      f'in {{raw}}")',
+                      f'    if type({variable}) is not {type_name}:']
+        else:
+            lines.append(f'    if {variable} is not None '
+                         f'and type({variable}) is not {type_name}:')
+        lines += ['        raise BadHomeworkRecord(',
+                  f'            f"field {name!r} must be '
+                  f'{field_type.__name__}, not '
+                  f'{{type({variable}).__name__}} in {{raw}}")']
+    lines.append(f'    return record_class({", ".join(arguments)})')
+    exec('\n'.join(lines), namespace)
+    return namespace['validate']
+
+
+validate_homework: Callable[[dict], HomeworkRecord] = compile_validator(
+    HomeworkRecord, HOMEWORK_FIELDS)